@@ -0,0 +1,30 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+async def aget_user(request):
+    """Resolve ``request.user`` from async code.
+
+    The session and user lookups behind ``AuthenticationMiddleware`` are
+    synchronous in Django 4.2, so they run in one ``sync_to_async`` hop; the
+    result is cached on the request, so templates and later checks reuse it.
+    """
+
+    def resolve():
+        request.user.is_authenticated
+        return request.user
+
+    return await sync_to_async(resolve)()
+
+
+def async_login_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
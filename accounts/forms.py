@@ -1,8 +1,14 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.core.exceptions import ValidationError
+
+from .hashing import aauthenticate
 
 User = get_user_model()
 
+# Marks a LoginForm whose password has not been checked ahead of clean().
+UNCHECKED = object()
+
 
 class SignupForm(UserCreationForm):
     class Meta:
@@ -13,3 +19,28 @@ class SignupForm(UserCreationForm):
 class LoginForm(AuthenticationForm):
     class Meta:
         model = User
+
+    checked_user = UNCHECKED
+
+    async def acheck_password(self):
+        """Check the submitted credentials on the hashing pool.
+
+        ``clean()`` then uses the result instead of calling ``authenticate()``
+        on the current thread. Raises ``HashingPoolFull`` when the pool is full.
+        """
+        try:
+            username = self.fields["username"].clean(self["username"].data)
+            password = self.fields["password"].clean(self["password"].data)
+        except ValidationError:
+            return  # clean() has nothing to authenticate
+        self.checked_user = await aauthenticate(self.request, username=username, password=password)
+
+    def clean(self):
+        if self.checked_user is UNCHECKED:
+            return super().clean()
+        if self.cleaned_data.get("username") is not None and self.cleaned_data.get("password"):
+            self.user_cache = self.checked_user
+            if self.user_cache is None:
+                raise self.get_invalid_login_error()
+            self.confirm_login_allowed(self.user_cache)
+        return self.cleaned_data
@@ -0,0 +1,76 @@
+"""Password checks for async views, on a bounded pool of threads.
+
+A PBKDF2 hash keeps a core busy for a good part of a second. Run on the
+event loop (or on the single thread behind ``sync_to_async``) it stalls
+every other request, so async logins hash here instead: ``hashlib``
+releases the GIL while hashing, so up to ``PASSWORD_HASHING_WORKERS``
+hashes run in parallel. At most ``PASSWORD_HASHING_QUEUE`` more wait for
+a thread; beyond that ``HashingPoolFull`` is raised at once, so a login
+storm gets quick 503s instead of tying up every worker.
+
+The whole of ``authenticate()`` runs on the pool, the user lookup
+included, so the configured ``AUTHENTICATION_BACKENDS`` and the
+``user_login_failed`` signal apply as they do to sync logins.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+
+
+class HashingPoolFull(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers, queue):
+        self.workers = workers
+        self.queue = queue
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _reserve(self):
+        with self._lock:
+            if self.pending >= self.workers + self.queue:
+                raise HashingPoolFull
+            self.pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hashing")
+
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` on a pool thread, or raise ``HashingPoolFull``."""
+        self._reserve()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._release()
+
+
+pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+
+
+def _authenticate(request, credentials):
+    # Pool threads serve no requests, so their connections are recycled here
+    # the way Django does around each request.
+    close_old_connections()
+    try:
+        return authenticate(request, **credentials)
+    finally:
+        close_old_connections()
+
+
+async def aauthenticate(request, **credentials):
+    """``django.contrib.auth.authenticate`` on ``pool``.
+
+    Returns the user the backends accept, or ``None``.
+    """
+    return await pool.run(_authenticate, request, credentials)
@@ -0,0 +1,53 @@
+import copy
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+from mysite.metrics import record_cache
+
+
+def user_key(pk):
+    return f"user:{pk}"
+
+
+def _cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def get_user(request):
+    """``django.contrib.auth.get_user`` that keeps the logged-in user in the cache.
+
+    Only on with ``USER_CACHE_ALIAS`` set, which needs a cache shared by all
+    workers. The password hash is left out of the cached copy (it is loaded
+    again if read); the session hash stored next to it must still match the
+    session's, otherwise the user is loaded and verified as usual. Entries
+    are dropped when the user is saved, deleted or logs out.
+    """
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if (
+        not settings.USER_CACHE_ALIAS
+        or user_id is None
+        or session.get(auth.BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS
+    ):
+        return auth.get_user(request)
+    key = user_key(user_id)
+    cached = _cache().get(key)
+    record_cache("users", cached is not None, cached is None)
+    if cached is not None:
+        user, session_hash = cached
+        if constant_time_compare(session.get(auth.HASH_SESSION_KEY, ""), session_hash):
+            return user
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        stored = copy.copy(user)
+        del stored.password  # deferred: read from the database if anything needs it
+        _cache().set(key, (stored, user.get_session_auth_hash()), settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_user(pk):
+    if settings.USER_CACHE_ALIAS:
+        _cache().delete(user_key(pk))
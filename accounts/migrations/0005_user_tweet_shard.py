@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_connection_followers_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="tweet_shard",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
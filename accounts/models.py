@@ -4,3 +4,17 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField()
+    followers_count = models.PositiveIntegerField(default=0)
+    # Database alias holding the user's tweets when moved off their hashed shard (tweets.shards).
+    tweet_shard = models.CharField(max_length=32, blank=True, editable=False)
+
+
+class Connection(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following")
+    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followers")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["follower", "following"], name="unique_connection"),
+        ]
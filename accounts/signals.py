@@ -0,0 +1,19 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .lookup import invalidate_user
+from .models import User
+
+
+# Saving covers password changes, which must end the cached sessions' view of the user.
+@receiver(post_save, sender=User, dispatch_uid="accounts_forget_saved_user")
+@receiver(post_delete, sender=User, dispatch_uid="accounts_forget_deleted_user")
+def forget_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out, dispatch_uid="accounts_forget_logged_out_user")
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
@@ -1,10 +1,27 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
 from django.conf import settings
-from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.auth import SESSION_KEY, get_user_model, user_login_failed
 from django.contrib.auth.forms import UserCreationForm
-from django.test import TestCase
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
-from tweets.models import Tweet
+from tweets.models import TimelineEntry, Tweet
+
+from .hashing import HashingPool
+from .lookup import user_key
+from .models import Connection
+from .views import async_login_view, async_userprofile_view
 
 User = get_user_model()
 
@@ -30,6 +47,18 @@ class TestSignupView(TestCase, UserCreationForm):
         self.assertTrue(User.objects.filter(username=valid_data["username"]).exists())
         self.assertIn(SESSION_KEY, self.client.session)
 
+    def test_success_post_hashes_password_once(self):
+        valid_data = {
+            "username": "testuser",
+            "email": "test@test.com",
+            "password1": "testpassrd2354",
+            "password2": "testpassrd2354",
+        }
+        with mock.patch.object(PBKDF2PasswordHasher, "verify") as verify:
+            self.client.post(self.url, valid_data)
+        verify.assert_not_called()
+        self.assertIn(SESSION_KEY, self.client.session)
+
     def test_failure_post_with_empty_form(self):
         invalid_data = {
             "username": "",
@@ -187,7 +216,8 @@ class TestSignupView(TestCase, UserCreationForm):
         self.assertIn("確認用パスワードが一致しません。", form.errors["password2"])
 
 
-class TestLoginView(TestCase):
+# With DJANGO_ASYNC_VIEWS=1 these go through async_login_view (see TestAsyncLoginView).
+class TestLoginView(TransactionTestCase):
     def setUp(self):
         self.user = User.objects.create_user(username="testuser", password="testuser")
         self.login = reverse("accounts:login")
@@ -224,6 +254,66 @@ class TestLoginView(TestCase):
         self.assertNotIn(SESSION_KEY, self.client.session)
 
 
+# Logins are checked on the hashing pool's threads, which cannot see a test's open transaction.
+class TestAsyncLoginView(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+
+    def post(self, password):
+        request = AsyncRequestFactory().post(reverse("accounts:login"), {"username": "testuser", "password": password})
+        request._dont_enforce_csrf_checks = True
+        request.session = SessionStore()
+        return request
+
+    async def test_success_post(self):
+        request = self.post("testuser")
+        response = await async_login_view(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(request.session[SESSION_KEY], str(self.user.pk))
+
+    async def test_failure_post_with_wrong_password(self):
+        request = self.post("wrong-password")
+        response = await async_login_view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context_data["form"].errors["__all__"])
+        self.assertNotIn(SESSION_KEY, request.session)
+        self.assertEqual(request.sensitive_post_parameters, "__ALL__")
+
+    async def test_goes_through_the_authentication_backends(self):
+        failed = []
+
+        def receiver(credentials, **kwargs):
+            failed.append(credentials["username"])
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        # Refused by ModelBackend.user_can_authenticate()
+        await User.objects.filter(pk=self.user.pk).aupdate(is_active=False)
+        response = await async_login_view(self.post("testuser"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(failed, ["testuser"])
+
+    async def test_outdated_hash_is_upgraded(self):
+        self.user.password = PBKDF2PasswordHasher().encode("testuser", "somesalt", iterations=1000)
+        await self.user.asave()
+        response = await async_login_view(self.post("testuser"))
+        self.assertEqual(response.status_code, 302)
+        await self.user.arefresh_from_db()
+        self.assertEqual(self.user.password.split("$")[1], str(PBKDF2PasswordHasher.iterations))
+
+    async def test_full_pool_refuses_login(self):
+        pool = HashingPool(workers=1, queue=0)
+        release = threading.Event()
+        with mock.patch("accounts.hashing.pool", pool):
+            busy = asyncio.ensure_future(pool.run(release.wait))
+            await asyncio.sleep(0)
+            response = await async_login_view(self.post("testuser"))
+            release.set()
+            await busy
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(pool.pending, 0)
+
+
 class TestLogoutView(TestCase):
 
     def setUp(self):
@@ -241,6 +331,57 @@ class TestLogoutView(TestCase):
         self.assertNotIn(SESSION_KEY, self.client.session)
 
 
+# What settings.py switches on when the cache is shared between workers
+@override_settings(
+    SHARED_CACHE=True,
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    USER_CACHE_ALIAS="default",
+    MIDDLEWARE=[
+        "accounts.middleware.CachedAuthenticationMiddleware" if name.endswith(".AuthenticationMiddleware") else name
+        for name in settings.MIDDLEWARE
+    ],
+)
+class TestCachedUser(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        self.home = reverse("tweets:home")
+        self.client.login(username="testuser", password="testuser")
+
+    def test_cached_page_makes_no_queries(self):
+        etag = self.client.get(self.home)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.home, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_password_change_ends_session(self):
+        self.client.get(self.home)
+        self.assertIsNotNone(cache.get(user_key(self.user.pk)))
+        self.user.set_password("changed-password")
+        self.user.save()
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+        self.assertRedirects(self.client.get(self.home), f"{reverse('accounts:login')}?next={self.home}")
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(self.home)
+        user, _ = cache.get(user_key(self.user.pk))
+        self.assertIn("password", user.get_deferred_fields())
+
+    def test_cached_user_must_match_session(self):
+        self.client.get(self.home)
+        user, _ = cache.get(user_key(self.user.pk))
+        cache.set(user_key(self.user.pk), (user, "stale-session-hash"))
+        # The stale entry is replaced by the user from the database.
+        self.assertEqual(self.client.get(self.home).status_code, 200)
+        self.assertEqual(cache.get(user_key(self.user.pk))[1], self.user.get_session_auth_hash())
+
+    def test_logout_forgets_user(self):
+        self.client.get(self.home)
+        self.client.post(reverse("accounts:logout"))
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+        self.assertEqual(self.client.get(self.home).status_code, 302)
+
+
 class TestUserProfileView(TestCase):
     def setUp(self):
         self.user = User.objects.create(
@@ -263,6 +404,39 @@ class TestUserProfileView(TestCase):
         self.assertTemplateUsed(response, "tweets/profile.html")
 
 
+@override_settings(SHARED_CACHE=True)
+class TestConditionalUserProfileView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testesuser")
+        self.user2 = User.objects.create(username="testesuser2")
+        self.url = reverse("accounts:user_profile", kwargs={"username": self.user2.username})
+        self.client.force_login(self.user)
+
+    def test_not_modified_until_follow(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post(reverse("accounts:follow", kwargs={"username": self.user2.username}))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_new_tweet_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        Tweet.objects.create(user=self.user2, title="test_title", content="test_content")
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class TestAsyncUserProfileView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testesuser")
+        self.tweet = Tweet.objects.create(user=self.user, title="test_title", content="test_content")
+
+    async def test_success_get(self):
+        request = AsyncRequestFactory().get("/")
+        request.user = self.user
+        response = await async_userprofile_view(request, self.user.username)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "test_title")
+
+
 # class TestUserProfileEditView(TestCase):
 #     def test_success_get(self):
 
@@ -273,25 +447,132 @@ class TestUserProfileView(TestCase):
 #     def test_failure_post_with_incorrect_user(self):
 
 
-# class TestFollowView(TestCase):
-#     def test_success_post(self):
+class TestFollowView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testuser")
+        self.user2 = User.objects.create(username="testuser2")
+        self.tweet = Tweet.objects.create(user=self.user2, title="test_title", content="test_content")
+        self.client.force_login(self.user)
 
-#     def test_failure_post_with_not_exist_user(self):
+    def test_success_post(self):
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": self.user2.username}))
+        self.assertRedirects(
+            response,
+            reverse("accounts:user_profile", kwargs={"username": self.user2.username}),
+            status_code=302,
+            target_status_code=200,
+        )
+        self.assertTrue(Connection.objects.filter(follower=self.user, following=self.user2).exists())
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, tweet=self.tweet).exists())
 
-#     def test_failure_post_with_self(self):
+    def test_failure_post_with_not_exist_user(self):
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": "nobody"}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Connection.objects.exists())
 
+    def test_failure_post_with_self(self):
+        response = self.client.post(reverse("accounts:follow", kwargs={"username": self.user.username}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Connection.objects.exists())
 
-# class TestUnfollowView(TestCase):
-#     def test_success_post(self):
 
-#     def test_failure_post_with_not_exist_tweet(self):
+class TestUnfollowView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testuser")
+        self.user2 = User.objects.create(username="testuser2")
+        self.client.force_login(self.user)
+        self.client.post(reverse("accounts:follow", kwargs={"username": self.user2.username}))
+        self.tweet = Tweet.objects.create(user=self.user2, title="test_title", content="test_content")
 
-#     def test_failure_post_with_incorrect_user(self):
+    def test_success_post(self):
+        response = self.client.post(reverse("accounts:unfollow", kwargs={"username": self.user2.username}))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Connection.objects.filter(follower=self.user, following=self.user2).exists())
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.user, tweet=self.tweet).exists())
 
+    def test_failure_post_with_not_exist_tweet(self):
+        response = self.client.post(reverse("accounts:unfollow", kwargs={"username": "nobody"}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Connection.objects.count(), 1)
 
-# class TestFollowingListView(TestCase):
-#     def test_success_get(self):
+    def test_failure_post_with_incorrect_user(self):
+        response = self.client.post(reverse("accounts:unfollow", kwargs={"username": self.user.username}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Connection.objects.count(), 1)
 
 
-# class TestFollowerListView(TestCase):
-#     def test_success_get(self):
+class TestFollowingListView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testuser")
+        self.user2 = User.objects.create(username="testuser2")
+        Connection.objects.create(follower=self.user, following=self.user2)
+        self.client.force_login(self.user)
+
+    def test_success_get(self):
+        response = self.client.get(reverse("accounts:following_list", kwargs={"username": self.user.username}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "accounts/following_list.html")
+        self.assertEqual([c.following for c in response.context["connections"]], [self.user2])
+
+
+class TestFollowerListView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testuser")
+        self.user2 = User.objects.create(username="testuser2")
+        Connection.objects.create(follower=self.user2, following=self.user)
+        self.client.force_login(self.user)
+
+    def test_success_get(self):
+        response = self.client.get(reverse("accounts:follower_list", kwargs={"username": self.user.username}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "accounts/follower_list.html")
+        self.assertEqual([c.follower for c in response.context["connections"]], [self.user2])
+
+
+class TestImportUsersCommand(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def run_import(self, rows, **options):
+        path = os.path.join(self.dir.name, "users.ndjson")
+        with open(path, "w") as file:
+            file.writelines(json.dumps(row) + "\n" for row in rows)
+        out, err = StringIO(), StringIO()
+        call_command("import_users", path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_users_with_password_hashes(self):
+        out, err = self.run_import(
+            [
+                {"username": "alice", "email": "alice@example.com", "password": make_password("secret-pass")},
+                {"username": "bob", "email": "bob@example.com"},
+            ],
+            batch_size=1,
+        )
+        self.assertIn("2 rows in", out)
+        self.assertEqual(err, "")
+        self.assertTrue(User.objects.get(username="alice").check_password("secret-pass"))
+        self.assertFalse(User.objects.get(username="bob").has_usable_password())
+
+    def test_rejects_invalid_rows(self):
+        out, err = self.run_import(
+            [
+                {"username": "bad name!", "email": "x@example.com"},
+                {"username": "carol", "email": "not-an-email"},
+                {"username": "dave", "email": "dave@example.com", "password": "plain text"},
+            ]
+        )
+        self.assertFalse(User.objects.exists())
+        self.assertIn("3 invalid", out)
+        self.assertIn("Line 3: password is not a recognized password hash.", err)
+
+    def test_skips_existing_usernames(self):
+        User.objects.create(username="alice", email="old@example.com")
+        self.run_import([{"username": "alice", "email": "new@example.com"}, {"username": "bob", "email": "b@b.com"}])
+        self.assertEqual(User.objects.get(username="alice").email, "old@example.com")
+        self.assertTrue(User.objects.filter(username="bob").exists())
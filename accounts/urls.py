@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -8,11 +9,17 @@ app_name = "accounts"
 
 urlpatterns = [
     path("signup/", auth_views.SignupView.as_view(), name="signup"),
-    path("login/", auth_views.LoginView.as_view(), name="login"),
+    path(
+        "login/", auth_views.async_login_view if settings.ASYNC_VIEWS else auth_views.LoginView.as_view(), name="login"
+    ),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
-    path("<str:username>/", views.userprofile_view, name="user_profile"),
-    # path('<str:username>/follow/', views.FollowView.as_view(), name='follow'),
-    # path('<str:username>/unfollow/', views.UnFollowView, name='unfollow'),
-    # path('<str:username>/following_list/', views.FollowingListView.as_view(), name='following_list'),
-    # path('<str:username>/follower_list/', views.FollowerListView.as_view(), name='follower_list'),
+    path(
+        "<str:username>/",
+        views.async_userprofile_view if settings.ASYNC_VIEWS else views.userprofile_view,
+        name="user_profile",
+    ),
+    path("<str:username>/follow/", views.FollowView.as_view(), name="follow"),
+    path("<str:username>/unfollow/", views.UnFollowView.as_view(), name="unfollow"),
+    path("<str:username>/following_list/", views.FollowingListView.as_view(), name="following_list"),
+    path("<str:username>/follower_list/", views.FollowerListView.as_view(), name="follower_list"),
 ]
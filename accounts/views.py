@@ -1,17 +1,34 @@
+from asgiref.sync import markcoroutinefunction, sync_to_async
 from django.conf import settings
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView as BaseLoginView
 from django.contrib.auth.views import LogoutView as BaseLogoutView
-from django.shortcuts import render
-from django.views.generic import CreateView
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.debug import sensitive_post_parameters
+from django.views.generic import CreateView, ListView, View
 
-from tweets.models import Tweet
+from mysite.middleware import cache_gzip
+from mysite.queries import query_budget
+from mysite.routers import replica_reads
+from tweets.cards import render_cards
+from tweets.likes import aattach_likes, attach_likes
+from tweets.pagination import apaginate_tweets, paginate_tweets
+from tweets.timeline import backfill_inbox, drop_from_inbox
+from tweets.versions import bump, conditional_page, profile_etag
 
+from .decorators import async_login_required
 from .forms import LoginForm, SignupForm
-from .models import User
+from .hashing import HashingPoolFull
+from .lookup import invalidate_user
+from .models import Connection, User
 
 
+@query_budget(12)
 class SignupView(CreateView):
 
     form_class = SignupForm
@@ -21,27 +38,162 @@ class SignupView(CreateView):
     def form_valid(self, form):
 
         response = super().form_valid(form)
-        username = form.cleaned_data["username"]
-        password = form.cleaned_data["password1"]
-        user = authenticate(self.request, username=username, password=password)
-        login(self.request, user)
+        # The password was just hashed for the new user; authenticate() would hash it again.
+        login(self.request, self.object, backend=settings.AUTHENTICATION_BACKENDS[0])
         return response
 
 
+@query_budget(6)
 @login_required
+@cache_gzip
+@conditional_page(profile_etag)
+@replica_reads
 def userprofile_view(request, username):
-    tweets_list = Tweet.objects.select_related("user").filter(user=User.objects.get(username=username))
+    user = get_object_or_404(User, username=username)
+    # The reverse manager reads the user's shard and sets tweet.user without a join.
+    page = paginate_tweets(user.tweet_set.all(), request.GET)
+    is_following = Connection.objects.filter(follower=request.user, following=user).exists()
     return render(
         request,
         "tweets/profile.html",
-        {"username": username, "tweets_list": tweets_list},
+        {
+            "username": username,
+            "profile_user": user,
+            "is_following": is_following,
+            "tweets_list": page.items,
+            "cards": attach_likes(render_cards(page.items), request.user),
+            "page": page,
+        },
     )
 
 
+@query_budget(6)
+@async_login_required
+@cache_gzip
+@conditional_page(profile_etag)
+@replica_reads
+async def async_userprofile_view(request, username):
+    try:
+        user = await User.objects.aget(username=username)
+    except User.DoesNotExist:
+        raise Http404
+    page = await apaginate_tweets(user.tweet_set.all(), request.GET)
+    is_following = await Connection.objects.filter(follower=request.user, following=user).aexists()
+    cards = await aattach_likes(render_cards(page.items), request.user)
+    return render(
+        request,
+        "tweets/profile.html",
+        {
+            "username": username,
+            "profile_user": user,
+            "is_following": is_following,
+            "tweets_list": page.items,
+            "cards": cards,
+            "page": page,
+        },
+    )
+
+
+@query_budget(9)
 class LoginView(BaseLoginView):
     form_class = LoginForm
     template_name = "accounts/login.html"
+    # A bound form whose password async_login_view already checked
+    checked_form = None
+
+    def get_form(self, form_class=None):
+        if self.checked_form is not None:
+            return self.checked_form
+        return super().get_form(form_class)
+
+
+@query_budget(9)
+# Before Django 5.0 sensitive_post_parameters() wraps async views in a sync function.
+@markcoroutinefunction
+@sensitive_post_parameters()
+async def async_login_view(request):
+    """``LoginView`` with ``authenticate()`` on the bounded pool of ``accounts.hashing``.
+
+    Everything else, from CSRF checks to the session, is left to
+    ``LoginView``. When the pool is full the login is refused with a 503
+    instead of waiting for a thread.
+    """
+    form = None
+    if request.method == "POST":
+        form = LoginForm(request, data=request.POST)
+        try:
+            await form.acheck_password()
+        except HashingPoolFull:
+            response = HttpResponse("Too many logins at once, try again shortly.", status=503)
+            response.headers["Retry-After"] = "1"
+            return response
+    return await sync_to_async(LoginView.as_view(checked_form=form))(request)
 
 
 class LogoutView(BaseLogoutView):
     success_url = settings.LOGOUT_REDIRECT_URL
+
+
+@query_budget(12)
+class FollowView(LoginRequiredMixin, View):
+    def post(self, request, username):
+        following = get_object_or_404(User, username=username)
+        if following == request.user:
+            return HttpResponseBadRequest()
+        with transaction.atomic():
+            _, created = Connection.objects.get_or_create(follower=request.user, following=following)
+            if created:
+                User.objects.filter(pk=following.pk).update(followers_count=F("followers_count") + 1)
+                # Their cached copy decides whether their next tweet is fanned out.
+                invalidate_user(following.pk)
+        if created:
+            backfill_inbox(request.user, following)
+            bump([f"inbox:{request.user.pk}", f"following:{request.user.pk}", f"profile:{username}"])
+        return redirect("accounts:user_profile", username=username)
+
+
+@query_budget(8)
+class UnFollowView(LoginRequiredMixin, View):
+    def post(self, request, username):
+        following = get_object_or_404(User, username=username)
+        if following == request.user:
+            return HttpResponseBadRequest()
+        with transaction.atomic():
+            deleted, _ = Connection.objects.filter(follower=request.user, following=following).delete()
+            if deleted:
+                User.objects.filter(pk=following.pk).update(followers_count=F("followers_count") - 1)
+                invalidate_user(following.pk)
+        if deleted:
+            drop_from_inbox(request.user, following)
+            bump([f"inbox:{request.user.pk}", f"following:{request.user.pk}", f"profile:{username}"])
+        return redirect("accounts:user_profile", username=username)
+
+
+@query_budget(4)
+class FollowingListView(LoginRequiredMixin, ListView):
+    template_name = "accounts/following_list.html"
+    context_object_name = "connections"
+
+    def get_queryset(self):
+        self.profile_user = get_object_or_404(User, username=self.kwargs["username"])
+        return (
+            Connection.objects.filter(follower=self.profile_user).select_related("following").order_by("-created_at")
+        )
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(profile_user=self.profile_user, **kwargs)
+
+
+@query_budget(4)
+class FollowerListView(LoginRequiredMixin, ListView):
+    template_name = "accounts/follower_list.html"
+    context_object_name = "connections"
+
+    def get_queryset(self):
+        self.profile_user = get_object_or_404(User, username=self.kwargs["username"])
+        return (
+            Connection.objects.filter(following=self.profile_user).select_related("follower").order_by("-created_at")
+        )
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(profile_user=self.profile_user, **kwargs)
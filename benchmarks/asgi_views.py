@@ -0,0 +1,59 @@
+"""Requests per second of the sync and async read views under ASGI.
+
+python -m benchmarks.asgi_views --requests 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from .common import asgi_get, seed, session_cookie, setup, use_async_views
+
+
+async def run(app, path, cookie, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            status, _, _ = await asgi_get(app, path, cookie)
+            assert status == 200, (path, status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tweets", type=int, default=5000)
+    args = parser.parse_args()
+
+    teardown = setup()
+    try:
+        from django.core.handlers.asgi import ASGIHandler
+
+        from tweets.models import Tweet
+
+        users = seed(users=args.users, tweets=args.tweets)
+        cookie = session_cookie(users[1])
+        tweet = Tweet.objects.filter(user=users[0]).first()
+        paths = ["/tweets/home/", f"/tweets/{tweet.id}/", f"/accounts/{users[0].username}/"]
+
+        print(f"{'view':<50} {'sync rps':>10} {'async rps':>10}")
+        results = {}
+        for enabled in (False, True):
+            use_async_views(enabled)
+            app = ASGIHandler()
+            for path in paths:
+                results[path, enabled] = asyncio.run(run(app, path, cookie, args.requests, args.concurrency))
+        for path in paths:
+            print(f"{path:<50} {results[path, False]:>10.1f} {results[path, True]:>10.1f}")
+    finally:
+        teardown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Helpers shared by the benchmark scripts in this package.
+
+Run a script from the repository root, e.g. ``python -m benchmarks.asgi_views``.
+Every script works on a throwaway test database and never touches db.sqlite3.
+"""
+
+import importlib
+import os
+import random
+import tempfile
+from datetime import timedelta
+
+import django
+
+
+def setup(on_disk=False):
+    """Configure Django against a fresh test database; return the teardown.
+
+    ``on_disk`` puts the database in a temporary file instead of memory, for
+    benchmarks that write from several threads at once.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    if on_disk:
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.gettempdir(), f"bench-{os.getpid()}.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=0)
+
+    def teardown():
+        test_name = connection.settings_dict["NAME"]
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if on_disk:
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(f"{test_name}{suffix}"):
+                    os.remove(f"{test_name}{suffix}")
+
+    return teardown
+
+
+def seed(users=50, tweets=5000, follows=20, skew=1.2, seed=0):
+    """Create ``users`` users and ``tweets`` tweets with Zipf-skewed authorship.
+
+    Every user follows ``follows`` random others and home inboxes are filled
+    the way ``tweets.timeline.fan_out`` would. Returns the users, most
+    prolific author first.
+    """
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.db.models import Count
+    from django.utils import timezone
+
+    from accounts.models import Connection, User
+    from tweets.models import TimelineEntry, Tweet
+
+    rng = random.Random(seed)
+    password = make_password("benchmark-password")
+    people = User.objects.bulk_create(
+        [User(username=f"bench{i}", email=f"bench{i}@example.com", password=password) for i in range(users)]
+    )
+    Connection.objects.bulk_create(
+        [
+            Connection(follower=follower, following=following)
+            for follower in people
+            for following in rng.sample([u for u in people if u != follower], min(follows, users - 1))
+        ],
+        batch_size=1000,
+    )
+    counts = dict(Connection.objects.values_list("following_id").annotate(n=Count("id")))
+    for user in people:
+        user.followers_count = counts.get(user.pk, 0)
+    User.objects.bulk_update(people, ["followers_count"], batch_size=1000)
+
+    followers = {}
+    for follower_id, following_id in Connection.objects.values_list("follower_id", "following_id"):
+        followers.setdefault(following_id, []).append(follower_id)
+    weights = [1 / (rank + 1) ** skew for rank in range(users)]
+    now = timezone.now()
+    batch, entries = [], []
+    for i in range(tweets):
+        author = rng.choices(people, weights)[0]
+        tweet = Tweet(
+            user=author,
+            title=f"title {i}",
+            content=f"benchmark tweet {i} #tag{rng.randrange(50)}",
+            created_at=now - timedelta(seconds=tweets - i),
+        )
+        batch.append(tweet)
+        owners = [author.pk]
+        if author.followers_count <= settings.TIMELINE_FANOUT_LIMIT:
+            owners += followers.get(author.pk, [])
+        entries += [TimelineEntry(owner_id=owner, tweet=tweet) for owner in owners]
+        if len(batch) >= 1000:
+            Tweet.objects.bulk_create(batch)
+            TimelineEntry.objects.bulk_create(entries, batch_size=1000)
+            batch, entries = [], []
+    Tweet.objects.bulk_create(batch)
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000)
+    return people
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    ordered = sorted(samples)
+    if not ordered:
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in points}
+
+
+def session_cookie(user):
+    from django.conf import settings
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+    return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+
+def use_async_views(enabled):
+    """Re-import the URLconfs so ``settings.ASYNC_VIEWS`` takes effect."""
+    from django.conf import settings
+    from django.urls import clear_url_caches, set_urlconf
+
+    settings.ASYNC_VIEWS = enabled
+    for module in ("tweets.urls", "accounts.urls", settings.ROOT_URLCONF):
+        importlib.reload(importlib.import_module(module))
+    clear_url_caches()
+    set_urlconf(None)
+
+
+async def asgi_get(app, path, cookie="", headers=()):
+    """Send one GET through an ASGI app in-process; return (status, headers, body)."""
+    return await asgi_request(app, "GET", path, cookie, headers)
+
+
+async def asgi_request(app, method, path, cookie="", headers=(), body=b""):
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode()), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    response = {"status": None, "headers": [], "body": b""}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
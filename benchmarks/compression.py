@@ -0,0 +1,64 @@
+"""Size and CPU cost of compressing seeded timeline pages.
+
+python -m benchmarks.compression --rounds 200
+"""
+
+import argparse
+import time
+
+from .common import seed, setup
+
+
+def cpu_ms(fn, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - started) * 1000 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tweets", type=int, default=5000)
+    args = parser.parse_args()
+
+    teardown = setup()
+    try:
+        from django.core.cache import cache
+        from django.http import HttpResponse
+        from django.test import Client, RequestFactory
+
+        from mysite.middleware import GZipMiddleware
+
+        users = seed(users=args.users, tweets=args.tweets)
+        client = Client()
+        client.force_login(users[1])
+        pages = {
+            "home": client.get("/tweets/home/").content,
+            "profile": client.get(f"/accounts/{users[0].username}/").content,
+            "export": b"".join(client.get("/tweets/api/export/").streaming_content),
+        }
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+
+        print(f"{'page':<10} {'raw':>10} {'gzip':>10} {'ratio':>7} {'cold ms':>9} {'cached ms':>10}")
+        for name, body in pages.items():
+            middleware = GZipMiddleware(lambda request: HttpResponse(body))
+
+            def cold():
+                cache.clear()
+                return middleware(request)
+
+            compressed = cold().content
+            cold_ms = cpu_ms(cold, args.rounds)
+            cached_ms = cpu_ms(lambda: middleware(request), args.rounds)
+            print(
+                f"{name:<10} {len(body):>10} {len(compressed):>10} {len(body) / len(compressed):>7.1f}"
+                f" {cold_ms:>9.3f} {cached_ms:>10.3f}"
+            )
+    finally:
+        teardown()
+
+
+if __name__ == "__main__":
+    main()
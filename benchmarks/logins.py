@@ -0,0 +1,85 @@
+"""Logins per second (and per core) of the sync and async login views under ASGI.
+
+python -m benchmarks.logins --logins 64 --concurrency 32
+
+The sync LoginView hashes on the single thread shared by sync_to_async, so
+it uses one core however many logins arrive. The async view hashes on the
+bounded pool of accounts.hashing (PASSWORD_HASHING_WORKERS threads, one
+per core by default); logins beyond its queue are refused with a 503 and
+counted as "refused". Uses Django's default password hasher.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlencode
+
+from .common import asgi_request, setup, use_async_views
+
+PASSWORD = "benchmark-password"
+# Any 32 characters will do; the header token has to match the cookie.
+CSRF_TOKEN = "b" * 32
+
+
+async def run(app, usernames, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = [
+        (b"content-type", b"application/x-www-form-urlencoded"),
+        (b"x-csrftoken", CSRF_TOKEN.encode()),
+    ]
+    statuses = []
+
+    async def one(index):
+        body = urlencode({"username": usernames[index % len(usernames)], "password": PASSWORD}).encode()
+        async with semaphore:
+            status, _, _ = await asgi_request(
+                app, "POST", "/accounts/login/", f"csrftoken={CSRF_TOKEN}", headers, body
+            )
+        assert status in (302, 503), status
+        statuses.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(logins)))
+    return statuses.count(302) / (time.perf_counter() - started), statuses.count(503)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+
+    teardown = setup(on_disk=True)
+    # Keep the output readable: every new connection's PRAGMAs count against the query budget.
+    logging.getLogger("mysite.queries").setLevel(logging.ERROR)
+    logging.getLogger("django.request").setLevel(logging.ERROR)  # one line per 503
+    try:
+        from django.conf import settings
+        from django.contrib.auth.hashers import make_password
+        from django.core.handlers.asgi import ASGIHandler
+
+        from accounts.models import User
+
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            [User(username=f"bench{i}", email=f"bench{i}@example.com", password=password) for i in range(args.users)]
+        )
+        usernames = [user.username for user in users]
+        cores = os.cpu_count() or 1
+
+        print(f"{'view':<6} {'threads':>8} {'logins/s':>10} {'per core':>10} {'refused':>8}")
+        for enabled in (False, True):
+            use_async_views(enabled)
+            threads = min(settings.PASSWORD_HASHING_WORKERS, cores) if enabled else 1
+            rate, refused = asyncio.run(run(ASGIHandler(), usernames, args.logins, args.concurrency))
+            name = "async" if enabled else "sync"
+            print(f"{name:<6} {threads:>8} {rate:>10.1f} {rate / threads:>10.1f} {refused:>8}")
+    finally:
+        teardown()
+
+
+if __name__ == "__main__":
+    main()
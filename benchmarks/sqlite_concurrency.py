@@ -0,0 +1,104 @@
+"""Concurrent read/write throughput of SQLite as Django used it vs. the tuned profile.
+
+python -m benchmarks.sqlite_concurrency --readers 4 --writers 2 --seconds 5
+
+Worker processes share one database file. Readers page through a user's
+tweets, writers insert tweets one autocommitted row at a time. "default" is
+what the project ran before: a fresh connection per request, rollback journal,
+synchronous=FULL. "tuned" keeps one connection per worker and applies
+mysite.settings.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, ...). Uses plain
+sqlite3, so no Django setup is needed.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from mysite.db import pragma_statements
+from mysite.settings import SQLITE_PRAGMAS
+
+SCHEMA = """
+CREATE TABLE tweet (id char(32) NOT NULL PRIMARY KEY, user_id integer NOT NULL, content varchar(100) NOT NULL);
+CREATE INDEX tweet_user_id_idx ON tweet (user_id, id);
+"""
+READ = "SELECT id, content FROM tweet WHERE user_id = ? ORDER BY id DESC LIMIT 20"
+WRITE = "INSERT INTO tweet VALUES (?, ?, ?)"
+USERS = 1000
+
+
+def connect(path, tuned):
+    # Django's defaults: autocommit and a 5 second busy timeout.
+    db = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if tuned:
+        for statement in pragma_statements(SQLITE_PRAGMAS):
+            db.execute(statement)
+    return db
+
+
+def worker(path, tuned, writer, start, seconds, seed):
+    rng = random.Random(seed)
+    db = connect(path, tuned) if tuned else None
+    time.sleep(max(0, start - time.time()))
+    deadline = start + seconds
+    done = errors = 0
+    while time.time() < deadline:
+        conn = db or connect(path, tuned)
+        try:
+            if writer:
+                conn.execute(WRITE, (uuid.uuid4().hex, rng.randrange(USERS), "x" * 80))
+            else:
+                conn.execute(READ, (rng.randrange(USERS),)).fetchall()
+            done += 1
+        except sqlite3.OperationalError:  # "database is locked" after the busy timeout
+            errors += 1
+        finally:
+            if db is None:
+                conn.close()
+    return writer, done, errors
+
+
+def run(tuned, readers, writers, seconds, rows):
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    try:
+        db = sqlite3.connect(path)
+        db.executescript(SCHEMA)
+        db.executemany(WRITE, ((uuid.uuid4().hex, i % USERS, "x" * 80) for i in range(rows)))
+        db.commit()
+        db.close()
+        # Give every process time to start, then run them all over the same interval.
+        start = time.time() + 1
+        tasks = [(path, tuned, i < writers, start, seconds, i) for i in range(readers + writers)]
+        with multiprocessing.Pool(len(tasks)) as pool:
+            results = pool.starmap(worker, tasks)
+        reads = sum(done for writer, done, _ in results if not writer)
+        writes = sum(done for writer, done, _ in results if writer)
+        errors = sum(errors for _, _, errors in results)
+        return reads / seconds, writes / seconds, errors
+    finally:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    for name, tuned in (("default", False), ("tuned", True)):
+        reads, writes, errors = run(tuned, args.readers, args.writers, args.seconds, args.rows)
+        print(f"{name:<8} {reads:>10.0f} {writes:>10.0f} {errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
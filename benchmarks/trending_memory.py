@@ -0,0 +1,83 @@
+"""Memory of the trending engine vs. exact counters as distinct tags grow.
+
+python -m benchmarks.trending_memory --events 200000
+
+Feeds a Zipf-skewed stream of hashtags spread over a day into
+tweets.trending.TrendingEngine and into plain per-bucket Counters, and
+reports traced memory and throughput at each checkpoint.
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+from .common import setup
+
+
+class ExactBuckets:
+    """What the engine replaces: one unbounded Counter per time bucket."""
+
+    def __init__(self, windows):
+        self.windows = windows
+        self.buckets = {name: {} for name in windows}
+
+    def record(self, tags, timestamp):
+        for name, (length, width) in self.windows.items():
+            bucket = self.buckets[name].setdefault(int(timestamp // width), Counter())
+            bucket.update(tags)
+
+
+def feed(target, stream):
+    for tags, timestamp in stream:
+        target.record(tags, timestamp)
+    return target
+
+
+def traced_size(make, stream):
+    tracemalloc.start()
+    target = feed(make(), stream)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del target
+    return size
+
+
+def rate(make, stream):
+    started = time.perf_counter()
+    feed(make(), stream)
+    return len(stream) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--capacity", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.1)
+    args = parser.parse_args()
+
+    teardown = setup()
+    try:
+        from tweets.trending import WINDOWS, TrendingEngine
+
+        rng = random.Random(0)
+        start = 1_700_000_000
+        print(f"{'distinct':>10} {'events':>10} {'engine MB':>10} {'exact MB':>10} {'engine ev/s':>12}")
+        for distinct in (1_000, 10_000, 100_000, 1_000_000):
+            events = max(args.events, distinct)
+            ranks = rng.choices(range(distinct), weights=[1 / (r + 1) ** args.skew for r in range(distinct)], k=events)
+            stream = [([f"tag{rank}"], start + i * 86_400 / events) for i, rank in enumerate(ranks)]
+            engine_size = traced_size(lambda: TrendingEngine(args.capacity), stream)
+            exact_size = traced_size(lambda: ExactBuckets(WINDOWS), stream)
+            engine_rate = rate(lambda: TrendingEngine(args.capacity), stream)
+            print(
+                f"{distinct:>10} {events:>10} {engine_size / 2**20:>10.1f} {exact_size / 2**20:>10.1f}"
+                f" {engine_rate:>12.0f}"
+            )
+    finally:
+        teardown()
+
+
+if __name__ == "__main__":
+    main()
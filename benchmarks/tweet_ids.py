@@ -0,0 +1,64 @@
+"""Insert throughput and index size with random (uuid4) vs time-ordered (UUIDv7) keys.
+
+python -m benchmarks.tweet_ids --rows 200000
+
+Uses plain sqlite3 with the same layout Django gives tweets_tweet (UUIDs as
+char(32) primary keys), so no Django setup is needed.
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from tweets.ids import uuid7
+
+SCHEMA = """
+CREATE TABLE tweet (id char(32) NOT NULL PRIMARY KEY, user_id integer NOT NULL, content varchar(100) NOT NULL);
+CREATE INDEX tweet_user_id_idx ON tweet (user_id, id);
+"""
+
+
+def run(make_id, rows, batch):
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    try:
+        db = sqlite3.connect(path)
+        db.executescript(SCHEMA)
+        started = time.perf_counter()
+        for start in range(0, rows, batch):
+            db.executemany(
+                "INSERT INTO tweet VALUES (?, ?, ?)",
+                [(make_id().hex, i % 1000, "x" * 80) for i in range(start, min(start + batch, rows))],
+            )
+            db.commit()
+        elapsed = time.perf_counter() - started
+        try:
+            sizes = dict(db.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+        except sqlite3.OperationalError:
+            # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB.
+            sizes = {}
+        db.close()
+        return rows / elapsed, os.path.getsize(path), sizes
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'key':<6} {'rows/s':>10} {'file MB':>9} {'pk index MB':>12} {'user index MB':>14}")
+    for name, make_id in (("uuid4", uuid.uuid4), ("uuid7", uuid7)):
+        rate, size, sizes = run(make_id, args.rows, args.batch)
+        pk = sizes.get("sqlite_autoindex_tweet_1", 0) / 2**20
+        user = sizes.get("tweet_user_id_idx", 0) / 2**20
+        print(f"{name:<6} {rate:>10.0f} {size / 2**20:>9.1f} {pk:>12.1f} {user:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
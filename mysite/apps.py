@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class MysiteConfig(AppConfig):
+    name = "mysite"
+
+    def ready(self):
+        from . import db  # noqa: F401
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragma_statements(pragmas):
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+@receiver(connection_created, dispatch_uid="mysite_sqlite_pragmas")
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Tune every new SQLite connection with ``SQLITE_PRAGMAS``.
+
+    Most of these pragmas only last as long as the connection, which is why
+    they are set here rather than once on the database file.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
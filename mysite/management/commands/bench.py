@@ -0,0 +1,210 @@
+import itertools
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks.common import percentiles, seed, use_async_views
+from mysite.queries import record_queries
+
+ROUTES = (
+    "tweets:home",
+    "tweets:detail",
+    "accounts:user_profile",
+    "tweets:create",
+    "tweets:delete",
+    "accounts:login",
+    "accounts:signup",
+)
+PASSWORD = "benchmark-password"  # what benchmarks.common.seed gives every user
+
+
+def scenarios(users):
+    """Map each route to a factory of zero-argument request callables.
+
+    The factory runs untimed, so per-request setup (a tweet to delete, a
+    fresh anonymous client) does not count towards the route's latency.
+    """
+    from tweets.models import Tweet
+
+    author, reader = users[0], users[1]
+    author_client, reader_client = Client(), Client()
+    author_client.force_login(author)
+    reader_client.force_login(reader)
+    tweet = Tweet.objects.filter(user=author).first() or Tweet.objects.create(
+        user=author, title="bench", content="benchmark tweet", created_at=timezone.now()
+    )
+    numbers = itertools.count()
+
+    def delete():
+        doomed = Tweet.objects.create(user=author, title="bench", content="to be deleted", created_at=timezone.now())
+        return lambda: author_client.post(reverse("tweets:delete", kwargs={"pk": str(doomed.pk)}))
+
+    def signup():
+        name = f"signup{next(numbers)}"
+        data = {"username": name, "email": f"{name}@example.com", "password1": PASSWORD, "password2": PASSWORD}
+        return lambda: Client().post(reverse("accounts:signup"), data)
+
+    return {
+        "tweets:home": lambda: lambda: reader_client.get(reverse("tweets:home")),
+        "tweets:detail": lambda: lambda: reader_client.get(reverse("tweets:detail", kwargs={"pk": str(tweet.pk)})),
+        "accounts:user_profile": lambda: lambda: reader_client.get(
+            reverse("accounts:user_profile", kwargs={"username": author.username})
+        ),
+        "tweets:create": lambda: lambda: author_client.post(
+            reverse("tweets:create"), {"title": "bench", "content": f"benchmark tweet {next(numbers)} #bench"}
+        ),
+        "tweets:delete": delete,
+        "accounts:login": lambda: lambda: Client().post(
+            reverse("accounts:login"), {"username": reader.username, "password": PASSWORD}
+        ),
+        "accounts:signup": signup,
+    }
+
+
+def _send(name, prepare):
+    send = prepare()
+    with record_queries() as queries:
+        started = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - started
+    if response.status_code not in (200, 302):
+        raise CommandError(f"{name} answered {response.status_code}.")
+    return elapsed, queries
+
+
+def measure(name, prepare, requests, warmup=3, memory_samples=5):
+    """Time ``requests`` requests of one route; return its result row."""
+    for _ in range(warmup):
+        _send(name, prepare)
+    latencies, counts, query_times = [], [], []
+    for _ in range(requests):
+        elapsed, queries = _send(name, prepare)
+        latencies.append(elapsed * 1000)
+        counts.append(queries.count)
+        query_times.append(queries.seconds * 1000)
+    # Tracing allocations slows requests down, so it gets its own few runs.
+    peak = 0
+    for _ in range(memory_samples):
+        send = prepare()
+        tracemalloc.start()
+        try:
+            send()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return {
+        "requests": requests,
+        **{f"{point}_ms": round(value, 3) for point, value in percentiles(latencies).items()},
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries": statistics.median_low(counts),
+        "query_ms": round(statistics.fmean(query_times), 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Describe every route that got slower or issues more queries than in ``baseline``."""
+    regressions = []
+    for name, current in results["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current["queries"] > before["queries"]:
+            regressions.append(f"{name}: queries {before['queries']} -> {current['queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and time the main routes through the test client: latency "
+        "percentiles, SQL queries and peak memory per route. Results can be saved as JSON and compared "
+        "with an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--tweets", type=int, default=5000)
+        parser.add_argument("--follows", type=int, default=20)
+        parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent of tweets per author.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--requests", type=int, default=50, help="Timed requests per route.")
+        parser.add_argument("--route", action="append", choices=ROUTES, help="Only these routes (repeatable).")
+        parser.add_argument("--async", action="store_true", dest="async_views", help="Use the async read views.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare with.")
+        parser.add_argument(
+            "--threshold", type=float, default=0.2, help="Relative p95 increase reported as a regression."
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 or options["tweets"] < 1 or options["requests"] < 1:
+            raise CommandError("Need at least 2 users, 1 tweet and 1 request.")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            use_async_views(options["async_views"])
+            # Per-request query logging would flood the output.
+            with override_settings(QUERY_TIMING=False):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"{'route':<24} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'sql ms':>8} {'peak KiB':>9}"
+        )
+        for name, row in results["routes"].items():
+            self.stdout.write(
+                f"{name:<24} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+                f" {row['queries']:>8} {row['query_ms']:>8.2f} {row['peak_kib']:>9.1f}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+        if baseline is not None:
+            regressions = compare(results, baseline, options["threshold"])
+            for line in regressions:
+                self.stderr.write(f"Regression: {line}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}.")
+            self.stdout.write(f"No regressions against {options['baseline']}.")
+
+    def run(self, options):
+        users = seed(
+            users=options["users"],
+            tweets=options["tweets"],
+            follows=options["follows"],
+            skew=options["skew"],
+            seed=options["seed"],
+        )
+        routes = scenarios(users)
+        return {
+            "meta": {
+                "users": options["users"],
+                "tweets": options["tweets"],
+                "follows": options["follows"],
+                "skew": options["skew"],
+                "async_views": options["async_views"],
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "created_at": timezone.now().isoformat(),
+            },
+            "routes": {name: measure(name, routes[name], options["requests"]) for name in options["route"] or ROUTES},
+        }
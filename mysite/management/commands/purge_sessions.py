@@ -0,0 +1,43 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in small batches, unlike clearsessions' single DELETE. "
+        "Meant to run periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, "get_model_class"):
+            # Cache and cookie sessions expire on their own; file sessions are cleared in one go.
+            store.clear_expired()
+            self.stdout.write("Cleared expired sessions.")
+            return
+
+        model = store.get_model_class()
+        using = router.db_for_write(model)
+        expired = model.objects.using(using).filter(expire_date__lt=timezone.now())
+        purged = 0
+        while True:
+            keys = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not keys:
+                break
+            # Each batch is its own short write transaction so other writers
+            # get the SQLite lock between batches. Cached copies expire with the session.
+            with transaction.atomic(using=using):
+                model.objects.using(using).filter(pk__in=keys).delete()
+            purged += len(keys)
+            if sleep:
+                time.sleep(sleep)
+        self.stdout.write(f"Purged {purged} expired sessions.")
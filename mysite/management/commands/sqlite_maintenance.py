@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint the SQLite write-ahead log and refresh query planner statistics. "
+        "Meant to run periodically, e.g. hourly from cron, or in a loop with --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--full-analyze", action="store_true", help="Run ANALYZE over every table instead of PRAGMA optimize."
+        )
+        parser.add_argument("--every", type=float, help="Repeat every this many seconds until interrupted.")
+
+    def handle(self, *args, database, full_analyze, every, **options):
+        connection = connections[database]
+        if connection.vendor != "sqlite":
+            raise CommandError(f"Database {database!r} is not SQLite.")
+        while True:
+            self.run(connection, full_analyze)
+            if not every:
+                break
+            time.sleep(every)
+
+    def run(self, connection, full_analyze):
+        wal = f"{connection.settings_dict['NAME']}-wal"
+        before = os.path.getsize(wal) if os.path.exists(wal) else 0
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE" if full_analyze else "PRAGMA optimize")
+            # TRUNCATE waits for readers (up to busy_timeout), then resets the WAL to zero bytes.
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            busy, log_pages, checkpointed = cursor.fetchone()
+        after = os.path.getsize(wal) if os.path.exists(wal) else 0
+        state = "blocked by a reader or writer" if busy else "complete"
+        self.stdout.write(
+            f"{'ANALYZE' if full_analyze else 'optimize'} done; checkpoint {state}: {checkpointed}/{log_pages} pages,"
+            f" WAL {before} -> {after} bytes in {time.perf_counter() - started:.2f}s."
+        )
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over each configured replica (DATABASE_REPLICAS) with the "
+        "online backup API, so it stands in for replication in local setups. Readers of a replica "
+        "keep working while it is refreshed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=float, help="Repeat every this many seconds until interrupted.")
+        parser.add_argument("--pages", type=int, default=1024, help="Pages copied per step of the backup.")
+
+    def handle(self, *args, every, pages, **options):
+        primary = connections["default"]
+        if primary.vendor != "sqlite":
+            raise CommandError("The primary database is not SQLite.")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured; set DJANGO_REPLICA_DB.")
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                self.sync(primary, alias, pages)
+            if not every:
+                break
+            time.sleep(every)
+
+    def sync(self, primary, alias, pages):
+        started = time.perf_counter()
+        primary.ensure_connection()
+        target = sqlite3.connect(connections[alias].settings_dict["NAME"])
+        try:
+            primary.connection.backup(target, pages=pages)
+        finally:
+            target.close()
+        self.stdout.write(f"Synced {alias} in {time.perf_counter() - started:.2f}s.")
@@ -0,0 +1,218 @@
+"""Per-view request metrics, merged across worker processes.
+
+Each process keeps one set of totals, updated under a short lock (under
+ASGI every request may run on a thread of its own, so per-thread stats
+would pile up). With ``METRICS_DIR`` set a process writes its totals to a
+file of its own every ``METRICS_FLUSH_INTERVAL`` seconds. The ``/metrics`` endpoint adds up the files of all processes
+(including exited ones, so counters never go backwards) and renders them
+in the Prometheus text format.
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+# Upper bounds, in seconds, of the latency histogram buckets (plus +Inf).
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("mysite_metrics_request", default=None)
+
+
+class _Stats:
+    def __init__(self):
+        self.latency = defaultdict(lambda: [0] * (len(BUCKETS) + 1))  # view -> bucket counts
+        self.latency_sum = defaultdict(float)  # view -> seconds
+        self.responses = defaultdict(int)  # (view, status) -> count
+        self.db_seconds = defaultdict(float)  # view -> seconds
+        self.db_queries = defaultdict(int)  # view -> count
+        self.cache = defaultdict(lambda: [0, 0])  # (view, cache) -> [hits, misses]
+
+
+class Registry:
+    def __init__(self):
+        self._stats = _Stats()
+        self._lock = threading.Lock()
+        self._name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._flushed = time.monotonic()
+
+    def observe(self, view, status, seconds, db_seconds, db_queries, cache_lookups):
+        bucket = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            stats = self._stats
+            stats.latency[view][bucket] += 1
+            stats.latency_sum[view] += seconds
+            stats.responses[view, status] += 1
+            stats.db_seconds[view] += db_seconds
+            stats.db_queries[view] += db_queries
+            for name, (hits, misses) in cache_lookups.items():
+                counts = stats.cache[view, name]
+                counts[0] += hits
+                counts[1] += misses
+        if settings.METRICS_DIR and time.monotonic() - self._flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    @property
+    def empty(self):
+        return not self._stats.responses
+
+    def snapshot(self):
+        """This process's totals as JSON-friendly nested dicts."""
+        total = _empty()
+        with self._lock:
+            stats = self._stats
+            for view, counts in stats.latency.items():
+                _add_list(total["latency"], view, counts)
+            for view, seconds in stats.latency_sum.items():
+                _add(total["latency_sum"], view, seconds)
+            for (view, status), n in stats.responses.items():
+                _add(total["responses"], f"{view}|{status}", n)
+            for view, seconds in stats.db_seconds.items():
+                _add(total["db_seconds"], view, seconds)
+            for view, n in stats.db_queries.items():
+                _add(total["db_queries"], view, n)
+            for (view, name), counts in stats.cache.items():
+                _add_list(total["cache"], f"{view}|{name}", counts)
+        return total
+
+    def flush(self):
+        """Write this process's totals to ``METRICS_DIR``."""
+        self._flushed = time.monotonic()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        temporary = directory / f".{self._name}.tmp"
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, directory / f"{self._name}.json")
+
+    def collect(self):
+        """Totals of every process sharing ``METRICS_DIR``, or of this one."""
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush()
+        total = _empty()
+        for path in Path(settings.METRICS_DIR).glob("*.json"):
+            try:
+                merge(total, json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # replaced or removed while reading
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._stats = _Stats()
+
+
+def _empty():
+    return {"latency": {}, "latency_sum": {}, "responses": {}, "db_seconds": {}, "db_queries": {}, "cache": {}}
+
+
+def _add(target, key, value):
+    target[key] = target.get(key, 0) + value
+
+
+def _add_list(target, key, values):
+    current = target.setdefault(key, [0] * len(values))
+    for index, value in enumerate(values):
+        current[index] += value
+
+
+def merge(total, other):
+    for section, values in other.items():
+        for key, value in values.items():
+            if isinstance(value, list):
+                _add_list(total[section], key, value)
+            else:
+                _add(total[section], key, value)
+    return total
+
+
+registry = Registry()
+
+
+@atexit.register
+def _flush_at_exit():
+    if settings.configured and settings.METRICS_DIR and not registry.empty:
+        registry.flush()
+
+
+class RequestMetrics:
+    """Cache lookups of the request being handled, per cache name."""
+
+    def __init__(self):
+        self.cache = defaultdict(lambda: [0, 0])
+
+
+def start_request():
+    return _current.set(RequestMetrics())
+
+
+def end_request(token):
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics
+
+
+def record_cache(name, hits, misses):
+    """Count cache lookups of ``name`` towards the current request, if any."""
+    metrics = _current.get()
+    if metrics is not None:
+        counts = metrics.cache[name]
+        counts[0] += hits
+        counts[1] += misses
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(total):
+    """Render collected totals in the Prometheus text exposition format."""
+    lines = [
+        "# HELP mysite_request_duration_seconds Request latency by view.",
+        "# TYPE mysite_request_duration_seconds histogram",
+    ]
+    for view, counts in sorted(total["latency"].items()):
+        label = f'view="{_escape(view)}"'
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), counts):
+            cumulative += count
+            lines.append(f'mysite_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f"mysite_request_duration_seconds_sum{{{label}}} {total['latency_sum'].get(view, 0.0)}")
+        lines.append(f"mysite_request_duration_seconds_count{{{label}}} {cumulative}")
+
+    lines += ["# HELP mysite_responses_total Responses by view and status.", "# TYPE mysite_responses_total counter"]
+    for key, n in sorted(total["responses"].items()):
+        view, status = key.rsplit("|", 1)
+        lines.append(f'mysite_responses_total{{view="{_escape(view)}",status="{status}"}} {n}')
+
+    for name, section, help_text in (
+        ("mysite_db_seconds_total", "db_seconds", "Time spent in SQL queries by view."),
+        ("mysite_db_queries_total", "db_queries", "SQL queries by view."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for view, value in sorted(total[section].items()):
+            lines.append(f'{name}{{view="{_escape(view)}"}} {value}')
+
+    cache = sorted((key.rsplit("|", 1), counts) for key, counts in total["cache"].items())
+    for name, kind, help_text, value in (
+        ("mysite_cache_hits_total", "counter", "Cache hits by view and cache.", lambda hits, misses: hits),
+        ("mysite_cache_misses_total", "counter", "Cache misses by view and cache.", lambda hits, misses: misses),
+        (
+            "mysite_cache_hit_ratio",
+            "gauge",
+            "Share of cache lookups that hit.",
+            lambda hits, misses: f"{hits / (hits + misses):.4f}" if hits + misses else "NaN",
+        ),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (view, cache_name), (hits, misses) in cache:
+            lines.append(f'{name}{{view="{_escape(view)}",cache="{_escape(cache_name)}"}} {value(hits, misses)}')
+    return "\n".join(lines) + "\n"
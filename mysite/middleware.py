@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import metrics
+from .metrics import record_cache
+from .queries import QueryBudgetExceeded, arecord_queries, check_query_budget, get_query_budget, record_queries
+
+logger = logging.getLogger("mysite.queries")
+
+
+def cache_gzip(view):
+    """Let ``GZipMiddleware`` cache the compressed bodies of ``view``'s responses.
+
+    For pages assembled from cached fragments, which are often byte-identical
+    between requests. Marks each response with ``cache_gzip = True``.
+    """
+    if asyncio.iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            response.cache_gzip = True
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        response.cache_gzip = True
+        return response
+
+    return wrapper
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """``GZipMiddleware`` that keeps the compressed bytes of repeated bodies.
+
+    Only for responses marked by ``cache_gzip``, such as timeline pages
+    assembled from cached tweet cards: their gzip output is cached under a
+    hash of the body and reused instead of being compressed again. Other
+    responses are compressed by the base class, streaming ones on the fly.
+    """
+
+    def process_response(self, request, response):
+        if (
+            not getattr(response, "cache_gzip", False)
+            or response.streaming
+            or len(response.content) < settings.GZIP_CACHE_MIN_SIZE
+            or response.has_header("Content-Encoding")
+            or not re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        cache = caches[settings.GZIP_CACHE_ALIAS]
+        key = "gzip:" + hashlib.blake2b(response.content, digest_size=16).hexdigest()
+        compressed = cache.get(key)
+        record_cache("gzip", compressed is not None, compressed is None)
+        if compressed is None:
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            cache.set(key, compressed, settings.GZIP_CACHE_TIMEOUT)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "gzip"
+        return response
+
+
+class DualModeMiddleware:
+    """Base for middleware that runs in both the sync and the async handler.
+
+    As with Django's own middleware, ``__call__`` returns a coroutine when
+    the next handler is async, so ASGI requests are not switched to a thread
+    around each of these. Subclasses implement ``__call__`` for the sync
+    case and ``__acall__`` for the async one.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class QueryTimingMiddleware(DualModeMiddleware):
+    """Record the SQL queries of each request.
+
+    With ``QUERY_TIMING`` the totals are sent as a ``Server-Timing`` header
+    (shown in the browser's network panel) and logged at debug level, along
+    with statements that ran more than once. Requests to views with a
+    ``query_budget`` are checked against it.
+
+    Queries run while a streaming response is consumed are not counted.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request._query_budget = None
+        started = time.perf_counter()
+        with record_queries() as queries:
+            response = self.get_response(request)
+        return self.report(request, response, queries, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        request._query_budget = None
+        started = time.perf_counter()
+        async with arecord_queries() as queries:
+            response = await self.get_response(request)
+        return self.report(request, response, queries, time.perf_counter() - started)
+
+    def report(self, request, response, queries, elapsed):
+        if request._query_budget is not None:
+            label = f"{request.method} {request.path}"
+            try:
+                check_query_budget(queries, request._query_budget, label)
+            except QueryBudgetExceeded as error:
+                if settings.QUERY_BUDGET_ENFORCE:
+                    raise
+                logger.warning("%s", error)
+
+        if settings.QUERY_TIMING:
+            response.headers["Server-Timing"] = (
+                f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries, {queries.duplicates} duplicates",'
+                f" total;dur={elapsed * 1000:.2f}"
+            )
+            logger.debug(
+                "%s %s: %d queries in %.2fms, %d duplicates",
+                request.method,
+                request.path,
+                queries.count,
+                queries.seconds * 1000,
+                queries.duplicates,
+            )
+            for sql, n in queries.similar.items():
+                logger.debug("  %dx %s", n, sql)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = get_query_budget(view_func)
+
+
+class MetricsMiddleware(DualModeMiddleware):
+    """Record latency, status, SQL time and cache lookups per URL name.
+
+    See ``mysite.metrics``; the totals are served at ``/metrics``.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with record_queries() as queries:
+                response = self.get_response(request)
+        finally:
+            lookups = metrics.end_request(token)
+        return self.observe(request, response, time.perf_counter() - started, queries, lookups)
+
+    async def __acall__(self, request):
+        token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            async with arecord_queries() as queries:
+                response = await self.get_response(request)
+        finally:
+            lookups = metrics.end_request(token)
+        return self.observe(request, response, time.perf_counter() - started, queries, lookups)
+
+    def observe(self, request, response, seconds, queries, lookups):
+        match = getattr(request, "resolver_match", None)
+        metrics.registry.observe(
+            match.view_name if match else "<unresolved>",
+            response.status_code,
+            seconds,
+            queries.seconds,
+            queries.count,
+            lookups.cache,
+        )
+        return response
+
+
+class ReplicaPinMiddleware(DualModeMiddleware):
+    """Pin users to the primary database for a while after they write.
+
+    Any successful request with an unsafe method (creating or deleting a
+    tweet, signing up, ...) sets a cookie holding the time the pin ends;
+    ``mysite.routers.replica_reads`` checks it.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE") and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,105 @@
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+class QueryRecorder:
+    """Database execute wrapper recording the queries run through it.
+
+    Keeps the count, the time spent in the database, and how often each
+    statement ran: ``duplicates`` are identical statements with identical
+    parameters, ``similar`` the same statement with any parameters, the
+    usual sign of a query issued once per row (N+1).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+            self.executions[sql, repr(params)] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.executions.values())
+
+    @property
+    def similar(self):
+        return {sql: n for sql, n in self.statements.items() if n > 1}
+
+
+@contextmanager
+def record_queries(using=None):
+    """Record the queries of the current thread on ``using`` (default: every database)."""
+    recorder = QueryRecorder()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+@asynccontextmanager
+async def arecord_queries(using=None):
+    """``record_queries`` for async code.
+
+    Django runs a request's database work through ``sync_to_async``, on one
+    thread per request under ASGI, so the recorder goes on the connections
+    of that thread rather than the event loop's.
+    """
+    recording = record_queries(using)
+    recorder = await sync_to_async(recording.__enter__)()
+    try:
+        yield recorder
+    finally:
+        await sync_to_async(recording.__exit__)(None, None, None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries, per_shard=0):
+    """Declare how many queries a view may run per request.
+
+    Works on function views and view classes. ``QueryTimingMiddleware``
+    checks every request against it: over budget it logs a warning, or
+    raises ``QueryBudgetExceeded`` when ``QUERY_BUDGET_ENFORCE`` is set, as
+    it is for the test suite. Views that read every tweet shard may run
+    ``per_shard`` more queries for each of ``TWEET_SHARDS``.
+    """
+
+    def decorator(view):
+        view.query_budget = (max_queries, per_shard)
+        return view
+
+    return decorator
+
+
+def get_query_budget(view):
+    budget = getattr(view, "query_budget", None)
+    if budget is None:
+        budget = getattr(getattr(view, "view_class", None), "query_budget", None)
+    if budget is None:
+        return None
+    max_queries, per_shard = budget
+    return max_queries + per_shard * len(settings.TWEET_SHARDS)
+
+
+def check_query_budget(recorder, budget, label):
+    if recorder.count > budget:
+        lines = "\n".join(f"  {n}x {sql}" for sql, n in recorder.statements.most_common())
+        raise QueryBudgetExceeded(f"{label} ran {recorder.count} queries, over its budget of {budget}:\n{lines}")
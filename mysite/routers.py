@@ -0,0 +1,80 @@
+import asyncio
+import contextvars
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+
+_replica_reads = contextvars.ContextVar("mysite_replica_reads", default=False)
+
+
+class ReplicaRouter:
+    """Send reads inside ``replica_reads`` views to a random replica.
+
+    Writes always go to the primary, also for instances read from a replica.
+    Other reads are left to the next router (or the default database).
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        aliases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+def pinned_to_primary(request):
+    """Whether ``request`` comes from a user who wrote moments ago."""
+    try:
+        return float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def reads_replicas(request):
+    """Whether ``replica_reads`` views read from a replica for ``request``."""
+    return bool(settings.DATABASE_REPLICAS) and not pinned_to_primary(request)
+
+
+def replica_reads(view):
+    """Let ``view`` read from the replicas, unless its user is pinned to the primary.
+
+    Users are pinned for ``REPLICA_PIN_SECONDS`` after any successful write
+    request (see ``ReplicaPinMiddleware``), so they see their own changes
+    however far the replicas lag. Marks the view with ``replica_reads = True``.
+    """
+    if asyncio.iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _replica_reads.set(not pinned_to_primary(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+
+        async_wrapper.replica_reads = True
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_reads.set(not pinned_to_primary(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    wrapper.replica_reads = True
+    return wrapper
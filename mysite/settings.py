@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "mysite",
     "accounts.apps.AccountsConfig",
     "tweets.apps.TweetsConfig",
     "welcome.apps.WelcomeConfig",
@@ -44,6 +46,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "mysite.middleware.MetricsMiddleware",
+    "mysite.middleware.QueryTimingMiddleware",
+    "mysite.middleware.GZipMiddleware",
+    "mysite.middleware.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -72,6 +78,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "mysite.wsgi.application"
 
+# Route the read-only timeline views to their native async implementations.
+# Only worthwhile when serving through mysite.asgi.
+ASYNC_VIEWS = os.environ.get("DJANGO_ASYNC_VIEWS", "") == "1"
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -80,7 +90,49 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Closed after each request by default: under ASGI each request runs its
+        # queries on a thread of its own, so kept connections would pile up.
+        # mysite/wsgi.py keeps them for 600s instead.
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# Optional read replica: a copy of the primary kept current by "manage.py sync_replica"
+# (or any other replication). Views decorated with mysite.routers.replica_reads read
+# from it, except for users who wrote within the last REPLICA_PIN_SECONDS.
+if os.environ.get("DJANGO_REPLICA_DB"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ["DJANGO_REPLICA_DB"],
+        "TEST": {"MIRROR": "default"},
     }
+DATABASE_REPLICAS = ["replica"] if "replica" in DATABASES else []
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = "primary_until"
+
+# Databases tweets can be sharded over by author (tweets/shards.py); users, sessions and
+# follows always stay in "default". Sharding is on when TWEET_SHARDS lists them, e.g. with
+# DJANGO_TWEET_SHARDS=4; run "manage.py migrate --database <alias>" for each. The test
+# runner (mysite/testing.py) declares two more for the suite.
+TWEET_SHARD_DATABASES = [f"tweets{index}" for index in range(int(os.environ.get("DJANGO_TWEET_SHARDS", 0)))]
+TWEET_SHARDS = list(TWEET_SHARD_DATABASES)
+for alias in TWEET_SHARD_DATABASES:
+    DATABASES[alias] = {**DATABASES["default"], "NAME": BASE_DIR / f"{alias}.sqlite3"}
+
+DATABASE_ROUTERS = ["tweets.shards.ShardRouter", "mysite.routers.ReplicaRouter"]
+
+# Applied to every new SQLite connection (mysite/db.py). WAL lets readers run alongside
+# the writer; NORMAL sync is durable in WAL mode except for the last commits on power loss.
+# Run "manage.py sqlite_maintenance" periodically (e.g. hourly from cron) to checkpoint
+# the WAL and refresh query planner statistics.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # ms
+    "cache_size": -64000,  # KiB
+    "mmap_size": 256 * 2**20,
+    "temp_store": "MEMORY",
 }
 
 
@@ -132,3 +184,115 @@ LOGIN_REDIRECT_URL = "/tweets/home/"
 LOGIN_URL = "accounts:login"
 
 LOGOUT_REDIRECT_URL = "/"
+
+# Number of tweets per timeline page (home / profile)
+TIMELINE_PAGE_SIZE = 20
+
+# Home inboxes keep at most this many entries per user
+TIMELINE_INBOX_SIZE = 800
+# Authors with more followers than this are merged in at read time instead of fanned out
+TIMELINE_FANOUT_LIMIT = 1000
+# Inboxes are trimmed on roughly one out of this many new tweets
+TIMELINE_TRIM_INTERVAL = 16
+
+# Set DJANGO_REDIS_URL (e.g. redis://127.0.0.1:6379/0, needs the redis package) to share the cache between worker
+# processes; otherwise each process has its own.
+if os.environ.get("DJANGO_REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["DJANGO_REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+SHARED_CACHE = CACHES["default"]["BACKEND"] != "django.core.cache.backends.locmem.LocMemCache"
+
+# With a shared cache, sessions are read from it and written through to the database,
+# and the logged-in user is cached too (accounts/lookup.py). Per-process caches would
+# let other workers accept a session after its logout or password change, so then
+# both stay off. "manage.py purge_sessions" deletes expired rows; run it periodically.
+if SHARED_CACHE:
+    SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+    SESSION_CACHE_ALIAS = "default"
+    MIDDLEWARE[MIDDLEWARE.index("django.contrib.auth.middleware.AuthenticationMiddleware")] = (
+        "accounts.middleware.CachedAuthenticationMiddleware"
+    )
+USER_CACHE_ALIAS = "default" if SHARED_CACHE else None
+USER_CACHE_TIMEOUT = 60
+
+# Async logins (accounts/hashing.py) hash passwords on this many threads; beyond
+# PASSWORD_HASHING_QUEUE waiting logins, further ones get a 503 right away.
+PASSWORD_HASHING_WORKERS = int(os.environ.get("DJANGO_PASSWORD_HASHING_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASHING_QUEUE = 4 * PASSWORD_HASHING_WORKERS
+
+# Rendered tweet cards (templates/tweets/_card.html)
+TWEET_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Size (characters) of the optional in-process LRU in front of the cache; 0 disables it
+TWEET_CARD_LOCAL_CACHE_SIZE = 0
+TWEET_CARD_LOCAL_CACHE_TIMEOUT = 30
+
+# Single tweets (with their author) looked up by id; misses are cached for less time.
+# Only with a shared cache: other workers would keep serving a deleted or edited tweet.
+TWEET_CACHE_ALIAS = "default" if SHARED_CACHE else None
+TWEET_CACHE_TIMEOUT = 60 * 60
+TWEET_CACHE_MISSING_TIMEOUT = 60
+
+# Like counts are buffered per process and written by a background thread every
+# LIKE_FLUSH_INTERVAL seconds, or once LIKE_FLUSH_MAX_PENDING tweets have pending deltas.
+# Without LIKE_FLUSH_IN_BACKGROUND (as in tests) they are only written by counter.flush().
+LIKE_FLUSH_INTERVAL = 5
+LIKE_FLUSH_MAX_PENDING = 1000
+LIKE_FLUSH_IN_BACKGROUND = True
+
+# Trending hashtags: tags kept per time bucket, and how long rankings are cached
+TRENDING_CAPACITY = 1000
+TRENDING_CACHE_TIMEOUT = 30
+# Seconds between rebuilds of each process's trending counts from the hashtag index,
+# which picks up other workers' tweets and drops tombstoned ones. Rebuilds run on a
+# background thread while the old counts are served; without TRENDING_REBUILD_IN_BACKGROUND
+# (as in tests) the request that finds the counts stale rebuilds them.
+TRENDING_REBUILD_INTERVAL = 300
+TRENDING_REBUILD_IN_BACKGROUND = True
+TRENDING_MAX_LIMIT = 50
+# How long the exact rankings of "manage.py trending --recompute" are served; run it more often than this
+TRENDING_RECOMPUTE_CACHE_TIMEOUT = 60 * 15
+
+# Rows fetched per database round trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Compressed bodies of cache_gzip views (mysite/middleware.py) of at least GZIP_CACHE_MIN_SIZE bytes are
+# cached by content hash
+GZIP_CACHE_ALIAS = "default"
+GZIP_CACHE_MIN_SIZE = 1024
+GZIP_CACHE_TIMEOUT = 60 * 10
+
+# Live timeline (Server-Sent Events)
+LIVE_HEARTBEAT_INTERVAL = 15
+LIVE_QUEUE_SIZE = 100
+LIVE_RETRY_MS = 3000
+LIVE_MAX_DURATION = 300
+
+# Per-request SQL totals in a Server-Timing header and the "mysite.queries" debug log.
+# Views declare a query budget with mysite.queries.query_budget; going over it logs a
+# warning, or fails the request when QUERY_BUDGET_ENFORCE is set (as the test runner does).
+QUERY_TIMING = DEBUG
+QUERY_BUDGET_ENFORCE = False
+TEST_RUNNER = "mysite.testing.TestRunner"
+
+# Per-view request metrics served at /metrics (staff only). Set METRICS_DIR to a directory
+# shared by all worker processes of a host so their totals are merged; each process writes
+# its own file there every METRICS_FLUSH_INTERVAL seconds. Clear it when deploying.
+METRICS_DIR = os.environ.get("DJANGO_METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"mysite.queries": {"handlers": ["console"], "level": "DEBUG" if DEBUG else "WARNING"}},
+}
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+# Declared for the suite even when sharding is off, so sharding tests can turn it on.
+TEST_SHARDS = ["tweets0", "tweets1"]
+
+
+class TestRunner(DiscoverRunner):
+    """Fail tests whose requests go over a view's query budget."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_ENFORCE = True
+        # Keep the suite's output free of per-request query logs.
+        settings.QUERY_TIMING = False
+        # Test databases mirror the primary and test cases only query "default".
+        settings.DATABASE_REPLICAS = []
+        # Tests flush buffered like counts explicitly, inside their own transaction.
+        settings.LIKE_FLUSH_IN_BACKGROUND = False
+        # Likewise trending rebuilds, which could not see a test's uncommitted tweets.
+        settings.TRENDING_REBUILD_IN_BACKGROUND = False
+        # Before the test databases are created; they are in memory, so no files appear.
+        for alias in TEST_SHARDS:
+            if alias not in settings.DATABASES:
+                settings.DATABASES[alias] = {
+                    **settings.DATABASES["default"],
+                    "NAME": settings.BASE_DIR / f"{alias}.sqlite3",
+                    "TEST": {},
+                }
+                settings.TWEET_SHARD_DATABASES = [*settings.TWEET_SHARD_DATABASES, alias]
+        connections.configure_settings(settings.DATABASES)
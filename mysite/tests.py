@@ -0,0 +1,309 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks.common import asgi_get, seed
+from tweets.versions import conditional_page
+
+from . import metrics
+from .management.commands.bench import compare, measure, scenarios
+from .middleware import GZipMiddleware, MetricsMiddleware, QueryTimingMiddleware, ReplicaPinMiddleware, cache_gzip
+from .queries import QueryBudgetExceeded, query_budget, record_queries
+from .routers import ReplicaRouter, replica_reads
+
+User = get_user_model()
+
+BODY = b"<p>tweet card</p>" * 200
+
+
+@override_settings(GZIP_CACHE_MIN_SIZE=1024)
+class TestGZipMiddleware(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+    def process(self, response, request=None):
+        return GZipMiddleware(lambda request: response)(request or self.request)
+
+    def cached_page(self):
+        return cache_gzip(lambda request: HttpResponse(BODY))(self.request)
+
+    def test_compresses_and_reuses_cached_bytes(self):
+        first = self.process(self.cached_page())
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(first.content), BODY)
+        with mock.patch("mysite.middleware.compress_string") as compress:
+            second = self.process(self.cached_page())
+        compress.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Length"], str(len(first.content)))
+        self.assertIn("Accept-Encoding", second["Vary"])
+
+    def test_compresses_unmarked_responses_without_caching(self):
+        with mock.patch("mysite.middleware.caches") as caches:
+            response = self.process(HttpResponse(BODY))
+        caches.__getitem__.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_skips_clients_without_gzip(self):
+        request = RequestFactory().get("/")
+        response = self.process(HttpResponse(BODY), request)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, BODY)
+
+    def test_compresses_streaming_responses(self):
+        response = self.process(StreamingHttpResponse(iter([BODY, BODY])))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), BODY * 2)
+
+    def test_weakens_strong_etag(self):
+        response = self.cached_page()
+        response["ETag"] = '"abc"'
+        self.assertEqual(self.process(response)["ETag"], 'W/"abc"')
+
+
+class TestBench(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.routes = scenarios(seed(users=3, tweets=20, follows=2))
+
+    def test_measures_routes(self):
+        for name in ("tweets:home", "tweets:detail", "tweets:create", "tweets:delete"):
+            with self.subTest(name):
+                row = measure(name, self.routes[name], requests=3, warmup=1, memory_samples=1)
+                self.assertEqual(row["requests"], 3)
+                self.assertLessEqual(row["p50_ms"], row["p99_ms"])
+                self.assertGreater(row["queries"], 0)
+                self.assertGreater(row["peak_kib"], 0)
+
+    def test_compare_flags_slower_routes_and_extra_queries(self):
+        baseline = {"routes": {"tweets:home": {"p95_ms": 10.0, "queries": 5}}}
+        results = {
+            "routes": {
+                "tweets:home": {"p95_ms": 11.0, "queries": 5},
+                "tweets:detail": {"p95_ms": 99.0, "queries": 9},
+            }
+        }
+        self.assertEqual(compare(results, baseline, threshold=0.2), [])
+        results["routes"]["tweets:home"] = {"p95_ms": 13.0, "queries": 6}
+        self.assertEqual(
+            compare(results, baseline, threshold=0.2),
+            ["tweets:home: p95 10.0ms -> 13.0ms", "tweets:home: queries 5 -> 6"],
+        )
+
+
+def two_user_queries(request):
+    list(User.objects.filter(pk=1))
+    list(User.objects.filter(pk=1))
+    return HttpResponse("ok")
+
+
+class TestQueryTimingMiddleware(TestCase):
+    def process(self, view):
+        request = RequestFactory().get("/some/path/")
+        middleware = QueryTimingMiddleware(
+            lambda request: middleware.process_view(request, view, (), {}) or view(request)
+        )
+        return middleware(request)
+
+    def test_record_queries(self):
+        with record_queries() as queries:
+            two_user_queries(None)
+            list(User.objects.filter(pk=2))
+        self.assertEqual(queries.count, 3)
+        self.assertEqual(queries.duplicates, 1)
+        self.assertEqual(list(queries.similar.values()), [3])
+        self.assertGreater(queries.seconds, 0)
+
+    @override_settings(QUERY_TIMING=True)
+    def test_server_timing_header(self):
+        with self.assertLogs("mysite.queries", "DEBUG") as logs:
+            response = self.process(two_user_queries)
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="2 queries, 1 duplicates", total;dur=[\d.]+$'
+        )
+        self.assertIn("GET /some/path/: 2 queries", logs.output[0])
+
+    @override_settings(QUERY_TIMING=True)
+    async def test_async_handler(self):
+        view = query_budget(2)(two_user_queries)
+
+        async def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return await sync_to_async(view)(request)
+
+        middleware = QueryTimingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get("/some/path/"))
+        self.assertIn('desc="2 queries, 1 duplicates"', response["Server-Timing"])
+        for cls in (MetricsMiddleware, ReplicaPinMiddleware):
+            self.assertTrue(iscoroutinefunction(cls(get_response)))
+            self.assertFalse(iscoroutinefunction(cls(two_user_queries)))
+
+    @override_settings(QUERY_TIMING=False)
+    def test_no_header_unless_enabled(self):
+        self.assertNotIn("Server-Timing", self.process(two_user_queries))
+
+    def test_over_budget_fails_when_enforced(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "GET /some/path/ ran 2 queries, over its budget of 1"):
+            self.process(query_budget(1)(lambda request: two_user_queries(request)))
+        self.assertEqual(self.process(query_budget(2)(lambda request: two_user_queries(request))).status_code, 200)
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False)
+    def test_over_budget_is_logged_otherwise(self):
+        with self.assertLogs("mysite.queries", "WARNING"):
+            response = self.process(query_budget(1)(lambda request: two_user_queries(request)))
+        self.assertEqual(response.status_code, 200)
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.user = User.objects.create(username="user")
+
+    def scrape(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    @override_settings(SHARED_CACHE=True)
+    def test_records_views(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("tweets:home"))
+        self.client.get(reverse("tweets:home"))
+        self.client.get("/no/such/page/")
+        body = self.scrape()
+        self.assertIn('mysite_request_duration_seconds_count{view="tweets:home"} 2', body)
+        self.assertIn('mysite_request_duration_seconds_bucket{view="tweets:home",le="+Inf"} 2', body)
+        self.assertIn('mysite_responses_total{view="tweets:home",status="200"} 2', body)
+        self.assertIn('mysite_responses_total{view="<unresolved>",status="404"} 1', body)
+        self.assertRegex(body, r'mysite_db_queries_total\{view="tweets:home"\} [1-9]')
+        # The second request found the versions the first one stored.
+        self.assertRegex(body, r'mysite_cache_hits_total\{view="tweets:home",cache="versions"\} [1-9]')
+
+    async def test_asgi_requests_share_the_process_totals(self):
+        # Each request runs its sync views on a thread of its own.
+        app = ASGIHandler()
+        for _ in range(20):
+            status, _, _ = await asgi_get(app, "/no/such/page/")
+            self.assertEqual(status, 404)
+        self.assertEqual(metrics.registry.snapshot()["responses"], {"<unresolved>|404": 20})
+
+    def test_restricted_to_staff(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+    def test_merges_worker_processes(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.client.force_login(self.user)
+            self.client.get(reverse("tweets:home"))
+            other = {
+                "latency": {"tweets:home": [1] + [0] * len(metrics.BUCKETS)},
+                "latency_sum": {"tweets:home": 0.001},
+                "responses": {"tweets:home|200": 1},
+                "db_seconds": {},
+                "db_queries": {},
+                "cache": {"tweets:home|cards": [3, 1]},
+            }
+            with open(os.path.join(directory, "12345-deadbeef.json"), "w") as file:
+                json.dump(other, file)
+            body = self.scrape()
+        self.assertIn('mysite_request_duration_seconds_count{view="tweets:home"} 2', body)
+        self.assertIn('mysite_responses_total{view="tweets:home",status="200"} 2', body)
+
+
+class TestSQLiteProfile(TestCase):
+    def test_pragmas_are_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS["busy_timeout"])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+
+class TestSQLiteMaintenance(TransactionTestCase):
+    # ANALYZE and checkpoints cannot run inside TestCase's transaction.
+    def test_maintenance_command(self):
+        out = StringIO()
+        call_command("sqlite_maintenance", stdout=out)
+        self.assertIn("optimize done; checkpoint", out.getvalue())
+
+
+class TestPurgeSessions(TestCase):
+    def test_deletes_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for index in range(5):
+            Session.objects.create(session_key=f"expired{index}", session_data="", expire_date=now - timedelta(1))
+        Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(1))
+        out = StringIO()
+        call_command("purge_sessions", batch_size=2, sleep=0, stdout=out)
+        self.assertIn("Purged 5 expired sessions.", out.getvalue())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+
+
+class TestReplicaRouting(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("writer", "writer@example.com", "password")
+        self.client.force_login(self.user)
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_router_sends_only_replica_reads_to_replicas(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(User))
+        self.assertEqual(replica_reads(lambda request: router.db_for_read(User))(RequestFactory().get("/")), "replica")
+        self.assertEqual(
+            replica_reads(lambda request: router.db_for_write(User))(RequestFactory().get("/")), "default"
+        )
+        self.assertFalse(router.allow_migrate("replica", "tweets"))
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_pinned_users_read_from_the_primary(self):
+        request = RequestFactory().get("/")
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = str(time.time() + 5)
+        self.assertIsNone(replica_reads(lambda request: ReplicaRouter().db_for_read(User))(request))
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = str(time.time() - 5)
+        self.assertEqual(replica_reads(lambda request: ReplicaRouter().db_for_read(User))(request), "replica")
+
+    @override_settings(DATABASE_REPLICAS=["replica"], SHARED_CACHE=True)
+    def test_pages_read_from_a_replica_get_no_etag(self):
+        view = conditional_page(lambda request: "v1")(replica_reads(lambda request: HttpResponse("page")))
+        self.assertFalse(view(RequestFactory().get("/")).has_header("ETag"))
+        # A tag from a page read from the primary still earns a 304 while the versions hold.
+        self.assertEqual(view(RequestFactory().get("/", HTTP_IF_NONE_MATCH='"v1"')).status_code, 304)
+        request = RequestFactory().get("/")
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = str(time.time() + 5)
+        self.assertEqual(view(request)["ETag"], '"v1"')
+
+    def test_writes_pin_the_user(self):
+        response = self.client.get(reverse("tweets:home"))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.post(reverse("tweets:create"), {"title": "t", "content": "fresh tweet"})
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertGreater(float(cookie.value), time.time())
+        self.assertEqual(cookie["max-age"], settings.REPLICA_PIN_SECONDS)
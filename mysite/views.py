@@ -0,0 +1,13 @@
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics
+from .queries import query_budget
+
+
+@query_budget(2)
+def metrics_view(request):
+    if not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(metrics.registry.collect()), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,6 +1,11 @@
 # from django.contrib import adm        in
 from django.contrib import admin
 
-from .models import Tweet
+from .models import Hashtag, Like, Mention, TimelineEntry, Tweet, TweetHashtag
 
 admin.site.register(Tweet)
+admin.site.register(TimelineEntry)
+admin.site.register(Hashtag)
+admin.site.register(TweetHashtag)
+admin.site.register(Mention)
+admin.site.register(Like)
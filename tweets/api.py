@@ -0,0 +1,180 @@
+import json
+from functools import wraps
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from mysite.queries import query_budget
+
+from .lookup import get_tweet, parse_tweet_id
+from .models import Tweet
+from .pagination import paginate_tweets
+from .search import SearchQueryError, search_tweets
+from .shards import scan_shards
+from .timeline import home_timeline
+from .trending import WINDOWS, trending
+
+User = get_user_model()
+
+EXPORT_FIELDS = ("id", "user_id", "title", "content", "created_at")
+EXPORT_KEYS = ("id", "user", "title", "content", "created_at")
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"detail": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def serialize_tweet(tweet):
+    return {
+        "id": str(tweet.id),
+        "user": tweet.user.username,
+        "title": tweet.title,
+        "content": tweet.content,
+        "created_at": tweet.created_at.isoformat(),
+    }
+
+
+def serialize_page(page):
+    return {
+        "tweets": [serialize_tweet(tweet) for tweet in page],
+        "older_cursor": page.older_cursor,
+        "newer_cursor": page.newer_cursor,
+    }
+
+
+@query_budget(4, per_shard=1)
+@api_login_required
+def home_api(request):
+    return JsonResponse(serialize_page(home_timeline(request.user, request.GET)))
+
+
+@query_budget(4)
+@api_login_required
+def user_tweets_api(request, username):
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    page = paginate_tweets(user.tweet_set.all(), request.GET)
+    return JsonResponse(serialize_page(page))
+
+
+@query_budget(3, per_shard=1)
+@api_login_required
+def tweet_api(request, pk):
+    pk = parse_tweet_id(pk)
+    tweet = get_tweet(pk) if pk else None
+    if tweet is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(serialize_tweet(tweet))
+
+
+@query_budget(4, per_shard=2)
+@api_login_required
+def search_api(request):
+    try:
+        page = search_tweets(request.GET.get("q", "").strip(), request.GET)
+    except SearchQueryError as error:
+        return JsonResponse({"detail": str(error)}, status=400)
+    return JsonResponse({"tweets": [serialize_tweet(tweet) for tweet in page], "next_cursor": page.next_cursor})
+
+
+def trending_key(window):
+    return f"trending:{window}"
+
+
+@query_budget(3, per_shard=1)
+@api_login_required
+def trending_api(request):
+    """Top hashtags of the last hour (``?window=1h``) or day (``24h``).
+
+    Rankings are cached for ``TRENDING_CACHE_TIMEOUT`` seconds; the trending
+    management command can replace them with exact counts, cached for
+    ``TRENDING_RECOMPUTE_CACHE_TIMEOUT``.
+    """
+    window = request.GET.get("window", "1h")
+    if window not in WINDOWS:
+        return JsonResponse({"detail": f"window must be one of {', '.join(WINDOWS)}."}, status=400)
+    try:
+        limit = min(max(int(request.GET.get("limit", 10)), 1), settings.TRENDING_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({"detail": "limit must be an integer."}, status=400)
+    tags = cache.get(trending_key(window))
+    if tags is None:
+        tags = trending(window, settings.TRENDING_MAX_LIMIT)
+        cache.set(trending_key(window), tags, settings.TRENDING_CACHE_TIMEOUT)
+    return JsonResponse({"window": window, "tags": [{"tag": tag, "count": count} for tag, count in tags[:limit]]})
+
+
+def export_rows(queryset, chunk_size):
+    """``EXPORT_FIELDS`` rows of ``queryset`` from every shard, oldest first, with usernames for user ids.
+
+    Users stay in "default" when tweets are sharded, so usernames are looked
+    up a chunk at a time rather than joined. Tweets of deleted users are left out.
+    """
+    rows = scan_shards(queryset.order_by("id"), EXPORT_FIELDS, chunk_size)
+    while batch := list(islice(rows, chunk_size)):
+        usernames = dict(User.objects.filter(pk__in={row[1] for row in batch}).values_list("pk", "username"))
+        for pk, user_id, *rest in batch:
+            if user_id in usernames:
+                yield (pk, usernames[user_id], *rest)
+
+
+def _ndjson_lines(rows, chunk_size):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_KEYS, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+        if len(lines) == chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+async def _aiterate(chunks):
+    """Iterate the sync iterator ``chunks`` from async code.
+
+    Each chunk is fetched on the request's thread, which holds the database
+    connection the iterator reads through.
+    """
+    fetch = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await fetch(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+@query_budget(3)
+@api_login_required
+def export_api(request):
+    """Stream every tweet (optionally one user's) as NDJSON, oldest first.
+
+    Rows are projected with ``values_list()`` and read with a server-side
+    ``iterator()`` per shard, so memory stays flat regardless of table size.
+    Under ASGI the lines are sent through an async iterator: Django would
+    read a sync one into a list before sending any of it.
+    """
+    queryset = Tweet.objects.all()
+    if "user" in request.GET:
+        # Looked up first: tweets may be sharded away from the users table.
+        user = User.objects.filter(username=request.GET["user"]).first()
+        queryset = queryset.filter(user=user) if user else queryset.none()
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    lines = _ndjson_lines(export_rows(queryset, chunk_size), chunk_size)
+    if isinstance(request, ASGIRequest):
+        lines = _aiterate(lines)
+    response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    response["Content-Disposition"] = 'attachment; filename="tweets.ndjson"'
+    return response
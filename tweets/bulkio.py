@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+FORMATS = ("ndjson", "csv")
+
+
+def read_rows(path, fmt, start=0):
+    """Yield ``(line number, row)`` from an NDJSON or CSV file, one at a time.
+
+    Rows on lines up to ``start`` are skipped without being parsed. An NDJSON
+    line that is not a JSON object is yielded as ``None``.
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        if fmt == "csv":
+            reader = csv.DictReader(source)
+            for row in reader:
+                if reader.line_num > start:
+                    yield reader.line_num, row
+            return
+        for number, line in enumerate(source, 1):
+            if number <= start or not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+
+
+class Checkpoint:
+    """The last input line whose batch is committed, kept in a small file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def save(self, line):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            file.write(str(line))
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ImportCommand(BaseCommand):
+    """Base for commands that bulk-load rows from an NDJSON or CSV file.
+
+    Subclasses implement ``build(row)``, returning an unsaved model instance
+    or raising ``ValidationError``, and ``insert(objects)``. Each batch is
+    inserted in its own transaction and then recorded in a checkpoint file,
+    so an interrupted import resumes after the last committed batch. Inserts
+    must ignore rows that already exist: a batch committed just before a
+    crash may be replayed.
+    """
+
+    report_every = 10  # batches
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Default: from the file extension, else ndjson.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", help="Default: <path>.checkpoint")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+
+    def prepare(self):
+        """Called once before the first row is read."""
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def insert(self, objects):
+        raise NotImplementedError
+
+    def handle(self, *args, path, format, batch_size, checkpoint, restart, **options):
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+        fmt = format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        checkpoint = Checkpoint(checkpoint or f"{path}.checkpoint")
+        start = 0 if restart else checkpoint.load()
+        if start:
+            self.stdout.write(f"Resuming after line {start}.")
+
+        self.prepare()
+        started = time.perf_counter()
+        imported = invalid = batches = 0
+        batch = []
+        for number, row in read_rows(path, fmt, start):
+            try:
+                if row is None:
+                    raise ValidationError("Not a JSON object.")
+                batch.append(self.build(row))
+            except ValidationError as error:
+                invalid += 1
+                self.stderr.write(f"Line {number}: {'; '.join(error.messages)}")
+            if len(batch) == batch_size:
+                self._commit(batch, checkpoint, number)
+                imported += len(batch)
+                batches += 1
+                batch = []
+                if batches % self.report_every == 0:
+                    self._report(imported, invalid, started)
+        if batch:
+            self._commit(batch, checkpoint, number)
+            imported += len(batch)
+        checkpoint.clear()
+        self._report(imported, invalid, started)
+
+    def _commit(self, batch, checkpoint, line):
+        with transaction.atomic():
+            self.insert(batch)
+        checkpoint.save(line)
+
+    def _report(self, imported, invalid, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{imported} rows in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s), {invalid} invalid."
+        )
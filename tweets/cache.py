@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class LRUCache:
+    """In-process LRU for string values, evicting once the summed length of
+    keys and values exceeds ``max_size``."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                value, expires, _ = item
+                if expires < now:
+                    self._pop(key)
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping):
+        expires = time.monotonic() + self.timeout
+        with self._lock:
+            for key, value in mapping.items():
+                cost = len(key) + len(value)
+                if cost > self.max_size:
+                    continue
+                self._pop(key)
+                self._data[key] = (value, expires, cost)
+                self.size += cost
+            while self.size > self.max_size:
+                _, (_, _, cost) = self._data.popitem(last=False)
+                self.size -= cost
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[2]
+
+
+class TieredCache:
+    """A Django cache backend with an optional ``LRUCache`` in front of it.
+
+    The local tier is per process, so entries there are only kept for
+    ``local_timeout`` seconds to bound staleness after another worker
+    invalidates a key.
+    """
+
+    def __init__(self, alias="default", timeout=None, local_max_size=0, local_timeout=30):
+        self.alias = alias
+        self.timeout = timeout
+        self.local = LRUCache(local_max_size, local_timeout) if local_max_size else None
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = self.local.get_many(keys) if self.local else {}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            remote = self.backend.get_many(missing)
+            if self.local and remote:
+                self.local.set_many(remote)
+            found.update(remote)
+        return found
+
+    def set_many(self, mapping):
+        if not mapping:
+            return
+        self.backend.set_many(mapping, self.timeout)
+        if self.local:
+            self.local.set_many(mapping)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        self.backend.delete_many(keys)
+        if self.local:
+            self.local.delete_many(keys)
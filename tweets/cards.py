@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from mysite.metrics import record_cache
+
+from .cache import TieredCache
+
+# Bump when templates/tweets/_card.html changes so stale markup is never served.
+CARD_VERSION = 1
+
+_card_cache = None
+
+
+class TweetCard:
+    def __init__(self, tweet, html):
+        self.tweet = tweet
+        self.html = html
+
+    def __str__(self):
+        return self.html
+
+
+def get_card_cache():
+    global _card_cache
+    if _card_cache is None:
+        _card_cache = TieredCache(
+            timeout=settings.TWEET_CARD_CACHE_TIMEOUT,
+            local_max_size=settings.TWEET_CARD_LOCAL_CACHE_SIZE,
+            local_timeout=settings.TWEET_CARD_LOCAL_CACHE_TIMEOUT,
+        )
+    return _card_cache
+
+
+@receiver(setting_changed)
+def _reset_card_cache(setting, **kwargs):
+    global _card_cache
+    if setting.startswith("TWEET_CARD_"):
+        _card_cache = None
+
+
+def card_key(tweet_id):
+    return f"tweet-card:{CARD_VERSION}:{tweet_id}"
+
+
+def render_cards(tweets):
+    """Return a ``TweetCard`` per tweet, rendering only the ones not cached.
+
+    Cached markup for the whole page is fetched with a single ``get_many``.
+    """
+    cache = get_card_cache()
+    keys = [card_key(tweet.id) for tweet in tweets]
+    cached = cache.get_many(keys)
+    record_cache("cards", len(cached), len(keys) - len(cached))
+    rendered = {}
+    cards = []
+    for key, tweet in zip(keys, tweets):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string("tweets/_card.html", {"tweet": tweet})
+        cards.append(TweetCard(tweet, mark_safe(html)))
+    cache.set_many(rendered)
+    return cards
+
+
+def invalidate_cards(tweet_ids):
+    get_card_cache().delete_many(card_key(pk) for pk in tweet_ids)
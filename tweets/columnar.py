@@ -0,0 +1,139 @@
+"""A small columnar file format for tweet dumps, readable with the stdlib.
+
+Layout::
+
+    MAGIC, u32 length + JSON header {"columns": [...]}
+    row groups: u32 row count, then per column u32 length + zlib block
+
+Within a row group ``id`` is 16 raw bytes per row, ``created_at`` delta-coded
+int64 microseconds since the epoch, ``user`` dictionary-coded (a string block
+of distinct names followed by uint32 codes) and the text columns a string
+block: uint32 end offsets followed by the UTF-8 data. Integers are
+little-endian. Row groups are self-contained, so files written in parts can
+be concatenated after a single header.
+"""
+
+import json
+import struct
+import sys
+import uuid
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+
+MAGIC = b"TWCOL1\n"
+COLUMNS = ("id", "user", "title", "content", "created_at")
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_u32 = struct.Struct("<I")
+
+
+def _pack_array(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _pack_strings(values):
+    data = [value.encode() for value in values]
+    offsets = array("I")
+    end = 0
+    for item in data:
+        end += len(item)
+        offsets.append(end)
+    return _u32.pack(len(data)) + _pack_array(offsets) + b"".join(data)
+
+
+def _unpack_strings(block):
+    """Return the strings at the start of ``block`` and the size they took."""
+    (count,) = _u32.unpack_from(block)
+    base = 4 + 4 * count
+    values = []
+    start = 0
+    for end in _unpack_array("I", block[4:base]):
+        values.append(block[base + start : base + end].decode())
+        start = end
+    return values, base + start
+
+
+def _encode_column(name, values):
+    if name == "id":
+        return b"".join(value.bytes for value in values)
+    if name == "created_at":
+        micros = array("q")
+        previous = 0
+        for value in values:
+            current = (value - EPOCH) // timedelta(microseconds=1)
+            micros.append(current - previous)
+            previous = current
+        return _pack_array(micros)
+    if name == "user":
+        codes = {}
+        indexes = array("I", (codes.setdefault(value, len(codes)) for value in values))
+        return _pack_strings(codes) + _pack_array(indexes)
+    return _pack_strings(values)
+
+
+def _decode_column(name, block):
+    if name == "id":
+        return [uuid.UUID(bytes=block[start : start + 16]) for start in range(0, len(block), 16)]
+    if name == "created_at":
+        values = []
+        current = 0
+        for delta in _unpack_array("q", block):
+            current += delta
+            values.append(EPOCH + timedelta(microseconds=current))
+        return values
+    if name == "user":
+        names, size = _unpack_strings(block)
+        return [names[code] for code in _unpack_array("I", block[size:])]
+    return _unpack_strings(block)[0]
+
+
+def write_header(file, columns=COLUMNS):
+    header = json.dumps({"columns": list(columns)}).encode()
+    file.write(MAGIC + _u32.pack(len(header)) + header)
+
+
+def write_row_group(file, rows, columns=COLUMNS):
+    """Write ``rows`` (tuples in ``columns`` order) as one row group."""
+    file.write(_u32.pack(len(rows)))
+    for name, values in zip(columns, zip(*rows)):
+        block = zlib.compress(_encode_column(name, values))
+        file.write(_u32.pack(len(block)) + block)
+
+
+def _read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated columnar file.")
+    return data
+
+
+def read_row_groups(file):
+    """Yield each row group of ``file`` as a dict of column name -> values."""
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a columnar tweet dump.")
+    (size,) = _u32.unpack(_read_exactly(file, 4))
+    columns = json.loads(_read_exactly(file, size))["columns"]
+    while True:
+        head = file.read(4)
+        if not head:
+            return
+        (count,) = _u32.unpack(head)
+        group = {}
+        for name in columns:
+            (size,) = _u32.unpack(_read_exactly(file, 4))
+            group[name] = _decode_column(name, zlib.decompress(_read_exactly(file, size)))
+        if any(len(values) != count for values in group.values()):
+            raise ValueError("Corrupt row group.")
+        yield group
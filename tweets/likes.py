@@ -0,0 +1,162 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .lookup import invalidate_tweets
+from .models import Like, Tweet
+from .shards import by_shard
+from .versions import bump
+
+logger = logging.getLogger(__name__)
+
+
+class LikeCounter:
+    """Write-behind buffer for ``Tweet.like_count``.
+
+    Likes and unlikes only add to an in-process delta per tweet. A flush turns
+    the deltas into one ``F()`` UPDATE per distinct delta value, so a burst of
+    likes on one tweet costs a single row update instead of one write (and
+    one wait for SQLite's write lock) per like. ``Like`` rows stay the source
+    of truth; ``recount_likes`` repairs counts after a crash lost a buffer.
+
+    Flushes run on a background thread every ``LIKE_FLUSH_INTERVAL`` seconds
+    (sooner once ``LIKE_FLUSH_MAX_PENDING`` tweets have deltas), never in the
+    request that added the delta. A failed flush is logged and its deltas
+    are retried, per database, on the next one.
+    """
+
+    def __init__(self):
+        # {database alias (None: the router's choice): Counter({tweet id: delta})}
+        self._pending = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+
+    def add(self, tweet_id, delta, using=None):
+        """Buffer ``delta`` for a tweet stored in database ``using``."""
+        with self._lock:
+            self._pending[using][tweet_id] += delta
+            if sum(len(deltas) for deltas in self._pending.values()) >= settings.LIKE_FLUSH_MAX_PENDING:
+                self._wake.set()
+            if self._flusher is None and settings.LIKE_FLUSH_IN_BACKGROUND:
+                self._flusher = threading.Thread(target=self._run, name="like-counter", daemon=True)
+                self._flusher.start()
+
+    def pending(self, tweet_ids):
+        with self._lock:
+            totals = Counter()
+            for deltas in self._pending.values():
+                totals.update({pk: deltas[pk] for pk in tweet_ids if deltas.get(pk)})
+            return {pk: delta for pk, delta in totals.items() if delta}
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.LIKE_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            # The thread's own connections; persistent ones would never be reused here.
+            connections.close_all()
+
+    def flush(self):
+        """Write the buffered deltas; return how many tweets were updated."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+        flushed = []
+        for using, deltas in pending.items():
+            try:
+                self._write(using, deltas)
+            except Exception:
+                logger.exception("Flushing like counts of %d tweets failed; retrying later.", len(deltas))
+                # Only this database rolled back; the others must not get the deltas twice.
+                with self._lock:
+                    self._pending[using].update(deltas)
+            else:
+                flushed.extend(pk for pk, delta in deltas.items() if delta)
+        if flushed:
+            # Cached single tweets carry like_count too.
+            invalidate_tweets(flushed)
+            bump(["likes"])
+        return len(flushed)
+
+    def _write(self, using, deltas):
+        by_delta = defaultdict(list)
+        for tweet_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(tweet_id)
+        with transaction.atomic(using=using):
+            for delta, tweet_ids in by_delta.items():
+                for start in range(0, len(tweet_ids), 500):
+                    # Clamped: another worker's buffer may still hold the like this unlike undoes.
+                    Tweet.all_objects.using(using).filter(pk__in=tweet_ids[start : start + 500]).update(
+                        like_count=Greatest(F("like_count") + delta, 0)
+                    )
+
+
+counter = LikeCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    if settings.LIKE_FLUSH_IN_BACKGROUND:
+        counter.flush()
+
+
+def like_states(tweets, user):
+    """Return ``{tweet id: (like count, liked by user)}`` for a page of tweets.
+
+    Counts come from the loaded rows plus this process's unflushed deltas,
+    so only the "liked by me" flags cost a query.
+    """
+    if not tweets:
+        return {}
+    liked = set()
+    for alias, group in by_shard(tweets).items():
+        liked.update(_liked(alias, group, user))
+    return _states(tweets, liked)
+
+
+async def alike_states(tweets, user):
+    if not tweets:
+        return {}
+    liked = set()
+    for alias, group in by_shard(tweets).items():
+        liked.update([pk async for pk in _liked(alias, group, user)])
+    return _states(tweets, liked)
+
+
+def _liked(alias, tweets, user):
+    # Likes live in the shard of their tweet.
+    return (
+        Like.objects.using(alias)
+        .filter(user=user, tweet_id__in=[tweet.pk for tweet in tweets])
+        .values_list("tweet_id", flat=True)
+    )
+
+
+def _states(tweets, liked):
+    pending = counter.pending([tweet.pk for tweet in tweets])
+    return {tweet.pk: (tweet.like_count + pending.get(tweet.pk, 0), tweet.pk in liked) for tweet in tweets}
+
+
+def _attach(cards, states):
+    for card in cards:
+        card.like_count, card.liked = states[card.tweet.pk]
+    return cards
+
+
+def attach_likes(cards, user):
+    """Set ``like_count`` and ``liked`` on each ``TweetCard``.
+
+    Kept out of the cached card markup, which is shared by all users.
+    """
+    return _attach(cards, like_states([card.tweet for card in cards], user))
+
+
+async def aattach_likes(cards, user):
+    return _attach(cards, await alike_states([card.tweet for card in cards], user))
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+
+class Subscription:
+    def __init__(self, loop, audience, maxsize):
+        self.loop = loop
+        self.audience = audience
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    async def get(self, timeout):
+        """Return the next event, or ``None`` once the subscription was dropped.
+
+        Raises ``asyncio.TimeoutError`` when nothing arrived within ``timeout``.
+        """
+        if self.dropped:
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broadcaster:
+    """In-process fan-out of new tweets to connected live-timeline clients.
+
+    ``publish`` may be called from any thread; delivery happens on each
+    subscriber's event loop. A subscriber whose bounded queue is full is
+    dropped instead of slowing down the publisher or growing memory.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, audience, maxsize):
+        subscription = Subscription(asyncio.get_running_loop(), frozenset(audience), maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, author_id, event):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if author_id in s.audience]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(self._deliver, subscription, event)
+            except RuntimeError:
+                # The subscriber's event loop is already closed.
+                self.unsubscribe(subscription)
+
+    def _deliver(self, subscription, event):
+        if subscription.dropped:
+            return
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            subscription.dropped = True
+            self.unsubscribe(subscription)
+
+
+hub = Broadcaster()
@@ -0,0 +1,89 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+
+from mysite.metrics import record_cache
+
+from .models import Tweet
+from .shards import afind_tweet, find_tweet
+
+# Cached in place of a tweet that does not exist (or was deleted).
+MISSING = "missing"
+
+
+def parse_tweet_id(value):
+    """Return ``value`` as a UUID, or ``None`` when it cannot be a tweet id."""
+    if isinstance(value, uuid.UUID):
+        return value
+    if not isinstance(value, str) or len(value) > 36:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def tweet_key(pk):
+    return f"tweet:{pk.hex}"
+
+
+def _cache():
+    return caches[settings.TWEET_CACHE_ALIAS]
+
+
+def _queryset(pk):
+    # Cache what the primary holds: a lagging replica would cache new tweets as missing.
+    return Tweet.objects.db_manager(router.db_for_write(Tweet)).select_related("user").filter(id=pk)
+
+
+def _find(pk):
+    return find_tweet(pk) if settings.TWEET_SHARDS else _queryset(pk).first()
+
+
+async def _afind(pk):
+    return await afind_tweet(pk) if settings.TWEET_SHARDS else await _queryset(pk).afirst()
+
+
+def _store(key, tweet):
+    if tweet is None:
+        return key, MISSING, settings.TWEET_CACHE_MISSING_TIMEOUT
+    return key, tweet, settings.TWEET_CACHE_TIMEOUT
+
+
+def get_tweet(pk):
+    """Read-through lookup of a live tweet and its author by parsed id.
+
+    Ids that do not exist are cached too (for a shorter time), so repeated
+    misses never reach the database either. Only on with ``TWEET_CACHE_ALIAS``
+    set, which needs a cache shared by all workers.
+    """
+    if not settings.TWEET_CACHE_ALIAS:
+        return _find(pk)
+    key = tweet_key(pk)
+    cached = _cache().get(key)
+    record_cache("tweets", cached is not None, cached is None)
+    if cached is not None:
+        return None if cached == MISSING else cached
+    tweet = _find(pk)
+    _cache().set(*_store(key, tweet))
+    return tweet
+
+
+async def aget_tweet(pk):
+    if not settings.TWEET_CACHE_ALIAS:
+        return await _afind(pk)
+    key = tweet_key(pk)
+    cached = await _cache().aget(key)
+    record_cache("tweets", cached is not None, cached is None)
+    if cached is not None:
+        return None if cached == MISSING else cached
+    tweet = await _afind(pk)
+    await _cache().aset(*_store(key, tweet))
+    return tweet
+
+
+def invalidate_tweets(tweet_ids):
+    if settings.TWEET_CACHE_ALIAS:
+        _cache().delete_many([tweet_key(pk) for pk in tweet_ids])
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tweets.models import Tweet
+from tweets.shards import on_shard, shard_aliases
+from tweets.tags import index_tweets
+
+
+class Command(BaseCommand):
+    help = "Extract hashtags and mentions of existing tweets in small batches, shard by shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        done = sum(self.backfill(alias, batch_size, sleep) for alias in shard_aliases())
+        self.stdout.write(f"Indexed tags of {done} tweets.")
+
+    def backfill(self, alias, batch_size, sleep):
+        queryset = Tweet.objects.using(alias).order_by("id").only("id", "content")
+        done = 0
+        last = None
+        while True:
+            batch = list((queryset.filter(id__gt=last) if last else queryset)[:batch_size])
+            if not batch:
+                return done
+            # replace=True makes reruns (e.g. after an interrupted backfill) safe.
+            with on_shard(alias), transaction.atomic(using=alias):
+                index_tweets(batch, replace=True)
+            done += len(batch)
+            last = batch[-1].id
+            if sleep:
+                time.sleep(sleep)
@@ -0,0 +1,170 @@
+import csv
+import io
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from datetime import time as day_start
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from tweets import columnar
+from tweets.api import EXPORT_KEYS, export_rows
+from tweets.ids import min_uuid7_ms, uuid7_timestamp_ms
+from tweets.models import Tweet
+from tweets.shards import shard_aliases
+
+FORMATS = ("ndjson", "csv", "columnar")
+EXTENSIONS = {".csv": "csv", ".twc": "columnar"}
+
+
+def _batches(rows, size):
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _write_ndjson(file, batch):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    file.write("".join(encoder.encode(dict(zip(EXPORT_KEYS, row))) + "\n" for row in batch).encode())
+
+
+def _write_csv(file, batch):
+    text = io.StringIO()
+    csv.writer(text).writerows(
+        (str(pk), user, title, content, created_at.isoformat()) for pk, user, title, content, created_at in batch
+    )
+    file.write(text.getvalue().encode())
+
+
+def _write_header(file, fmt):
+    if fmt == "csv":
+        file.write((",".join(EXPORT_KEYS) + "\r\n").encode())
+    elif fmt == "columnar":
+        columnar.write_header(file, EXPORT_KEYS)
+
+
+WRITERS = {"ndjson": _write_ndjson, "csv": _write_csv, "columnar": columnar.write_row_group}
+
+
+def export_range(fmt, start_ms, end_ms, since, until, chunk_size, path):
+    """Append live tweets with ids in ``[start_ms, end_ms)`` to ``path``.
+
+    Ids are time-ordered, so a range is a primary key scan of each shard;
+    ``since`` and ``until`` trim the sub-millisecond edges. Runs in worker
+    processes too.
+    Returns the number of rows written.
+    """
+    queryset = Tweet.objects.filter(id__gte=min_uuid7_ms(start_ms), id__lt=min_uuid7_ms(end_ms)).order_by("id")
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    rows = export_rows(queryset, chunk_size)
+    written = 0
+    with open(path, "ab") as file:
+        for batch in _batches(rows, chunk_size):
+            WRITERS[fmt](file, batch)
+            written += len(batch)
+    return written
+
+
+def _parse_moment(value, option):
+    try:
+        moment = parse_datetime(value)
+        if moment is None and (day := parse_date(value)):
+            moment = datetime.combine(day, day_start())
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise CommandError(f"{option} must be an ISO 8601 date or datetime.")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream live tweets, oldest first, to NDJSON, CSV or a compact columnar file (see tweets.columnar). "
+        "With --workers, time ranges are exported by parallel processes and then concatenated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Default: from the extension (.csv, .twc), else ndjson.")
+        parser.add_argument("--since", help="Only tweets created at or after this date or datetime.")
+        parser.add_argument("--until", help="Only tweets created before this date or datetime.")
+        parser.add_argument("--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--parts", type=int, help="Time ranges to split the export into. Default: 4 per worker.")
+
+    def handle(self, *args, path, format, since, until, chunk_size, workers, parts, **options):
+        fmt = format or EXTENSIONS.get(os.path.splitext(path)[1].lower(), "ndjson")
+        since = since and _parse_moment(since, "--since")
+        until = until and _parse_moment(until, "--until")
+        if chunk_size < 1 or workers < 1 or (parts is not None and parts < 1):
+            raise CommandError("--chunk-size, --workers and --parts must be positive.")
+        parts = parts or (4 * workers if workers > 1 else 1)
+
+        started = time.perf_counter()
+        with open(path, "wb") as file:
+            _write_header(file, fmt)
+        bounds = self._bounds(since, until)
+        written = 0
+        if bounds:
+            start, end = bounds
+            edges = [start + (end - start) * i // parts for i in range(parts + 1)]
+            ranges = [(fmt, lo, hi, since, until, chunk_size) for lo, hi in zip(edges, edges[1:]) if lo < hi]
+            if workers == 1:
+                written = sum(export_range(*task, path) for task in ranges)
+            else:
+                written = self._export_parallel(ranges, workers, path)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Exported {written} tweets to {path} ({os.path.getsize(path)} bytes) in {elapsed:.1f}s"
+            f" ({written / max(elapsed, 1e-9):.0f} rows/s)."
+        )
+
+    def _bounds(self, since, until):
+        """The millisecond range of ids to scan, or None if there is nothing."""
+        ends = []
+        for alias in shard_aliases():
+            ids = Tweet.objects.using(alias).order_by("id").values_list("id", flat=True)
+            first = ids.first()
+            if first is not None:
+                ends.append((first, ids.last()))
+        if not ends:
+            return None
+        start = uuid7_timestamp_ms(min(first for first, _ in ends))
+        end = uuid7_timestamp_ms(max(last for _, last in ends)) + 1
+        if since:
+            start = max(start, int(since.timestamp() * 1000))
+        if until:
+            end = min(end, int(until.timestamp() * 1000) + 1)
+        return (start, end) if start < end else None
+
+    def _export_parallel(self, ranges, workers, path):
+        part_paths = [f"{path}.part{number}" for number in range(len(ranges))]
+        # Workers must not inherit this process's database connections.
+        connections.close_all()
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                written = sum(pool.map(export_range, *zip(*ranges), part_paths))
+            with open(path, "ab") as file:
+                for part_path in part_paths:
+                    with open(part_path, "rb") as part:
+                        shutil.copyfileobj(part, file)
+        finally:
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+        return written
@@ -0,0 +1,71 @@
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tweets.models import Tweet
+from tweets.shards import on_shard, shard_aliases
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Hard-delete tombstoned tweets and the tweets of deleted users in small batches, shard by shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        self.batch_size = batch_size
+        self.sleep = sleep
+        orphaned = purged = 0
+        for alias in shard_aliases():
+            self.alias = alias
+            with on_shard(alias):
+                orphaned += self.tombstone_orphans()
+                purged += self.in_batches(
+                    Tweet.all_objects.filter(deleted_at__isnull=False),
+                    lambda ids: Tweet.all_objects.filter(pk__in=ids).delete(),
+                )
+        self.stdout.write(f"Tombstoned {orphaned} orphaned tweets, purged {purged} tweets.")
+
+    def tombstone_orphans(self):
+        # Tweets of deleted users are tombstoned first so they go through the
+        # same purge path (and their signal handlers never need the user row).
+        # Users may live in another database, so this cannot be a subquery;
+        # they are looked up a batch of authors at a time instead.
+        author_ids = (
+            Tweet.objects.order_by("user_id")
+            .values_list("user_id", flat=True)
+            .distinct()
+            .iterator(chunk_size=self.batch_size)
+        )
+        orphaned_authors = []
+        while batch := list(islice(author_ids, self.batch_size)):
+            existing = set(User.objects.filter(pk__in=batch).values_list("pk", flat=True))
+            orphaned_authors.extend(user_id for user_id in batch if user_id not in existing)
+        orphaned = 0
+        for user_id in orphaned_authors:
+            orphaned += self.in_batches(
+                Tweet.objects.filter(user_id=user_id),
+                lambda ids: Tweet.all_objects.filter(pk__in=ids).update(deleted_at=timezone.now()),
+            )
+        return orphaned
+
+    def in_batches(self, queryset, action):
+        done = 0
+        while True:
+            ids = list(queryset.values_list("pk", flat=True)[: self.batch_size])
+            if not ids:
+                return done
+            # Each batch is its own short write transaction so other writers
+            # get the SQLite lock between batches.
+            with transaction.atomic(using=self.alias):
+                action(ids)
+            done += len(ids)
+            if self.sleep:
+                time.sleep(self.sleep)
@@ -0,0 +1,151 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts.lookup import invalidate_user
+from tweets.models import Like, TimelineEntry, Tweet
+from tweets.search import index_for_search, unindex_for_search
+from tweets.shards import hashed_shard, on_shard, shard_for_user
+from tweets.tags import index_tweets
+from tweets.versions import bump
+
+User = get_user_model()
+
+# Copied rows refresh what may have changed on the source since the first pass.
+MUTABLE_FIELDS = ["title", "content", "deleted_at", "like_count"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users' tweets between shards in batches. With usernames and --to, moves those users to that "
+        "shard; otherwise moves every user whose tweets sit in a shard they do not map to, e.g. after "
+        "TWEET_SHARDS changed or an import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*")
+        parser.add_argument("--to", help="Shard to move the named users to.")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches.")
+
+    def handle(self, *args, usernames, to, batch_size, sleep, **options):
+        if not settings.TWEET_SHARDS:
+            raise CommandError("Tweets are not sharded; set TWEET_SHARDS.")
+        self.batch_size = batch_size
+        self.sleep = sleep
+        if usernames:
+            if to not in settings.TWEET_SHARDS:
+                raise CommandError(f"--to must be one of {', '.join(settings.TWEET_SHARDS)}.")
+            users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+            missing = sorted(set(usernames) - set(users))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(missing)}.")
+            moves = [(user, to) for user in users.values()]
+        else:
+            if to:
+                raise CommandError("--to needs usernames.")
+            moves = self.misplaced()
+
+        total = 0
+        for user, target in moves:
+            moved = self.move(user, target)
+            total += moved
+            self.stdout.write(f"{user.username}: {moved} tweets to {target}.")
+        self.stdout.write(f"Moved {total} tweets of {len(moves)} users.")
+
+    def misplaced(self):
+        """Users with tweets outside their shard, each with the shard they belong in."""
+        user_ids = set()
+        for alias in settings.TWEET_SHARDS:
+            authors = Tweet.all_objects.using(alias).order_by().values_list("user_id", flat=True).distinct()
+            user_ids.update(authors)
+        moves = []
+        for user in User.objects.filter(pk__in=user_ids).order_by("pk").iterator():
+            target = shard_for_user(user)
+            if any(self.holds(alias, user) for alias in settings.TWEET_SHARDS if alias != target):
+                moves.append((user, target))
+        return moves
+
+    def holds(self, alias, user):
+        return Tweet.all_objects.using(alias).filter(user=user).exists()
+
+    def move(self, user, target):
+        """Copy the user's tweets to ``target``, point the user there, then delete the originals.
+
+        Until the switch, reads and writes still go to the old shard; rows
+        changed in between are copied again by the second pass.
+        """
+        sources = [alias for alias in settings.TWEET_SHARDS if alias != target and self.holds(alias, user)]
+        for source in sources:
+            self.in_batches(source, user, lambda tweets: self.copy(tweets, source, target))
+
+        placement = "" if hashed_shard(user.pk) == target else target
+        if user.tweet_shard != placement:
+            User.objects.filter(pk=user.pk).update(tweet_shard=placement)
+            user.tweet_shard = placement
+            # The logged-in user is cached; new tweets must see the new placement.
+            invalidate_user(user.pk)
+        bump([f"profile:{user.username}"])
+
+        moved = 0
+        for source in sources:
+            moved += self.in_batches(source, user, lambda tweets: self.copy(tweets, source, target, delete=True))
+        return moved
+
+    def in_batches(self, source, user, action):
+        done = 0
+        last = None
+        while True:
+            queryset = Tweet.all_objects.using(source).filter(user=user).order_by("id")
+            if last is not None:
+                queryset = queryset.filter(id__gt=last)
+            tweets = list(queryset[: self.batch_size])
+            if not tweets:
+                return done
+            action(tweets)
+            done += len(tweets)
+            last = tweets[-1].pk
+            if self.sleep:
+                time.sleep(self.sleep)
+
+    def copy(self, tweets, source, target, delete=False):
+        ids = [tweet.pk for tweet in tweets]
+        likes = list(Like.objects.using(source).filter(tweet_id__in=ids))
+        entries = [
+            TimelineEntry(owner_id=entry.owner_id, tweet_id=entry.tweet_id)
+            for entry in TimelineEntry.objects.using(source).filter(tweet_id__in=ids)
+        ]
+        with transaction.atomic(using=target), on_shard(target):
+            Tweet.all_objects.using(target).bulk_create(
+                tweets, update_conflicts=True, unique_fields=["id"], update_fields=MUTABLE_FIELDS
+            )
+            TimelineEntry.objects.using(target).bulk_create(entries, batch_size=500, ignore_conflicts=True)
+            Like.objects.using(target).filter(tweet_id__in=ids).delete()
+            self.insert_likes(target, likes)
+            index_tweets(tweets, replace=True)
+            unindex_for_search([tweet.pk for tweet in tweets if tweet.deleted_at is not None])
+            index_for_search(tweets)
+        if delete:
+            with transaction.atomic(using=source), on_shard(source):
+                unindex_for_search(ids)
+                # Tombstoned first, so the delete signals treat them as already gone from every
+                # page; the delete cascades to the remaining rows and clears the caches.
+                Tweet.all_objects.using(source).filter(pk__in=ids).update(deleted_at=timezone.now())
+                Tweet.all_objects.using(source).filter(pk__in=ids).delete()
+
+    def insert_likes(self, target, likes):
+        # Raw rows, since bulk_create would reset the auto_now_add timestamps.
+        connection = connections[target]
+        fields = [Like._meta.get_field(name) for name in ("user", "tweet", "created_at")]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO tweets_like (user_id, tweet_id, created_at) VALUES (%s, %s, %s)",
+                [
+                    [field.get_db_prep_save(getattr(like, field.attname), connection) for field in fields]
+                    for like in likes
+                ],
+            )
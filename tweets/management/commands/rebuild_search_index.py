@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+
+from tweets.models import Tweet
+from tweets.search import index_for_search
+from tweets.shards import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Rebuild the tweet full-text index from the tweets table in small batches, shard by shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        indexed = 0
+        for alias in shard_aliases():
+            with on_shard(alias):
+                indexed += self.rebuild(router.db_for_write(Tweet), batch_size, sleep)
+        self.stdout.write(f"Indexed {indexed} tweets.")
+
+    def rebuild(self, alias, batch_size, sleep):
+        connection = connections[alias]
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM tweets_tweet_fts")
+            cursor.execute("DELETE FROM tweets_searchentry")
+
+        # Tweets created meanwhile are indexed by the post_save receiver;
+        # index_for_search skips them when their batch comes up.
+        queryset = Tweet.objects.using(alias).order_by("id").only("id", "title", "content", "deleted_at")
+        indexed = 0
+        last = None
+        while True:
+            batch = list((queryset.filter(id__gt=last) if last else queryset)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic(using=alias):
+                index_for_search(batch)
+            indexed += len(batch)
+            last = batch[-1].id
+            if sleep:
+                time.sleep(sleep)
+
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO tweets_tweet_fts (tweets_tweet_fts) VALUES ('optimize')")
+        return indexed
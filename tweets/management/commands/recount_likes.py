@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from tweets.likes import counter
+from tweets.models import Like, Tweet
+from tweets.shards import shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Recompute Tweet.like_count from the Like table in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches.")
+
+    def handle(self, *args, batch_size, sleep, **options):
+        # Only this process's buffer can be flushed. Run it while web workers are
+        # stopped: their buffered deltas are already in Like and would be added twice.
+        counter.flush()
+        fixed = sum(self.recount(alias, batch_size, sleep) for alias in shard_aliases())
+        self.stdout.write(f"Fixed like counts of {fixed} tweets.")
+
+    def recount(self, alias, batch_size, sleep):
+        likes = (
+            Like.objects.filter(tweet=OuterRef("pk")).order_by().values("tweet").annotate(n=Count("pk")).values("n")
+        )
+        actual = Coalesce(Subquery(likes, output_field=IntegerField()), Value(0))
+        queryset = Tweet.all_objects.using(alias).order_by("id")
+        fixed = 0
+        last = None
+        while True:
+            ids = list((queryset.filter(id__gt=last) if last else queryset).values_list("id", flat=True)[:batch_size])
+            if not ids:
+                return fixed
+            with transaction.atomic(using=alias):
+                fixed += (
+                    Tweet.all_objects.using(alias)
+                    .filter(pk__in=ids)
+                    .exclude(like_count=actual)
+                    .update(like_count=actual)
+                )
+            last = ids[-1]
+            if sleep:
+                time.sleep(sleep)
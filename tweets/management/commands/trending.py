@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from tweets.api import trending_key
+from tweets.trending import WINDOWS, TrendingEngine, exact_top, warm_up
+
+
+class Command(BaseCommand):
+    help = "Compare the trending sketches with exact counts, or publish exact rankings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Report how far the sketches are from exact counts.")
+        parser.add_argument("--recompute", action="store_true", help="Cache exact rankings for the trending endpoint.")
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, verify, recompute, limit, **options):
+        if not verify and not recompute:
+            raise CommandError("Pass --verify and/or --recompute.")
+        exact = {window: exact_top(window, max(limit, settings.TRENDING_MAX_LIMIT)) for window in WINDOWS}
+
+        if verify:
+            sketch = warm_up(TrendingEngine(settings.TRENDING_CAPACITY))
+            for window, rows in exact.items():
+                expected = dict(rows[:limit])
+                estimated = dict(sketch.top(window, limit))
+                overlap = len(expected.keys() & estimated.keys())
+                # Space-Saving only overestimates.
+                error = max((estimated[tag] - count for tag, count in expected.items() if tag in estimated), default=0)
+                self.stdout.write(
+                    f"{window}: {overlap}/{len(expected)} of the exact top {limit} found, max overestimate {error}"
+                )
+
+        if recompute:
+            for window, rows in exact.items():
+                cache.set(trending_key(window), rows, settings.TRENDING_RECOMPUTE_CACHE_TIMEOUT)
+            self.stdout.write(f"Cached exact rankings for {', '.join(exact)}.")
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0002_tweet_created_at_tweet_user_alter_tweet_content_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="tweet",
+            options={"ordering": ("-created_at", "-id")},
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["created_at", "id"], name="tweet_created_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["user", "created_at", "id"], name="tweet_user_created_id_idx"),
+        ),
+    ]
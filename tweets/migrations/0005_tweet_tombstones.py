@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("tweets", "0004_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweet",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="tweet",
+            name="user",
+            field=models.ForeignKey(
+                db_constraint=False,
+                default="",
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", False)), fields=["deleted_at"], name="tweet_tombstone_idx"
+            ),
+        ),
+    ]
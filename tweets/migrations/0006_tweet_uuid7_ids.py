@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:58
+
+from django.db import migrations, models
+import tweets.ids
+
+
+def rewrite_ids(apps, schema_editor):
+    """Replace random uuid4 keys with UUIDv7 keys derived from created_at."""
+    Tweet = apps.get_model("tweets", "Tweet")
+    TimelineEntry = apps.get_model("tweets", "TimelineEntry")
+    # Materialized up front: rewriting keys while a cursor walks the table may revisit rows.
+    rows = list(Tweet.objects.order_by("created_at").values_list("id", "created_at"))
+    for old_id, created_at in rows:
+        if old_id.version == 7:
+            continue
+        new_id = tweets.ids.uuid7_from_datetime(created_at)
+        Tweet.objects.filter(id=old_id).update(id=new_id)
+        TimelineEntry.objects.filter(tweet_id=old_id).update(tweet_id=new_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0005_tweet_tombstones"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="tweet",
+            options={"ordering": ("-id",)},
+        ),
+        migrations.RemoveIndex(
+            model_name="timelineentry",
+            name="timeline_owner_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="tweet",
+            name="tweet_created_id_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="tweet",
+            name="tweet_user_created_id_idx",
+        ),
+        migrations.RemoveField(
+            model_name="timelineentry",
+            name="created_at",
+        ),
+        migrations.AlterField(
+            model_name="tweet",
+            name="id",
+            field=tweets.ids.TweetIdField(blank=True, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(rewrite_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["created_at"], name="tweet_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["user", "id"], name="tweet_user_id_idx"),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:58
+
+from django.db import migrations, models
+import tweets.ids
+
+
+def rewrite_ids(apps, schema_editor, batch_size=500):
+    """Replace random uuid4 keys with UUIDv7 keys derived from created_at.
+
+    Works through the table in batches cut on created_at, which the rewrite
+    leaves alone (keys change under a cursor), with one UPDATE per table
+    and batch.
+    """
+    Tweet = apps.get_model("tweets", "Tweet")
+    TimelineEntry = apps.get_model("tweets", "TimelineEntry")
+    db = schema_editor.connection.alias
+    rows = Tweet.objects.using(db).order_by("created_at").values_list("id", "created_at")
+    last = None
+    while True:
+        batch = list((rows.filter(created_at__gt=last) if last else rows)[:batch_size])
+        if not batch:
+            break
+        last = batch[-1][1]
+        # The limit may have split the tweets created at the same instant as the last one.
+        batch = [row for row in batch if row[1] != last] + list(rows.filter(created_at=last))
+        new_ids = {
+            old_id: tweets.ids.uuid7_from_datetime(created_at) for old_id, created_at in batch if old_id.version != 7
+        }
+        if not new_ids:
+            continue
+        uuid = models.UUIDField()
+        Tweet.objects.using(db).filter(id__in=new_ids).update(
+            id=models.Case(*(models.When(id=old, then=models.Value(new, uuid)) for old, new in new_ids.items()))
+        )
+        TimelineEntry.objects.using(db).filter(tweet_id__in=new_ids).update(
+            tweet_id=models.Case(
+                *(models.When(tweet_id=old, then=models.Value(new, uuid)) for old, new in new_ids.items())
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    # Stands in for 0006_tweet_uuid7_ids on databases that have not run it: it
+    # rewrites the ids of the database being migrated (each tweet shard runs
+    # it) in batches instead of one UPDATE per row.
+    replaces = [("tweets", "0006_tweet_uuid7_ids")]
+
+    dependencies = [
+        ("tweets", "0005_tweet_tombstones"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="tweet",
+            options={"ordering": ("-id",)},
+        ),
+        migrations.RemoveIndex(
+            model_name="timelineentry",
+            name="timeline_owner_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="tweet",
+            name="tweet_created_id_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="tweet",
+            name="tweet_user_created_id_idx",
+        ),
+        migrations.RemoveField(
+            model_name="timelineentry",
+            name="created_at",
+        ),
+        migrations.AlterField(
+            model_name="tweet",
+            name="id",
+            field=tweets.ids.TweetIdField(blank=True, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(rewrite_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["created_at"], name="tweet_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["user", "id"], name="tweet_user_id_idx"),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Full-text index over live tweets. Its rowid is SearchEntry.id; rows are
+# written by tweets.search, not by triggers, because SQLite migrations rebuild
+# tweets_tweet (dropping its triggers and renumbering its rowids).
+CREATE_FTS = "CREATE VIRTUAL TABLE tweets_tweet_fts USING fts5(title, content, tokenize='trigram')"
+DROP_FTS = "DROP TABLE tweets_tweet_fts"
+
+
+def index_existing(apps, schema_editor):
+    Tweet = apps.get_model("tweets", "Tweet")
+    SearchEntry = apps.get_model("tweets", "SearchEntry")
+    tweets = Tweet.objects.filter(deleted_at__isnull=True).values_list("id", "title", "content")
+    with schema_editor.connection.cursor() as cursor:
+        for pk, title, content in tweets.iterator(chunk_size=2000):
+            entry = SearchEntry.objects.create(tweet_id=pk)
+            cursor.execute(
+                "INSERT INTO tweets_tweet_fts (rowid, title, content) VALUES (%s, %s, %s)", [entry.pk, title, content]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0006_tweet_uuid7_ids"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "tweet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="search_entry", to="tweets.tweet"
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunSQL(CREATE_FTS, DROP_FTS),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,108 @@
-import uuid
-
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
 
+from .ids import TweetIdField
+
 User = get_user_model()
 
 
+class TweetManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Tweet(models.Model):
-    id = models.UUIDField(primary_key=True, blank=True, null=False, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, default="")
+    # Time-ordered UUIDv7, so timelines can order and paginate on the key alone.
+    id = TweetIdField(primary_key=True, blank=True, null=False, editable=False)
+    # Deleting a user leaves their tweets behind; purge_tweets removes them in batches.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, default="")
     title = models.CharField(max_length=50)
 
     content = models.CharField(max_length=100)
     created_at = models.DateTimeField(default=timezone.now)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Denormalized from Like and updated in batches by tweets.likes.counter.
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TweetManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        ordering = ("-id",)
+        indexes = [
+            models.Index(fields=["created_at"], name="tweet_created_idx"),
+            models.Index(fields=["user", "id"], name="tweet_user_id_idx"),
+            models.Index(
+                fields=["deleted_at"], condition=models.Q(deleted_at__isnull=False), name="tweet_tombstone_idx"
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """One row of a user's home inbox, written when a followed user tweets."""
+
+    # Rows live in the tweet's shard (tweets.shards), away from the users table.
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False, related_name="timeline_entries"
+    )
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="timeline_entries")
+
+    class Meta:
+        # Also the index for reading an inbox newest-first by tweet id.
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "tweet"], name="unique_timeline_entry"),
+        ]
+
+
+class SearchEntry(models.Model):
+    """Maps a live tweet to its row in the ``tweets_tweet_fts`` full-text index.
+
+    The FTS rowid is this model's integer key: tweets_tweet has no integer key
+    of its own and its implicit rowids change whenever a migration rebuilds
+    the table.
+    """
+
+    tweet = models.OneToOneField(Tweet, on_delete=models.CASCADE, related_name="search_entry")
+
+
+class Hashtag(models.Model):
+    # Normalized with tweets.tags.normalize_tag.
+    name = models.CharField(max_length=100, unique=True)
+
+
+class TweetHashtag(models.Model):
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="tweet_hashtags")
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="tweet_hashtags")
+
+    class Meta:
+        # Also the index for reading a tag feed newest-first by tweet id.
+        constraints = [
+            models.UniqueConstraint(fields=["hashtag", "tweet"], name="unique_tweet_hashtag"),
+        ]
+
+
+class Mention(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False, related_name="mentions"
+    )
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="mentions")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tweet"], name="unique_mention"),
+        ]
+
+
+class Like(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False, related_name="likes"
+    )
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="likes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "tweet"], name="unique_like"),
+        ]
@@ -0,0 +1,120 @@
+import heapq
+import uuid
+
+from django.conf import settings
+
+
+class CursorPage:
+    def __init__(self, items, older_cursor=None, newer_cursor=None):
+        self.items = items
+        self.older_cursor = older_cursor
+        self.newer_cursor = newer_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class TimelineSource:
+    """A queryset that yields tweets in tweet-id (i.e. time) order.
+
+    ``id_field`` names the column holding the tweet id and ``tweet_field`` the
+    relation to follow when the rows are not tweets themselves (e.g. inbox
+    entries).
+    """
+
+    def __init__(self, queryset, id_field="id", tweet_field=None):
+        self.queryset = queryset
+        self.id_field = id_field
+        self.tweet_field = tweet_field
+
+    def window(self, cursor, newer, limit):
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(**{f"{self.id_field}__{'gt' if newer else 'lt'}": cursor})
+        return queryset.order_by(self.id_field if newer else f"-{self.id_field}")[:limit]
+
+    def to_tweets(self, rows):
+        if self.tweet_field:
+            return [getattr(row, self.tweet_field) for row in rows]
+        return rows
+
+    def fetch(self, cursor, newer, limit):
+        return self.to_tweets(list(self.window(cursor, newer, limit)))
+
+    async def afetch(self, cursor, newer, limit):
+        return self.to_tweets([row async for row in self.window(cursor, newer, limit)])
+
+
+def encode_cursor(tweet):
+    return tweet.id.hex
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def _merge(batches, newer, limit):
+    # Each batch is already in id order, so a k-way merge stops after ``limit`` tweets.
+    seen = set()
+    merged = []
+    for tweet in heapq.merge(*batches, key=lambda t: t.id, reverse=not newer):
+        if tweet.id not in seen:
+            seen.add(tweet.id)
+            merged.append(tweet)
+            if len(merged) == limit:
+                break
+    return merged
+
+
+def _parse(sources, params, page_size):
+    if not isinstance(sources, (list, tuple)):
+        sources = [TimelineSource(sources)]
+    after = decode_cursor(params.get("after"))
+    before = None if after else decode_cursor(params.get("before"))
+    return sources, after, before, page_size or settings.TIMELINE_PAGE_SIZE
+
+
+def _page(batches, after, before, page_size):
+    newer = after is not None
+    rows = _merge(batches, newer, page_size + 1)
+    if newer:
+        has_newer = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        has_older = True
+    else:
+        has_older = len(rows) > page_size
+        items = rows[:page_size]
+        has_newer = before is not None
+
+    return CursorPage(
+        items,
+        older_cursor=encode_cursor(items[-1]) if items and has_older else None,
+        newer_cursor=encode_cursor(items[0]) if items and has_newer else None,
+    )
+
+
+def paginate_tweets(sources, params, page_size=None):
+    """Newest-first keyset pagination on the (time-ordered) tweet id.
+
+    ``sources`` is a Tweet queryset or a list of ``TimelineSource``; the latter
+    are merged so each page costs one ``LIMIT page_size + 1`` range read per
+    source. ``params`` is a QueryDict where ``before`` walks to older tweets
+    and ``after`` to newer ones.
+    """
+    sources, after, before, page_size = _parse(sources, params, page_size)
+    batches = [source.fetch(after or before, after is not None, page_size + 1) for source in sources]
+    return _page(batches, after, before, page_size)
+
+
+async def apaginate_tweets(sources, params, page_size=None):
+    sources, after, before, page_size = _parse(sources, params, page_size)
+    batches = [await source.afetch(after or before, after is not None, page_size + 1) for source in sources]
+    return _page(batches, after, before, page_size)
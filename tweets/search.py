@@ -0,0 +1,143 @@
+import base64
+import heapq
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import SearchEntry, Tweet
+from .shards import attach_authors, shard_aliases
+
+# The trigram tokenizer cannot use the index for shorter terms.
+MIN_TERM_LENGTH = 3
+
+# bm25() weights for the title and content columns.
+SEARCH_SQL = """
+    SELECT e.tweet_id, s.score, s.rowid FROM (
+        SELECT rowid, bm25(tweets_tweet_fts, 2.0, 1.0) AS score
+        FROM tweets_tweet_fts WHERE tweets_tweet_fts MATCH %s
+    ) s
+    JOIN tweets_searchentry e ON e.id = s.rowid
+    {where}
+    ORDER BY s.score, s.rowid
+    LIMIT %s
+"""
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+class SearchPage:
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def index_for_search(tweets):
+    """Add live ``tweets`` that are not indexed yet to the full-text index."""
+    tweets = [tweet for tweet in tweets if tweet.deleted_at is None]
+    indexed = set(SearchEntry.objects.filter(tweet__in=tweets).values_list("tweet_id", flat=True))
+    tweets = [tweet for tweet in tweets if tweet.pk not in indexed]
+    if not tweets:
+        return
+    entries = SearchEntry.objects.bulk_create([SearchEntry(tweet=tweet) for tweet in tweets], batch_size=500)
+    with connections[router.db_for_write(SearchEntry)].cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO tweets_tweet_fts (rowid, title, content) VALUES (%s, %s, %s)",
+            [(entry.pk, tweet.title, tweet.content) for entry, tweet in zip(entries, tweets)],
+        )
+
+
+def unindex_for_search(tweet_ids):
+    # Two statements instead of a model delete(), which would fetch the entries
+    # to send post_delete (signals.drop_search_row only serves cascades).
+    tweet_ids = list(tweet_ids)
+    if not tweet_ids:
+        return
+    sql, params = SearchEntry.objects.filter(tweet_id__in=tweet_ids).values("id").query.sql_with_params()
+    with connections[router.db_for_write(SearchEntry)].cursor() as cursor:
+        cursor.execute(f"DELETE FROM tweets_tweet_fts WHERE rowid IN ({sql})", params)
+        cursor.execute(f"DELETE FROM tweets_searchentry WHERE id IN ({sql})", params)
+
+
+def build_match(query):
+    """Turn user input into an FTS5 query: every term must occur, as a substring.
+
+    Terms are quoted so FTS5 operators in the input are matched literally.
+    """
+    terms = query.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        raise SearchQueryError(f"Search terms must be at least {MIN_TERM_LENGTH} characters long.")
+    return " AND ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def encode_cursor(score, rowid, shard=0):
+    return base64.urlsafe_b64encode(f"{score!r}|{rowid}|{shard}".encode()).decode()
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        score, rowid, *shard = base64.urlsafe_b64decode(value.encode()).decode().split("|")
+        return float(score), int(rowid), int(shard[0]) if shard else 0
+    except (ValueError, UnicodeError):
+        return None
+
+
+def _search_shard(alias, index, match, cursor, limit):
+    """Up to ``limit`` matches in one shard after ``cursor``, as (score, shard, rowid, tweet id)."""
+    args = [match]
+    where = ""
+    if cursor:
+        score, rowid, shard = cursor
+        # Pages are ordered by (score, shard, rowid) across shards.
+        if index < shard:
+            where = "WHERE s.score > %s"
+            args += [score]
+        elif index == shard:
+            where = "WHERE s.score > %s OR (s.score = %s AND s.rowid > %s)"
+            args += [score, score, rowid]
+        else:
+            where = "WHERE s.score >= %s"
+            args += [score]
+    with connections[alias or router.db_for_read(SearchEntry)].cursor() as db:
+        db.execute(SEARCH_SQL.format(where=where), [*args, limit])
+        return [(score, index, rowid, Tweet._meta.pk.to_python(pk)) for pk, score, rowid in db.fetchall()]
+
+
+def search_tweets(query, params, page_size=None):
+    """Live tweets matching ``query``, best match first.
+
+    Pages are keyset-paginated on (bm25 score, rowid), merged over the tweet
+    shards; ``params["after"]`` is the ``next_cursor`` of the previous page.
+    Raises ``SearchQueryError`` for queries the index cannot answer.
+    """
+    page_size = page_size or settings.TIMELINE_PAGE_SIZE
+    match = build_match(query)
+    cursor = decode_cursor(params.get("after"))
+    aliases = shard_aliases()
+    batches = [_search_shard(alias, index, match, cursor, page_size + 1) for index, alias in enumerate(aliases)]
+    rows = list(heapq.merge(*batches))[: page_size + 1]
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    tweets = {}
+    for index, alias in enumerate(aliases):
+        ids = [pk for _, shard, _, pk in rows if shard == index]
+        if ids:
+            queryset = Tweet.objects.using(alias) if alias else Tweet.objects.select_related("user")
+            tweets.update(queryset.in_bulk(ids))
+    # Tweets of deleted users are dropped, by the join to their author when not
+    # sharded and by attach_authors otherwise, so a page may come up short.
+    items = attach_authors([tweets[pk] for _, _, _, pk in rows if pk in tweets])
+    if not has_more:
+        return SearchPage(items)
+    score, shard, rowid, _ = rows[-1]
+    return SearchPage(items, encode_cursor(score, rowid, shard))
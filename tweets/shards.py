@@ -0,0 +1,169 @@
+"""Horizontal sharding of tweets by author.
+
+With ``TWEET_SHARDS`` set, every tweet lives in one of those databases,
+chosen by hashing its author's id unless ``User.tweet_shard`` names another
+one (after ``rebalance_tweets`` moved them). The rows hanging off a tweet
+(inbox entries, hashtags, mentions, likes, the search index) live next to
+it. Users, sessions and follows stay in "default".
+
+Reads that know the author go to a single shard; ``find_tweet``, the home
+timeline, search, tag feeds and trending scatter over the shards and merge.
+Writes of tweets-app rows that do not carry their tweet run inside
+``on_shard``. The export and the maintenance commands go through every
+shard in turn, and imports write each tweet to its author's shard.
+"""
+
+import contextvars
+import hashlib
+import heapq
+from collections import defaultdict
+from contextlib import contextmanager
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q, prefetch_related_objects
+
+from .models import Tweet
+from .pagination import TimelineSource
+
+User = get_user_model()
+
+_current = contextvars.ContextVar("tweets_shard", default=None)
+
+
+def hashed_shard(user_id):
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return settings.TWEET_SHARDS[int.from_bytes(digest, "big") % len(settings.TWEET_SHARDS)]
+
+
+def shard_for_user(user):
+    """The database alias holding ``user``'s tweets, or ``None`` when not sharded."""
+    if not settings.TWEET_SHARDS:
+        return None
+    return user.tweet_shard or hashed_shard(user.pk)
+
+
+def shard_aliases():
+    """Every database to look in for tweets (``None`` is the router's choice)."""
+    return settings.TWEET_SHARDS or [None]
+
+
+@contextmanager
+def on_shard(alias):
+    """Route tweets-app queries without a more specific hint to ``alias``."""
+    if alias is None:
+        yield
+        return
+    token = _current.set(alias)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def by_shard(tweets):
+    """Group ``tweets`` by the shard they were read from."""
+    groups = defaultdict(list)
+    for tweet in tweets:
+        groups[tweet._state.db if settings.TWEET_SHARDS else None].append(tweet)
+    return groups
+
+
+def scan_shards(queryset, fields, chunk_size):
+    """``values_list(*fields)`` rows of ``queryset`` from every shard, merged on the first field.
+
+    ``queryset`` must be ordered by that field. Each shard is read with a
+    server-side ``iterator()``, so memory stays flat.
+    """
+    rows = [queryset.using(alias).values_list(*fields).iterator(chunk_size=chunk_size) for alias in shard_aliases()]
+    return heapq.merge(*rows, key=itemgetter(0))
+
+
+class ShardRouter:
+    def _db(self, model, **hints):
+        if not settings.TWEET_SHARDS:
+            return None
+        instance = hints.get("instance")
+        if model._meta.app_label != "tweets":
+            # e.g. the author of a tweet that was read from a shard
+            if instance is not None and instance._state.db in settings.TWEET_SHARDS:
+                return "default"
+            return None
+        alias = _current.get()
+        if alias:
+            return alias
+        if isinstance(instance, Tweet) and instance.user_id:
+            return shard_for_user(instance.user)
+        if model is Tweet and isinstance(instance, User):  # user.tweet_set
+            return shard_for_user(instance)
+        if instance is not None and instance._state.db in settings.TWEET_SHARDS:
+            return instance._state.db
+        return settings.TWEET_SHARDS[0]
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {"default", *settings.TWEET_SHARD_DATABASES}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.TWEET_SHARD_DATABASES:
+            return app_label == "tweets"
+        return None
+
+
+def attach_authors(tweets):
+    """Load the authors of tweets read from shards, in one query on "default".
+
+    Returns the tweets whose author still exists: a deleted user's tweets
+    stay in the shards until ``purge_tweets``, and no join hides them there.
+    """
+    prefetch_related_objects([tweet for tweet in tweets if not Tweet.user.is_cached(tweet)], "user")
+    return [tweet for tweet in tweets if Tweet.user.field.get_cached_value(tweet, None) is not None]
+
+
+def find_tweet(pk):
+    """Look ``pk`` up in every shard; ``None`` if no shard has it or its author is gone."""
+    for alias in settings.TWEET_SHARDS:
+        tweet = Tweet.objects.using(alias).filter(id=pk).first()
+        if tweet is not None:
+            return next(iter(attach_authors([tweet])), None)
+    return None
+
+
+async def afind_tweet(pk):
+    for alias in settings.TWEET_SHARDS:
+        tweet = await Tweet.objects.using(alias).filter(id=pk).afirst()
+        if tweet is not None:
+            return next(iter(await sync_to_async(attach_authors)([tweet])), None)
+    return None
+
+
+def tweet_exists(pk):
+    return any(Tweet.objects.using(alias).filter(id=pk).exists() for alias in shard_aliases())
+
+
+def _home_authors(user):
+    # The user and everyone they follow, with where their tweets are.
+    return User.objects.filter(Q(pk=user.pk) | Q(followers__follower=user)).values_list("pk", "tweet_shard").distinct()
+
+
+def _home_sources(authors):
+    by_alias = defaultdict(list)
+    for pk, tweet_shard in authors:
+        by_alias[tweet_shard or hashed_shard(pk)].append(pk)
+    return [TimelineSource(Tweet.objects.using(alias).filter(user_id__in=pks)) for alias, pks in by_alias.items()]
+
+
+def home_sources(user):
+    """One ``TimelineSource`` per shard holding tweets of ``user``'s home timeline."""
+    return _home_sources(list(_home_authors(user)))
+
+
+async def ahome_sources(user):
+    return _home_sources([row async for row in _home_authors(user)])
@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .api import serialize_tweet
+from .cards import invalidate_cards
+from .ids import uuid7_timestamp_ms
+from .live import hub
+from .lookup import invalidate_tweets
+from .models import SearchEntry, TimelineEntry, Tweet, TweetHashtag
+from .search import index_for_search, unindex_for_search
+from .shards import shard_for_user
+from .tags import index_tweets
+from .timeline import fan_out, is_celebrity
+from .trending import engine as trending_engine
+from .versions import bump
+
+# Sent with ``tweet_id`` and ``user`` after a tweet was soft-deleted.
+tweet_tombstoned = Signal()
+
+
+def _forget(tweet_ids):
+    invalidate_cards(tweet_ids)
+    invalidate_tweets(tweet_ids)
+
+
+def _forget_user_tweets(user, chunk_size=500):
+    tweets = Tweet.objects.using(shard_for_user(user)).filter(user_id=user.pk)
+    tweet_ids = tweets.values_list("id", flat=True).iterator(chunk_size=chunk_size)
+    batch = []
+    for pk in tweet_ids:
+        batch.append(pk)
+        if len(batch) == chunk_size:
+            _forget(batch)
+            batch = []
+    _forget(batch)
+
+
+def _bump_removed(tweet_id, user):
+    owner_ids = TimelineEntry.objects.filter(tweet_id=tweet_id).values_list("owner_id", flat=True)
+    scopes = [f"inbox:{owner_id}" for owner_id in owner_ids] + [f"profile:{user.username}"]
+    if is_celebrity(user):
+        scopes.append("celebrities")
+    bump(scopes)
+
+
+@receiver(post_save, sender=Tweet, dispatch_uid="tweets_fan_out")
+def fan_out_new_tweet(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Tweet, dispatch_uid="tweets_index_tags")
+def index_tweet_tags(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "content" not in update_fields):
+        return
+    [(_, tags, _)] = index_tweets([instance], replace=not created)
+    if created and tags:
+        trending_engine.record(tags, instance.created_at.timestamp())
+
+
+@receiver(post_save, sender=Tweet, dispatch_uid="tweets_profile_version")
+def bump_profile_version(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump([f"profile:{instance.user.username}"])
+
+
+@receiver(pre_delete, sender=Tweet, dispatch_uid="tweets_delete_versions")
+def bump_versions_on_delete(sender, instance, **kwargs):
+    # Tombstoned tweets were already dropped from every page when tombstoned.
+    if instance.deleted_at is None:
+        _bump_removed(instance.pk, instance.user)
+
+
+@receiver(tweet_tombstoned, dispatch_uid="tweets_tombstoned")
+def forget_tombstoned_tweet(sender, tweet_id, user, **kwargs):
+    _forget([tweet_id])
+    unindex_for_search([tweet_id])
+    _bump_removed(tweet_id, user)
+
+
+@receiver(tweet_tombstoned, dispatch_uid="tweets_trending_tombstoned")
+def untrend_tombstoned_tweet(sender, tweet_id, user, **kwargs):
+    # Other processes drop it at their next rebuild (TRENDING_REBUILD_INTERVAL).
+    tags = list(TweetHashtag.objects.filter(tweet_id=tweet_id).values_list("hashtag__name", flat=True))
+    if tags:
+        trending_engine.discard(tags, uuid7_timestamp_ms(tweet_id) / 1000)
+
+
+@receiver(post_save, sender=Tweet, dispatch_uid="tweets_search_index")
+def index_saved_tweet(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {"title", "content", "deleted_at"} & set(update_fields)):
+        return
+    if not created:
+        unindex_for_search([instance.pk])
+    index_for_search([instance])
+
+
+@receiver(post_delete, sender=SearchEntry, dispatch_uid="tweets_search_row")
+def drop_search_row(sender, instance, using, **kwargs):
+    # Entries deleted along with their tweet (e.g. by purge_tweets).
+    with connections[using].cursor() as cursor:
+        cursor.execute("DELETE FROM tweets_tweet_fts WHERE rowid = %s", [instance.pk])
+
+
+@receiver(post_save, sender=Tweet, dispatch_uid="tweets_live_publish")
+def publish_new_tweet(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        event = serialize_tweet(instance)
+        transaction.on_commit(lambda: hub.publish(instance.user_id, event))
+
+
+@receiver(post_save, sender=Tweet, dispatch_uid="tweets_card_saved")
+@receiver(post_delete, sender=Tweet, dispatch_uid="tweets_card_deleted")
+def forget_changed_tweet(sender, instance, created=False, **kwargs):
+    if created:
+        # A miss for this id may have been cached before it existed.
+        invalidate_tweets([instance.pk])
+    else:
+        _forget([instance.pk])
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="tweets_username_check")
+def remember_username_change(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and "username" not in update_fields):
+        return
+    old = sender.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    instance._username_changed = old is not None and old != instance.username
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="tweets_username_changed")
+def invalidate_user_tweet_cards(sender, instance, **kwargs):
+    if getattr(instance, "_username_changed", False):
+        instance._username_changed = False
+        _forget_user_tweets(instance)
+        bump(["users"])
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid="tweets_user_deleted")
+def forget_deleted_user_tweets(sender, instance, **kwargs):
+    # Their tweets stay in the table until purge_tweets, but must stop being served.
+    _forget_user_tweets(instance)
@@ -0,0 +1,94 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .models import Hashtag, Mention, TweetHashtag
+from .pagination import TimelineSource, paginate_tweets
+from .shards import attach_authors, shard_aliases
+
+User = get_user_model()
+
+HASHTAG_RE = re.compile(r"(?<!\w)#(\w+)")
+MENTION_RE = re.compile(r"(?<![\w.])@([\w.+-]+)")
+
+
+def normalize_tag(value):
+    """Fold width and case so #Django, #django and ＃ＤＪＡＮＧＯ are one tag."""
+    return unicodedata.normalize("NFKC", value).casefold()
+
+
+def extract(text):
+    """Return the normalized hashtags and the mentioned usernames in ``text``."""
+    text = unicodedata.normalize("NFKC", text)
+    tags = {match.casefold()[:100] for match in HASHTAG_RE.findall(text)}
+    usernames = {match.rstrip(".") for match in MENTION_RE.findall(text)}
+    return tags, usernames - {""}
+
+
+def _ids_by_name(queryset, field, names):
+    names = list(names)
+    found = {}
+    for start in range(0, len(names), 500):
+        found.update(queryset.filter(**{f"{field}__in": names[start : start + 500]}).values_list(field, "id"))
+    return found
+
+
+def index_tweets(tweets, replace=False):
+    """Write the hashtag and mention rows of ``tweets`` in a few bulk queries.
+
+    With ``replace``, rows left over from an earlier version of the tweets are
+    removed first. Returns ``(tweet, tags, usernames)`` per tweet.
+    """
+    parsed = [(tweet, *extract(tweet.content)) for tweet in tweets]
+    if replace:
+        tweet_ids = [tweet.pk for tweet in tweets]
+        TweetHashtag.objects.filter(tweet_id__in=tweet_ids).delete()
+        Mention.objects.filter(tweet_id__in=tweet_ids).delete()
+
+    names = set().union(*(tags for _, tags, _ in parsed))
+    usernames = set().union(*(mentioned for _, _, mentioned in parsed))
+    if not names and not usernames:
+        return parsed
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], batch_size=500, ignore_conflicts=True)
+    tag_ids = _ids_by_name(Hashtag.objects, "name", names)
+    user_ids = _ids_by_name(User.objects, "username", usernames)
+
+    TweetHashtag.objects.bulk_create(
+        [TweetHashtag(hashtag_id=tag_ids[name], tweet=tweet) for tweet, tags, _ in parsed for name in tags],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    Mention.objects.bulk_create(
+        [
+            Mention(user_id=user_ids[username], tweet=tweet)
+            for tweet, _, mentioned in parsed
+            for username in mentioned
+            if username in user_ids
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    return parsed
+
+
+def _feed(queryset, params):
+    queryset = queryset.filter(tweet__deleted_at__isnull=True)
+    # Authors of sharded tweets are in "default"; attach_authors loads them.
+    queryset = queryset.select_related("tweet" if settings.TWEET_SHARDS else "tweet__user")
+    sources = [
+        TimelineSource(queryset.using(alias), id_field="tweet_id", tweet_field="tweet") for alias in shard_aliases()
+    ]
+    page = paginate_tweets(sources, params)
+    page.items = attach_authors(page.items)
+    return page
+
+
+def tag_feed(name, params):
+    """Newest tweets tagged ``name``, read from the hashtag index only."""
+    return _feed(TweetHashtag.objects.filter(hashtag__name=normalize_tag(name)), params)
+
+
+def mention_feed(user, params):
+    return _feed(Mention.objects.filter(user=user), params)
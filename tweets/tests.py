@@ -1,8 +1,41 @@
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import AsyncRequestFactory, TestCase, override_settings
 from django.urls import reverse_lazy
+from django.utils import timezone
+
+from accounts.models import Connection
+from mysite.queries import record_queries
 
-from .models import Tweet
+from . import views
+from .cache import LRUCache
+from .cards import card_key, get_card_cache, render_cards
+from .columnar import read_row_groups
+from .ids import min_uuid7, uuid7, uuid7_timestamp_ms
+from .likes import attach_likes, counter
+from .live import Broadcaster, hub
+from .lookup import get_tweet, tweet_key
+from .models import Hashtag, Like, Mention, SearchEntry, TimelineEntry, Tweet, TweetHashtag
+from .search import SearchQueryError, search_tweets
+from .shards import shard_for_user
+from .tags import extract, index_tweets
+from .timeline import fan_out, home_timeline, trim_inboxes
+from .trending import SpaceSaving, TrendingEngine, engine, trending
 
 User = get_user_model()
 
@@ -24,6 +57,394 @@ class TestHomeView(TestCase):
         self.assertTemplateUsed(response, "tweets/home.html")
 
 
+@override_settings(TIMELINE_PAGE_SIZE=2)
+class TestHomeViewPagination(TestCase):
+    def setUp(self):
+        self.url = reverse_lazy("tweets:home")
+        self.user = User.objects.create(username="test_user")
+        now = timezone.now()
+        self.tweets = [
+            Tweet.objects.create(
+                user=self.user, title=f"title{i}", content=f"content{i}", created_at=now - timedelta(minutes=i)
+            )
+            for i in range(5)
+        ]
+        self.client.force_login(self.user)
+
+    def test_first_page_is_newest(self):
+        response = self.client.get(self.url)
+        page = response.context["page"]
+        self.assertEqual(list(response.context["tweets_list"]), self.tweets[:2])
+        self.assertIsNotNone(page.older_cursor)
+        self.assertIsNone(page.newer_cursor)
+
+    def test_walk_older_and_newer(self):
+        first = self.client.get(self.url).context["page"]
+        second = self.client.get(self.url, {"before": first.older_cursor}).context["page"]
+        self.assertEqual(second.items, self.tweets[2:4])
+        third = self.client.get(self.url, {"before": second.older_cursor}).context["page"]
+        self.assertEqual(third.items, self.tweets[4:])
+        self.assertIsNone(third.older_cursor)
+        back = self.client.get(self.url, {"after": second.newer_cursor}).context["page"]
+        self.assertEqual(back.items, self.tweets[:2])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(self.url, {"before": "!!garbage"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["tweets_list"]), self.tweets[:2])
+
+
+class TestHomeTimeline(TestCase):
+    def setUp(self):
+        self.url = reverse_lazy("tweets:home")
+        self.reader = User.objects.create(username="reader")
+        self.followed = User.objects.create(username="followed")
+        self.stranger = User.objects.create(username="stranger")
+        Connection.objects.create(follower=self.reader, following=self.followed)
+        self.client.force_login(self.reader)
+
+    def test_shows_only_followed_and_own_tweets(self):
+        own = Tweet.objects.create(user=self.reader, title="own", content="own")
+        followed = Tweet.objects.create(user=self.followed, title="followed", content="followed")
+        Tweet.objects.create(user=self.stranger, title="stranger", content="stranger")
+        response = self.client.get(self.url)
+        self.assertEqual(list(response.context["tweets_list"]), [followed, own])
+
+    def test_fan_out_writes_follower_inbox(self):
+        tweet = Tweet.objects.create(user=self.followed, title="t", content="c")
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(tweet=tweet).values_list("owner_id", flat=True)),
+            {self.followed.pk, self.reader.pk},
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_tweets_are_merged_at_read_time(self):
+        User.objects.filter(pk=self.followed.pk).update(followers_count=1)
+        tweet = Tweet.objects.create(user=User.objects.get(pk=self.followed.pk), title="t", content="c")
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader, tweet=tweet).exists())
+        response = self.client.get(self.url)
+        self.assertEqual(list(response.context["tweets_list"]), [tweet])
+
+    @override_settings(TIMELINE_INBOX_SIZE=2, TIMELINE_TRIM_INTERVAL=1)
+    def test_inbox_is_bounded(self):
+        now = timezone.now()
+        tweets = [
+            Tweet.objects.create(user=self.followed, title="t", content="c", created_at=now - timedelta(minutes=i))
+            for i in range(4)
+        ]
+        for tweet in tweets:
+            fan_out(tweet)
+        trim_inboxes([self.reader.pk])
+        self.assertEqual(
+            list(
+                TimelineEntry.objects.filter(owner=self.reader)
+                .order_by("-tweet_id")
+                .values_list("tweet_id", flat=True)
+            ),
+            [tweets[0].pk, tweets[1].pk],
+        )
+
+
+class TestTweetIds(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+
+    def test_uuid7_is_monotonic(self):
+        ids = [uuid7() for _ in range(10000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(pk.version == 7 for pk in ids))
+
+    def test_given_timestamps_are_kept(self):
+        now = time.time_ns() // 1_000_000
+        # More than the counter holds, then a moment earlier (e.g. a racing thread).
+        ids = [uuid7(now) for _ in range(5000)] + [uuid7(now - 5)]
+        self.assertEqual([uuid7_timestamp_ms(pk) for pk in ids], [now] * 5000 + [now - 5])
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_id_follows_created_at(self):
+        now = timezone.now()
+        old = Tweet.objects.create(user=self.user, title="t", content="c", created_at=now - timedelta(days=1))
+        new = Tweet.objects.create(user=self.user, title="t", content="c")
+        self.assertLess(old.pk, new.pk)
+        self.assertEqual(uuid7_timestamp_ms(old.pk), int(old.created_at.timestamp() * 1000))
+        self.assertGreaterEqual(old.pk, min_uuid7(old.created_at))
+
+    def test_bulk_create_assigns_ordered_ids(self):
+        now = timezone.now()
+        tweets = Tweet.objects.bulk_create(
+            [Tweet(user=self.user, title="t", content="c", created_at=now - timedelta(minutes=i)) for i in range(5)]
+        )
+        self.assertEqual(list(Tweet.objects.values_list("id", flat=True)), [tweet.pk for tweet in tweets])
+
+
+class TestTweetCardCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="test_user")
+        self.tweet = Tweet.objects.create(user=self.user, title="test_title", content="test_content")
+
+    def test_second_render_is_served_from_cache(self):
+        render_cards([self.tweet])
+        self.assertIn(card_key(self.tweet.id), cache)
+        self.tweet.title = "not rendered"
+        cards = render_cards([self.tweet])
+        self.assertIn("test_title", cards[0].html)
+
+    def test_save_invalidates_card(self):
+        render_cards([self.tweet])
+        self.tweet.title = "new_title"
+        self.tweet.save()
+        self.assertNotIn(card_key(self.tweet.id), cache)
+        self.assertIn("new_title", render_cards([self.tweet])[0].html)
+
+    def test_delete_invalidates_card(self):
+        render_cards([self.tweet])
+        Tweet.objects.get(pk=self.tweet.pk).delete()
+        self.assertNotIn(card_key(self.tweet.id), cache)
+
+    def test_username_change_invalidates_cards(self):
+        render_cards([self.tweet])
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=["last_login"])
+        self.assertIn(card_key(self.tweet.id), cache)
+        self.user.username = "renamed_user"
+        self.user.save()
+        self.assertNotIn(card_key(self.tweet.id), cache)
+
+    @override_settings(TWEET_CARD_LOCAL_CACHE_SIZE=10000)
+    def test_local_tier_serves_hits(self):
+        render_cards([self.tweet])
+        cache.clear()
+        self.assertIn(card_key(self.tweet.id), get_card_cache().get_many([card_key(self.tweet.id)]))
+
+
+class TestLRUCache(TestCase):
+    def test_evicts_least_recently_used_by_size(self):
+        lru = LRUCache(max_size=20, timeout=60)
+        lru.set_many({"a": "12345678", "b": "12345678"})
+        lru.get_many(["a"])
+        lru.set_many({"c": "12345678"})
+        self.assertEqual(set(lru.get_many(["a", "b", "c"])), {"a", "c"})
+        self.assertLessEqual(lru.size, 20)
+
+    def test_skips_values_larger_than_cache(self):
+        lru = LRUCache(max_size=5, timeout=60)
+        lru.set_many({"a": "123456789"})
+        self.assertEqual(lru.get_many(["a"]), {})
+
+
+class TestTweetApi(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+        self.tweet = Tweet.objects.create(user=self.user, title="test_title", content="テスト")
+        self.client.force_login(self.user)
+
+    def test_home(self):
+        response = self.client.get(reverse_lazy("tweets:api_home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t["id"] for t in response.json()["tweets"]], [str(self.tweet.id)])
+
+    def test_user_tweets(self):
+        response = self.client.get(reverse_lazy("tweets:api_user_tweets", kwargs={"username": "test_user"}))
+        self.assertEqual(response.json()["tweets"][0]["content"], "テスト")
+
+    def test_unknown_user_is_a_json_404(self):
+        response = self.client.get(reverse_lazy("tweets:api_user_tweets", kwargs={"username": "nobody"}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": "Not found."})
+
+    def test_detail(self):
+        response = self.client.get(reverse_lazy("tweets:api_detail", kwargs={"pk": str(self.tweet.id)}))
+        self.assertEqual(response.json()["title"], "test_title")
+
+    def test_detail_with_malformed_id(self):
+        response = self.client.get(reverse_lazy("tweets:api_detail", kwargs={"pk": "junk"}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse_lazy("tweets:api_home"))
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_ndjson(self):
+        for i in range(4):
+            Tweet.objects.create(user=self.user, title=f"title{i}", content="content")
+        response = self.client.get(reverse_lazy("tweets:api_export"))
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["id"], str(self.tweet.id))
+        self.assertEqual(set(rows[0]), {"id", "user", "title", "content", "created_at"})
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_export_streams_asynchronously_under_asgi(self):
+        for i in range(4):
+            await sync_to_async(Tweet.objects.create)(user=self.user, title=f"title{i}", content="content")
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse_lazy("tweets:api_export"))
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        rows = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        self.assertEqual([row["title"] for row in rows], ["test_title"] + [f"title{i}" for i in range(4)])
+
+
+class TestLiveView(TestCase):
+    def setUp(self):
+        self.url = reverse_lazy("tweets:live")
+        self.user = User.objects.create(username="reader")
+        self.followed = User.objects.create(username="followed")
+        self.stranger = User.objects.create(username="stranger")
+        Connection.objects.create(follower=self.user, following=self.followed)
+        self.async_client.force_login(self.user)
+
+    def create_tweet(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Tweet.objects.create(user=user, title="live_title", content="live_content")
+
+    async def test_streams_new_tweets_from_followed_users(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+        await sync_to_async(self.create_tweet)(self.stranger)
+        tweet = await sync_to_async(self.create_tweet)(self.followed)
+        event = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b"event: tweet", event)
+        self.assertIn(str(tweet.id).encode(), event)
+        await stream.aclose()
+
+    @override_settings(LIVE_HEARTBEAT_INTERVAL=0.01)
+    async def test_sends_heartbeat_when_idle(self):
+        response = await self.async_client.get(self.url)
+        stream = response.streaming_content
+        await anext(stream)
+        self.assertEqual(await asyncio.wait_for(anext(stream), 1), b": ping\n\n")
+        await stream.aclose()
+
+    @override_settings(LIVE_MAX_DURATION=0.05, LIVE_HEARTBEAT_INTERVAL=0.01)
+    async def test_stream_ends_after_max_duration(self):
+        response = await self.async_client.get(self.url)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertTrue(chunks[0].startswith(b"retry:"))
+        self.assertEqual(len(hub), 0)
+
+    @override_settings(LIVE_MAX_DURATION=0.05, LIVE_HEARTBEAT_INTERVAL=0.01)
+    async def test_subscribes_only_when_streamed(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(len(hub), 0)
+        stream = response.streaming_content
+        await anext(stream)
+        self.assertEqual(len(hub), 1)
+        self.assertTrue([chunk async for chunk in stream])
+        self.assertEqual(len(hub), 0)
+
+    async def test_requires_login(self):
+        await sync_to_async(self.async_client.logout)()
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+
+class TestBroadcaster(TestCase):
+    async def test_drops_slow_consumers(self):
+        broadcaster = Broadcaster()
+        slow = broadcaster.subscribe([1], maxsize=2)
+        for i in range(3):
+            broadcaster.publish(1, {"id": i})
+        await asyncio.sleep(0)
+        self.assertTrue(slow.dropped)
+        self.assertEqual(len(broadcaster), 0)
+        self.assertIsNone(await slow.get(timeout=1))
+
+    async def test_filters_by_audience(self):
+        broadcaster = Broadcaster()
+        subscription = broadcaster.subscribe([1], maxsize=2)
+        broadcaster.publish(2, {"id": "other"})
+        broadcaster.publish(1, {"id": "mine"})
+        self.assertEqual(await subscription.get(timeout=1), {"id": "mine"})
+
+
+class TestAsyncReadViews(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+        self.tweet = Tweet.objects.create(user=self.user, title="test_title", content="test_content")
+        self.factory = AsyncRequestFactory()
+
+    def get(self, path, user):
+        request = self.factory.get(path)
+        request.user = user
+        return request
+
+    async def test_home(self):
+        response = await views.async_home_view(self.get("/tweets/home/", self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "test_title")
+
+    async def test_detail(self):
+        response = await views.async_tweetdetail_view(self.get("/", self.user), str(self.tweet.id))
+        self.assertContains(response, "test_content")
+
+    async def test_detail_not_found(self):
+        response = await views.async_tweetdetail_view(self.get("/", self.user), "not-a-tweet")
+        self.assertEqual(response.status_code, 404)
+        response = await views.async_tweetdetail_view(self.get("/", self.user), str(uuid7()))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_redirects_anonymous_user(self):
+        response = await views.async_home_view(self.get("/tweets/home/", AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(SHARED_CACHE=True)
+class TestConditionalTimeline(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse_lazy("tweets:home")
+        self.user = User.objects.create(username="reader")
+        self.followed = User.objects.create(username="followed")
+        Connection.objects.create(follower=self.user, following=self.followed)
+        self.tweet = Tweet.objects.create(user=self.followed, title="t", content="c")
+        self.client.force_login(self.user)
+
+    def test_unchanged_home_returns_304_without_timeline_queries(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertIn("Cookie", response["Vary"])
+        self.assertIn("private", response["Cache-Control"])
+        # Only the session and user lookups remain.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_no_etag_without_shared_cache(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertIn("no-cache", response["Cache-Control"])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"anything"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_tweet_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        Tweet.objects.create(user=self.followed, title="t2", content="c2")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_delete_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.tweet.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_user_and_cursor(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertNotEqual(self.client.get(self.url, {"before": "x"})["ETag"], etag)
+        self.client.force_login(self.followed)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
 class TestTweetCreateView(TestCase):
     def setUp(self):
         self.url = reverse_lazy("tweets:create")
@@ -65,8 +486,10 @@ class TestTweetCreateView(TestCase):
         )
 
 
+@override_settings(TWEET_CACHE_ALIAS="default")
 class TestTweetDetailView(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create(
             username="test_user",
         )
@@ -81,6 +504,51 @@ class TestTweetDetailView(TestCase):
         self.assertEqual(response.context["tweets"][0], self.tweet)
         self.assertTemplateUsed(response, "tweets/detail.html")
 
+    def test_tweet_is_served_from_cache(self):
+        self.client.get(self.url)
+        # session, user and the "liked by me" flag
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, "test_user")
+
+    @override_settings(TWEET_CACHE_ALIAS=None)
+    def test_tweet_is_not_cached_without_shared_cache(self):
+        self.client.get(self.url)
+        self.assertIsNone(cache.get(tweet_key(self.tweet.id)))
+        # session, user, the tweet and the "liked by me" flag
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertContains(response, "test_user")
+
+    def test_malformed_id_is_rejected_without_lookup(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse_lazy("tweets:detail", kwargs={"pk": "not-a-tweet"}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_id_is_negatively_cached(self):
+        url = reverse_lazy("tweets:detail", kwargs={"pk": str(uuid7())})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_deleted_tweet_is_no_longer_served(self):
+        self.client.get(self.url)
+        self.client.post(reverse_lazy("tweets:delete", kwargs={"pk": str(self.tweet.id)}))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_username_change_invalidates_cached_tweet(self):
+        self.client.get(self.url)
+        self.user.username = "renamed_user"
+        self.user.save()
+        self.assertContains(self.client.get(self.url), "renamed_user")
+
+    def test_deleted_author_hides_cached_tweet(self):
+        self.client.get(self.url)
+        reader = User.objects.create(username="reader")
+        self.client.force_login(reader)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
 
 class TestTweetDeleteView(TestCase):
     def setUp(self):
@@ -114,19 +582,674 @@ class TestTweetDeleteView(TestCase):
         self.assertEqual(response.status_code, 403)
         self.assertTrue(Tweet.objects.filter(id=self.tweet2.id).exists())
 
+    def test_success_post_leaves_tombstone(self):
+        # session, user, the tombstone UPDATE, two search index DELETEs, the inbox owners
+        # and the tags to take out of the trending counts
+        with self.assertNumQueries(7):
+            self.client.post(self.url)
+        tweet = Tweet.all_objects.get(id=self.tweet.id)
+        self.assertIsNotNone(tweet.deleted_at)
+
+    def test_tombstoned_tweet_cannot_be_deleted_again(self):
+        self.client.post(self.url)
+        self.assertEqual(self.client.post(self.url).status_code, 404)
+
+
+class TestPurgeTweetsCommand(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+        self.gone = User.objects.create(username="gone_user")
+        self.kept = Tweet.objects.create(user=self.user, title="kept", content="kept")
+        self.tombstoned = Tweet.objects.create(user=self.user, title="tombstoned", content="tombstoned")
+        Tweet.objects.filter(pk=self.tombstoned.pk).update(deleted_at=timezone.now())
+        self.orphans = [Tweet.objects.create(user=self.gone, title="orphan", content="orphan") for _ in range(3)]
+
+    def test_deleting_user_does_not_cascade(self):
+        user_id = self.gone.pk
+        self.gone.delete()
+        self.assertEqual(Tweet.all_objects.filter(user_id=user_id).count(), 3)
+        # Timelines join the author, so orphaned tweets disappear right away.
+        self.assertEqual(list(Tweet.objects.select_related("user").filter(pk=self.orphans[0].pk)), [])
 
-# class TestLikeView(TestCase):
-#     def test_success_post(self):
+    def test_purges_tombstones_and_orphans_in_batches(self):
+        self.gone.delete()
+        out = StringIO()
+        call_command("purge_tweets", batch_size=2, sleep=0, stdout=out)
+        self.assertEqual(list(Tweet.all_objects.all()), [self.kept])
+        self.assertFalse(TimelineEntry.objects.exclude(tweet=self.kept).exists())
+        self.assertIn("Tombstoned 3 orphaned tweets, purged 4 tweets.", out.getvalue())
 
-#     def test_failure_post_with_not_exist_tweet(self):
+    def test_looks_up_authors_in_batches(self):
+        for i in range(3):
+            Tweet.objects.create(user=User.objects.create(username=f"author{i}"), title="t", content="c")
+        gone_id = self.gone.pk
+        self.gone.delete()
+        with record_queries() as queries:
+            call_command("purge_tweets", batch_size=2, sleep=0, stdout=StringIO())
+        lookups = [sql for sql in queries.statements if 'FROM "accounts_user" WHERE "accounts_user"."id" IN' in sql]
+        # 5 authors, at most 2 per lookup
+        self.assertEqual(sum(queries.statements[sql] for sql in lookups), 3)
+        self.assertFalse(Tweet.all_objects.filter(user_id=gone_id).exists())
+        self.assertEqual(Tweet.all_objects.count(), 4)
 
-#     def test_failure_post_with_liked_tweet(self):
 
+class TestSearch(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+        self.client.force_login(self.user)
+        self.in_title = Tweet.objects.create(user=self.user, title="東京タワー", content="夜景")
+        self.in_content = Tweet.objects.create(user=self.user, title="旅行", content="今日は東京タワーに行きました")
+        self.other = Tweet.objects.create(user=self.user, title="大阪", content="たこ焼き")
+
+    def test_matches_substrings_ranked(self):
+        self.assertEqual(list(search_tweets("東京タ", {})), [self.in_title, self.in_content])
+        self.assertEqual(list(search_tweets("タワー 行きま", {})), [self.in_content])
+
+    def test_keyset_pagination(self):
+        first = search_tweets("東京タワー", {}, page_size=1)
+        second = search_tweets("東京タワー", {"after": first.next_cursor}, page_size=1)
+        self.assertEqual(list(first) + list(second), [self.in_title, self.in_content])
+        self.assertIsNone(second.next_cursor)
+
+    def test_index_follows_updates_and_tombstones(self):
+        self.other.content = "東京タワーも見たい"
+        self.other.save()
+        Tweet.objects.filter(pk=self.in_title.pk).update(deleted_at=timezone.now())
+        self.assertEqual(set(search_tweets("東京タワー", {})), {self.in_content, self.other})
+        self.assertEqual(list(search_tweets("たこ焼き", {})), [])
+
+    def test_hard_delete_drops_index_rows(self):
+        Tweet.objects.filter(pk=self.other.pk).delete()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM tweets_tweet_fts")
+            self.assertEqual(cursor.fetchone(), (2,))
+
+    def test_short_terms_are_rejected(self):
+        with self.assertRaises(SearchQueryError):
+            search_tweets("東京", {})
+
+    def test_operators_are_matched_literally(self):
+        self.assertEqual(list(search_tweets('"OR" NEAR(', {})), [])
+
+    def test_view_and_api(self):
+        response = self.client.get(reverse_lazy("tweets:search"), {"q": "たこ焼"})
+        self.assertContains(response, "大阪")
+        self.assertEqual(self.client.get(reverse_lazy("tweets:api_search"), {"q": "ab"}).status_code, 400)
+        data = self.client.get(reverse_lazy("tweets:api_search"), {"q": "たこ焼"}).json()
+        self.assertEqual([tweet["id"] for tweet in data["tweets"]], [str(self.other.id)])
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command("rebuild_search_index", batch_size=2, sleep=0, stdout=out)
+        self.assertIn("Indexed 3 tweets.", out.getvalue())
+        self.assertEqual(list(search_tweets("たこ焼", {})), [self.other])
+
+
+@override_settings(TIMELINE_PAGE_SIZE=2)
+class TestHashtagsAndMentions(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+        self.alice = User.objects.create(username="alice")
+        self.client.force_login(self.user)
+
+    def test_extract(self):
+        self.assertEqual(
+            extract("Hi @alice. #Django と ＃ｄｊａｎｇｏ、#東京 mail@example.com a#b"),
+            ({"django", "東京"}, {"alice"}),
+        )
+
+    def test_created_tweet_is_indexed(self):
+        self.client.post(reverse_lazy("tweets:create"), {"title": "t", "content": "#Django @alice @nobody"})
+        tweet = Tweet.objects.get()
+        self.assertEqual(list(TweetHashtag.objects.values_list("hashtag__name", "tweet")), [("django", tweet.pk)])
+        self.assertEqual(list(Mention.objects.values_list("user", "tweet")), [(self.alice.pk, tweet.pk)])
+
+    def test_edit_replaces_tags(self):
+        tweet = Tweet.objects.create(user=self.user, title="t", content="#old")
+        tweet.content = "#new"
+        tweet.save()
+        self.assertEqual(list(tweet.tweet_hashtags.values_list("hashtag__name", flat=True)), ["new"])
+
+    def test_tag_feed_is_paginated(self):
+        now = timezone.now()
+        tweets = [
+            Tweet.objects.create(user=self.user, title="t", content="#Tag", created_at=now - timedelta(minutes=i))
+            for i in range(3)
+        ]
+        Tweet.objects.create(user=self.user, title="t", content="#other")
+        Tweet.objects.filter(pk=tweets[1].pk).update(deleted_at=now)
+        url = reverse_lazy("tweets:tag", kwargs={"tag": "TAG"})
+        first = self.client.get(url).context["page"]
+        self.assertEqual(first.items, [tweets[0], tweets[2]])
+        self.assertIsNone(first.older_cursor)
+
+    def test_mention_feed(self):
+        tweet = Tweet.objects.create(user=self.user, title="t", content="hello @alice")
+        response = self.client.get(reverse_lazy("tweets:mentions", kwargs={"username": "alice"}))
+        self.assertEqual(response.context["page"].items, [tweet])
+        self.assertContains(response, "@alice")
+        missing = self.client.get(reverse_lazy("tweets:mentions", kwargs={"username": "nobody"}))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_backfill_command(self):
+        tweets = Tweet.objects.bulk_create(
+            [Tweet(user=self.user, title="t", content=f"#tag{i % 2} @alice") for i in range(5)]
+        )
+        out = StringIO()
+        call_command("backfill_tags", batch_size=2, sleep=0, stdout=out)
+        self.assertIn("Indexed tags of 5 tweets.", out.getvalue())
+        self.assertEqual(set(Hashtag.objects.values_list("name", flat=True)), {"tag0", "tag1"})
+        self.assertEqual(TweetHashtag.objects.count(), 5)
+        self.assertEqual(set(Mention.objects.values_list("tweet", flat=True)), {tweet.pk for tweet in tweets})
+
+
+class TestTrending(TestCase):
+    def setUp(self):
+        cache.clear()
+        engine.clear()
+        self.user = User.objects.create(username="test_user")
+        self.client.force_login(self.user)
+        self.url = reverse_lazy("tweets:api_trending")
+
+    def test_space_saving_keeps_heavy_hitters_in_bounded_memory(self):
+        sketch = SpaceSaving(10)
+        for i in range(5000):
+            sketch.add("hot" if i % 3 == 0 else f"rare{i}")
+        self.assertEqual(len(sketch), 10)
+        self.assertGreaterEqual(sketch.counts["hot"], 1667)
+        self.assertLessEqual(len(sketch._heap), 20)
+
+    def test_windows_expire(self):
+        trends = TrendingEngine(capacity=10)
+        now = 1_000_000_000
+        trends.record(["old"], now - 2 * 60 * 60)
+        trends.record(["new", "new"], now - 60)
+        trends.record(["new"], now)
+        self.assertEqual(trends.top("1h", 5, now=now), [("new", 3)])
+        self.assertEqual(trends.top("24h", 5, now=now), [("new", 3), ("old", 1)])
+        self.assertEqual(trends.top("24h", 5, now=now + 25 * 60 * 60), [])
+
+    def test_endpoint_is_fed_by_new_tweets_and_cached(self):
+        for content in ("#a #b", "#a", "#A"):
+            self.client.post(reverse_lazy("tweets:create"), {"title": "t", "content": content})
+        data = self.client.get(self.url, {"limit": 1}).json()
+        self.assertEqual(data, {"window": "1h", "tags": [{"tag": "a", "count": 3}]})
+        Tweet.objects.create(user=self.user, title="t", content="#b #b2 #b3")
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url).json()
+        self.assertEqual(data["tags"], [{"tag": "a", "count": 3}, {"tag": "b", "count": 1}])
+        self.assertEqual(self.client.get(self.url, {"window": "7d"}).status_code, 400)
+
+    def test_engine_warms_up_from_the_hashtag_index(self):
+        Tweet.objects.create(user=self.user, title="t", content="#warm")
+        Tweet.objects.create(user=self.user, title="t", content="#old", created_at=timezone.now() - timedelta(days=2))
+        engine.clear()
+        data = self.client.get(self.url, {"window": "24h"}).json()
+        self.assertEqual(data["tags"], [{"tag": "warm", "count": 1}])
+
+    def test_space_saving_discard(self):
+        sketch = SpaceSaving(2)
+        sketch.add("a", 3)
+        sketch.discard("a")
+        sketch.discard("missing")
+        self.assertEqual(sketch.counts, {"a": 2})
+        sketch.discard("a", 2)
+        self.assertEqual(len(sketch), 0)
+
+    def test_tombstoned_tweets_stop_trending(self):
+        for content in ("#gone #kept", "#kept"):
+            self.client.post(reverse_lazy("tweets:create"), {"title": "t", "content": content})
+        tweet = Tweet.objects.get(content="#gone #kept")
+        self.client.post(reverse_lazy("tweets:delete", kwargs={"pk": tweet.pk}))
+        self.assertEqual(engine.top("1h", 5), [("kept", 1)])
+
+    def test_engine_is_rebuilt_periodically(self):
+        self.assertEqual(self.client.get(self.url).json()["tags"], [])
+        # Written by another worker, whose counts this process never saw.
+        tweet = Tweet(user=self.user, title="t", content="#elsewhere")
+        Tweet.objects.bulk_create([tweet])
+        index_tweets([tweet])
+        self.assertEqual(trending("1h", 5), [])
+        with override_settings(TRENDING_REBUILD_INTERVAL=0):
+            self.assertEqual(trending("1h", 5), [("elsewhere", 1)])
+            Tweet.objects.filter(pk=tweet.pk).update(deleted_at=timezone.now())
+            self.assertEqual(trending("1h", 5), [])
+
+    @override_settings(TRENDING_REBUILD_INTERVAL=0, TRENDING_REBUILD_IN_BACKGROUND=True)
+    def test_stale_engine_is_rebuilt_once_in_the_background(self):
+        trending("1h", 5)
+        engine.record(["old"])
+        release, rebuilt = threading.Event(), threading.Event()
+
+        def slow_warm_up():
+            release.wait(5)
+            rebuilt.set()
+
+        with mock.patch("tweets.trending.warm_up", side_effect=slow_warm_up) as warm_up:
+            # Served the old counts while the rebuild runs, which only one request starts.
+            self.assertEqual(trending("1h", 5), [("old", 1)])
+            self.assertEqual(trending("1h", 5), [("old", 1)])
+            release.set()
+            self.assertTrue(rebuilt.wait(5))
+        warm_up.assert_called_once_with()
+
+    def test_command(self):
+        for i in range(3):
+            Tweet.objects.create(user=self.user, title="t", content=f"#x #y{i % 2}")
+        out = StringIO()
+        with (
+            override_settings(TRENDING_RECOMPUTE_CACHE_TIMEOUT=600),
+            mock.patch.object(cache, "set", wraps=cache.set) as cache_set,
+        ):
+            call_command("trending", verify=True, recompute=True, limit=2, stdout=out)
+        self.assertIn("1h: 2/2 of the exact top 2 found, max overestimate 0", out.getvalue())
+        self.assertEqual({call.args[2] for call in cache_set.call_args_list}, {600})
+        self.assertEqual(self.client.get(self.url).json()["tags"][0], {"tag": "x", "count": 3})
+
+
+@override_settings(LIKE_FLUSH_INTERVAL=60, LIKE_FLUSH_MAX_PENDING=1000)
+class TestLikeView(TestCase):
+    def setUp(self):
+        cache.clear()
+        counter.flush()
+        self.user = User.objects.create(username="test_user")
+        self.client.force_login(self.user)
+        self.tweet = Tweet.objects.create(user=self.user, title="test_title", content="test_content")
+        self.url = reverse_lazy("tweets:like", kwargs={"pk": str(self.tweet.id)})
+
+    def test_success_post(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.json(), {"liked": True, "like_count": 1})
+        self.assertTrue(Like.objects.filter(user=self.user, tweet=self.tweet).exists())
+
+    def test_failure_post_with_not_exist_tweet(self):
+        response = self.client.post(reverse_lazy("tweets:like", kwargs={"pk": str(uuid7())}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_failure_post_with_liked_tweet(self):
+        self.client.post(self.url)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_count_is_written_behind(self):
+        self.client.post(self.url)
+        other = User.objects.create(username="other")
+        self.client.force_login(other)
+        self.client.post(self.url)
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 0)
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 2)
+
+    def test_flush_groups_tweets_by_delta(self):
+        tweets = [Tweet.objects.create(user=self.user, title="t", content="c") for _ in range(3)]
+        for tweet, delta in zip(tweets, (1, 1, 2)):
+            counter.add(tweet.pk, delta)
+        # one UPDATE per distinct delta
+        with self.assertNumQueries(4):
+            counter.flush()
+        self.assertEqual(
+            [tweet.like_count for tweet in Tweet.objects.filter(pk__in=[t.pk for t in tweets])], [2, 1, 1]
+        )
+
+    def test_page_gets_likes_in_one_query(self):
+        tweets = [Tweet.objects.create(user=self.user, title="t", content="c") for _ in range(3)]
+        Like.objects.create(user=self.user, tweet=tweets[1])
+        counter.add(tweets[1].pk, 1)
+        cards = render_cards(list(Tweet.objects.filter(pk__in=[tweet.pk for tweet in tweets])))
+        with self.assertNumQueries(1):
+            attach_likes(cards, self.user)
+        self.assertEqual([(card.like_count, card.liked) for card in cards], [(0, False), (1, True), (0, False)])
+
+    def test_recount_likes_command(self):
+        Like.objects.create(user=self.user, tweet=self.tweet)
+        Tweet.objects.filter(pk=self.tweet.pk).update(like_count=5)
+        Tweet.objects.create(user=self.user, title="t", content="c")
+        out = StringIO()
+        call_command("recount_likes", batch_size=1, sleep=0, stdout=out)
+        self.assertIn("Fixed like counts of 1 tweets.", out.getvalue())
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 1)
+
+    def test_home_shows_likes(self):
+        self.client.post(self.url)
+        response = self.client.get(reverse_lazy("tweets:home"))
+        self.assertEqual([(card.like_count, card.liked) for card in response.context["cards"]], [(1, True)])
 
-# class TestUnLikeView(TestCase):
 
-#     def test_success_post(self):
+class TestUnLikeView(TestCase):
+    def setUp(self):
+        cache.clear()
+        counter.flush()
+        self.user = User.objects.create(username="test_user")
+        self.client.force_login(self.user)
+        self.tweet = Tweet.objects.create(user=self.user, title="test_title", content="test_content")
+        self.url = reverse_lazy("tweets:unlike", kwargs={"pk": str(self.tweet.id)})
+
+    def test_success_post(self):
+        self.client.post(reverse_lazy("tweets:like", kwargs={"pk": str(self.tweet.id)}))
+        counter.flush()
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 1)
+        response = self.client.post(self.url)
+        self.assertEqual(response.json(), {"liked": False, "like_count": 0})
+        counter.flush()
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 0)
+
+    def test_count_never_goes_negative(self):
+        # The like being undone is still buffered in another worker.
+        Like.objects.create(user=self.user, tweet=self.tweet)
+        self.client.post(self.url)
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 0)
+
+    def test_failed_flush_is_retried(self):
+        counter.add(self.tweet.pk, 1)
+        with mock.patch.object(Tweet.all_objects, "using", side_effect=DatabaseError("locked")):
+            with self.assertLogs("tweets.likes", "ERROR"):
+                self.assertEqual(counter.flush(), 0)
+        self.assertEqual(counter.pending([self.tweet.pk]), {self.tweet.pk: 1})
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(Tweet.objects.get(pk=self.tweet.pk).like_count, 1)
+
+    def test_failure_post_with_not_exist_tweet(self):
+        response = self.client.post(reverse_lazy("tweets:unlike", kwargs={"pk": "not-a-tweet"}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_failure_post_with_unliked_tweet(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+
+
+class TestImportTweetsCommand(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="author")
+        self.follower = User.objects.create(username="follower")
+        Connection.objects.create(follower=self.follower, following=self.author)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as file:
+            file.write(text)
+        return path
+
+    def ndjson(self, rows):
+        return self.write("tweets.ndjson", "".join(json.dumps(row) + "\n" for row in rows))
+
+    def row(self, n, **fields):
+        return {
+            "user": "author",
+            "title": f"title {n}",
+            "content": f"content {n} #imported",
+            "created_at": f"2024-01-0{n}T12:00:00+00:00",
+            **fields,
+        }
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command("import_tweets", path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_and_indexes_in_batches(self):
+        path = self.ndjson([self.row(n) for n in range(1, 6)])
+        out, err = self.run_import(path, batch_size=2)
+        self.assertIn("5 rows in", out)
+        self.assertEqual(err, "")
+        tweets = list(Tweet.objects.order_by("id"))
+        self.assertEqual([tweet.title for tweet in tweets], [f"title {n}" for n in range(1, 6)])
+        self.assertEqual(
+            [uuid7_timestamp_ms(tweet.id) for tweet in tweets],
+            [int(tweet.created_at.timestamp() * 1000) for tweet in tweets],
+        )
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.follower).count(), 5)
+        self.assertEqual(TweetHashtag.objects.filter(hashtag__name="imported").count(), 5)
+        self.assertEqual(len(search_tweets("imported", {})), 5)
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+    def test_reports_and_skips_invalid_rows(self):
+        path = self.ndjson([self.row(1), self.row(2, user="nobody"), self.row(3, title="x" * 51)])
+        with open(path, "a") as file:
+            file.write('{"user": "author", "created_at": "yesterday"}\nnot json\n')
+        out, err = self.run_import(path)
+        self.assertEqual(Tweet.objects.count(), 1)
+        self.assertIn("1 rows in", out)
+        self.assertIn("4 invalid", out)
+        self.assertIn("Line 2: Unknown user 'nobody'.", err)
+        self.assertIn("Line 5: Not a JSON object.", err)
+
+    def test_reads_csv(self):
+        path = self.write("tweets.csv", 'user,title,content,created_at\nauthor,hello,"a, b",2024-01-01 12:00\n')
+        self.run_import(path)
+        tweet = Tweet.objects.get()
+        self.assertEqual(tweet.content, "a, b")
+        self.assertIsNotNone(tweet.created_at.tzinfo)
+
+    def test_keeps_exported_ids(self):
+        pk = uuid7()
+        self.run_import(self.ndjson([self.row(1, id=str(pk))]))
+        self.assertEqual(Tweet.objects.get().pk, pk)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.ndjson([self.row(n) for n in range(1, 5)])
+        with open(path + ".checkpoint", "w") as file:
+            file.write("2")
+        out, _ = self.run_import(path)
+        self.assertIn("Resuming after line 2.", out)
+        self.assertEqual(sorted(Tweet.objects.values_list("title", flat=True)), ["title 3", "title 4"])
+
+    def test_replayed_rows_are_not_duplicated(self):
+        path = self.ndjson([self.row(n) for n in range(1, 4)])
+        self.run_import(path)
+        self.run_import(path, restart=True)
+        self.assertEqual(Tweet.objects.count(), 3)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.follower).count(), 3)
+
+
+class TestExportTweetsCommand(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="test_user")
+        start = timezone.now().replace(microsecond=0) - timedelta(days=10)
+        self.tweets = Tweet.objects.bulk_create(
+            [
+                Tweet(user=self.user, title=f"title {n}", content=f"content {n}", created_at=start + timedelta(days=n))
+                for n in range(5)
+            ]
+        )
+        Tweet.objects.filter(pk=self.tweets[4].pk).update(deleted_at=timezone.now())
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def export(self, name, **options):
+        path = os.path.join(self.dir.name, name)
+        call_command("export_tweets", path, stdout=StringIO(), **options)
+        return path
+
+    def test_ndjson_round_trips_through_import(self):
+        path = self.export("tweets.ndjson", chunk_size=2)
+        with open(path) as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual([row["title"] for row in rows], [f"title {n}" for n in range(4)])
+        self.assertEqual(rows[0]["id"], str(self.tweets[0].pk))
+        Tweet.all_objects.all().delete()
+        call_command("import_tweets", path, stdout=StringIO())
+        self.assertEqual(sorted(Tweet.objects.values_list("id", flat=True)), [tweet.pk for tweet in self.tweets[:4]])
+
+    def test_since_and_until(self):
+        since = self.tweets[1].created_at.isoformat()
+        until = self.tweets[3].created_at.isoformat()
+        path = self.export("tweets.csv", since=since, until=until)
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["title"] for row in rows], ["title 1", "title 2"])
+
+    def test_columnar_in_parts(self):
+        path = self.export("tweets.twc", parts=3, chunk_size=2)
+        with open(path, "rb") as file:
+            rows = [row for group in read_row_groups(file) for row in zip(*group.values())]
+        self.assertEqual(
+            rows,
+            [(t.pk, "test_user", t.title, t.content, t.created_at) for t in self.tweets[:4]],
+        )
+
+    def test_rejects_bad_dates(self):
+        with self.assertRaisesMessage(CommandError, "--since must be an ISO 8601 date or datetime."):
+            self.export("tweets.ndjson", since="last week")
+
+
+@override_settings(TWEET_SHARDS=["tweets0", "tweets1"])
+class TestSharding(TestCase):
+    databases = {"default", "tweets0", "tweets1"}
+
+    def setUp(self):
+        cache.clear()
+        # Placed explicitly, so the tests do not depend on where ids hash to.
+        self.alice = User.objects.create(username="alice", tweet_shard="tweets0")
+        self.bob = User.objects.create(username="bob", tweet_shard="tweets1")
+        Connection.objects.create(follower=self.alice, following=self.bob)
+        self.client.force_login(self.alice)
+
+    def post(self, user, content):
+        self.client.force_login(user)
+        self.client.post(reverse_lazy("tweets:create"), {"title": "t", "content": content})
+        self.client.force_login(self.alice)
+        return Tweet.objects.using(user.tweet_shard).get(content=content)
+
+    def test_hashed_placement(self):
+        self.assertIn(shard_for_user(User(pk=42)), ["tweets0", "tweets1"])
+        self.assertEqual(shard_for_user(User(pk=42)), shard_for_user(User(pk=42)))
+        self.assertEqual(shard_for_user(self.bob), "tweets1")
+        with override_settings(TWEET_SHARDS=[]):
+            self.assertIsNone(shard_for_user(self.bob))
+
+    def test_tweets_and_their_rows_go_to_the_author_shard(self):
+        tweet = self.post(self.bob, "sharded tweet #shards")
+        self.assertFalse(Tweet.all_objects.using("tweets0").exists())
+        self.assertTrue(TweetHashtag.objects.using("tweets1").filter(tweet=tweet).exists())
+        self.assertTrue(TimelineEntry.objects.using("tweets1").filter(owner=self.alice, tweet=tweet).exists())
+        self.assertEqual(search_tweets("sharded", {}).items, [tweet])
+
+    def test_profile_reads_a_single_shard(self):
+        self.post(self.bob, "bob's tweet")
+        with record_queries("tweets0") as other, record_queries("tweets1") as own:
+            response = self.client.get(reverse_lazy("accounts:user_profile", kwargs={"username": "bob"}))
+        self.assertContains(response, "bob&#x27;s tweet")
+        self.assertEqual(other.count, 0)
+        self.assertEqual(own.count, 2)  # the page and the "liked by me" flags
+
+    @override_settings(TIMELINE_PAGE_SIZE=2)
+    def test_home_merges_shards_newest_first(self):
+        tweets = [self.post(user, f"tweet {index}") for index, user in enumerate([self.alice, self.bob] * 2)]
+        page = home_timeline(self.alice, {})
+        self.assertEqual(page.items, tweets[:1:-1])
+        self.assertEqual([tweet.user for tweet in page.items], [self.bob, self.alice])
+        older = home_timeline(self.alice, {"before": page.older_cursor})
+        self.assertEqual(older.items, tweets[1::-1])
+        response = self.client.get(reverse_lazy("tweets:home"))
+        self.assertEqual(response.context["tweets_list"], tweets[:1:-1])
+
+    def test_detail_and_likes_find_the_tweet_shard(self):
+        tweet = self.post(self.bob, "likeable")
+        self.assertEqual(self.client.get(reverse_lazy("tweets:detail", kwargs={"pk": tweet.pk})).status_code, 200)
+        response = self.client.post(reverse_lazy("tweets:like", kwargs={"pk": tweet.pk}))
+        self.assertEqual(response.json(), {"liked": True, "like_count": 1})
+        self.assertTrue(Like.objects.using("tweets1").filter(user=self.alice, tweet=tweet).exists())
+        counter.flush()
+        self.assertEqual(Tweet.objects.using("tweets1").get(pk=tweet.pk).like_count, 1)
+
+    def test_delete_checks_ownership_in_the_user_shard(self):
+        own = self.post(self.alice, "mine")
+        other = self.post(self.bob, "not mine")
+        self.assertEqual(self.client.post(reverse_lazy("tweets:delete", kwargs={"pk": other.pk})).status_code, 403)
+        self.assertEqual(self.client.post(reverse_lazy("tweets:delete", kwargs={"pk": own.pk})).status_code, 302)
+        self.assertIsNotNone(Tweet.all_objects.using("tweets0").get(pk=own.pk).deleted_at)
+        self.assertEqual(self.client.post(reverse_lazy("tweets:delete", kwargs={"pk": own.pk})).status_code, 404)
+
+    def test_export_api_merges_shards(self):
+        tweets = [self.post(user, f"export {index}") for index, user in enumerate([self.alice, self.bob, self.alice])]
+        response = self.client.get(reverse_lazy("tweets:api_export"))
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([(row["id"], row["user"]) for row in rows], [(str(t.pk), t.user.username) for t in tweets])
+        response = self.client.get(reverse_lazy("tweets:api_export"), {"user": "bob"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["id"] for row in rows], [str(tweets[1].pk)])
+
+    def test_export_and_import_cover_every_shard(self):
+        tweets = [self.post(user, f"moved {index}") for index, user in enumerate([self.alice, self.bob])]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "tweets.ndjson")
+        call_command("export_tweets", path, stdout=StringIO())
+        for alias in ["tweets0", "tweets1"]:
+            Tweet.all_objects.using(alias).all().delete()
+        call_command("import_tweets", path, stdout=StringIO())
+        self.assertEqual(list(Tweet.objects.using("tweets0").values_list("id", flat=True)), [tweets[0].pk])
+        self.assertEqual(list(Tweet.objects.using("tweets1").values_list("id", flat=True)), [tweets[1].pk])
+        self.assertTrue(TimelineEntry.objects.using("tweets1").filter(owner=self.alice, tweet=tweets[1]).exists())
+
+    def test_maintenance_commands_cover_every_shard(self):
+        self.post(self.alice, "kept #kept")
+        gone = self.post(self.bob, "gone")
+        self.post(self.bob, "kept too #kept")
+        Tweet.all_objects.using("tweets1").filter(pk=gone.pk).update(deleted_at=timezone.now())
+        out = StringIO()
+        call_command("purge_tweets", sleep=0, stdout=out)
+        call_command("rebuild_search_index", sleep=0, stdout=out)
+        call_command("backfill_tags", sleep=0, stdout=out)
+        self.assertIn("purged 1 tweets.", out.getvalue())
+        self.assertIn("Indexed 2 tweets.", out.getvalue())
+        self.assertIn("Indexed tags of 2 tweets.", out.getvalue())
+        self.assertFalse(Tweet.all_objects.using("tweets1").filter(pk=gone.pk).exists())
+        self.assertEqual(len(search_tweets("kept", {}).items), 2)
+
+    def test_renaming_and_deleting_a_user_forget_their_cards(self):
+        tweet = self.post(self.bob, "bob's card")
+        render_cards([tweet])
+        self.bob.username = "robert"
+        self.bob.save()
+        self.assertNotIn(card_key(tweet.pk), cache)
+        render_cards([tweet])
+        self.bob.delete()
+        self.assertNotIn(card_key(tweet.pk), cache)
+
+    def test_tweets_of_deleted_users_are_not_served(self):
+        gone = self.post(self.bob, "orphan #orphan")
+        self.post(self.alice, "still here #orphan")
+        self.bob.delete()
+        response = self.client.get(reverse_lazy("tweets:tag", kwargs={"tag": "orphan"}))
+        self.assertContains(response, "still here")
+        self.assertNotContains(response, "orphan #orphan")
+        self.assertEqual(self.client.get(reverse_lazy("tweets:detail", kwargs={"pk": gone.pk})).status_code, 404)
+        response = self.client.get(reverse_lazy("tweets:search"), {"q": "orphan"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([tweet.content for tweet in response.context["page"].items], ["still here #orphan"])
+        self.assertEqual([tweet.user for tweet in home_timeline(self.alice, {}).items], [self.alice])
+
+    def test_rebalance_moves_a_user(self):
+        tweets = [self.post(self.bob, f"moving tweet {index} #move") for index in range(3)]
+        Like.objects.using("tweets1").create(user=self.alice, tweet=tweets[0])
+        out = StringIO()
+        call_command("rebalance_tweets", "bob", to="tweets0", batch_size=2, sleep=0, stdout=out)
+        self.assertIn("bob: 3 tweets to tweets0.", out.getvalue())
+        self.assertFalse(Tweet.all_objects.using("tweets1").exists())
+        self.assertFalse(SearchEntry.objects.using("tweets1").exists())
+        self.assertEqual(list(Tweet.objects.using("tweets0").filter(user=self.bob)), tweets[::-1])
+        self.assertTrue(Like.objects.using("tweets0").filter(user=self.alice, tweet_id=tweets[0].pk).exists())
+        self.bob.refresh_from_db()
+        self.assertEqual(shard_for_user(self.bob), "tweets0")
+        self.assertEqual(len(search_tweets("moving", {}).items), 3)
+        self.assertEqual(get_tweet(tweets[0].pk)._state.db, "tweets0")
 
-#     def test_failure_post_with_not_exist_tweet(self):
+    def test_rebalance_fixes_misplaced_tweets(self):
+        # e.g. imported without regard to shards
+        Tweet.objects.using("tweets0").create(user=self.bob, title="t", content="misplaced")
+        out = StringIO()
+        call_command("rebalance_tweets", sleep=0, stdout=out)
+        self.assertIn("Moved 1 tweets of 1 users.", out.getvalue())
+        self.assertEqual(Tweet.objects.using("tweets1").get().content, "misplaced")
+        self.bob.refresh_from_db()
+        self.assertEqual(shard_for_user(self.bob), "tweets1")
 
-#     def test_failure_post_with_unliked_tweet(self):
+    def test_rebalance_needs_a_valid_target(self):
+        with self.assertRaises(CommandError):
+            call_command("rebalance_tweets", "bob", to="default")
@@ -0,0 +1,142 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from accounts.models import Connection, User
+
+from .models import TimelineEntry, Tweet
+from .pagination import TimelineSource, apaginate_tweets, paginate_tweets
+from .shards import ahome_sources, attach_authors, home_sources, shard_for_user
+from .versions import bump
+
+
+def is_celebrity(user):
+    return user.followers_count > settings.TIMELINE_FANOUT_LIMIT
+
+
+def fan_out(tweet):
+    """Push ``tweet`` into the inbox of its author and of every follower.
+
+    Authors above ``TIMELINE_FANOUT_LIMIT`` followers only write to their own
+    inbox; their tweets are merged in when followers read (see ``home_timeline``).
+    """
+    owner_ids = [tweet.user_id]
+    celebrity = is_celebrity(tweet.user)
+    if not celebrity:
+        owner_ids += Connection.objects.filter(following_id=tweet.user_id).values_list("follower_id", flat=True)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, tweet=tweet) for owner_id in owner_ids],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    bump([f"inbox:{owner_id}" for owner_id in owner_ids] + (["celebrities"] if celebrity else []))
+    # Trimming is amortized over roughly every TIMELINE_TRIM_INTERVAL-th tweet,
+    # so inboxes may briefly hold a few rows more than TIMELINE_INBOX_SIZE.
+    if tweet.pk.int % settings.TIMELINE_TRIM_INTERVAL == 0:
+        trim_inboxes(owner_ids)
+
+
+def fan_out_many(tweets):
+    """``fan_out`` for a batch of tweets, e.g. from an import, in a few queries.
+
+    Inboxes are trimmed right away since a batch can add many rows to each.
+    """
+    author_ids = {tweet.user_id for tweet in tweets}
+    celebrity_ids = set(
+        User.objects.filter(pk__in=author_ids, followers_count__gt=settings.TIMELINE_FANOUT_LIMIT).values_list(
+            "pk", flat=True
+        )
+    )
+    followers = defaultdict(list)
+    for following_id, follower_id in Connection.objects.filter(
+        following_id__in=author_ids - celebrity_ids
+    ).values_list("following_id", "follower_id"):
+        followers[following_id].append(follower_id)
+    entries = [
+        TimelineEntry(owner_id=owner_id, tweet=tweet)
+        for tweet in tweets
+        for owner_id in [tweet.user_id, *followers[tweet.user_id]]
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    owner_ids = list({entry.owner_id for entry in entries})
+    bump([f"inbox:{owner_id}" for owner_id in owner_ids] + (["celebrities"] if celebrity_ids else []))
+    trim_inboxes(owner_ids)
+
+
+def trim_inboxes(owner_ids):
+    for start in range(0, len(owner_ids), 500):
+        stale = (
+            TimelineEntry.objects.filter(owner_id__in=owner_ids[start : start + 500])
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F("owner_id"),
+                    order_by=F("tweet_id").desc(),
+                )
+            )
+            .filter(rank__gt=settings.TIMELINE_INBOX_SIZE)
+            .values_list("pk", flat=True)
+        )
+        stale = list(stale)
+        for chunk in range(0, len(stale), 500):
+            TimelineEntry.objects.filter(pk__in=stale[chunk : chunk + 500]).delete()
+
+
+def backfill_inbox(follower, following):
+    """Copy the latest tweets of a newly followed user into the follower's inbox."""
+    if is_celebrity(following):
+        return
+    # Inbox rows live next to their tweets, in the author's shard.
+    shard = shard_for_user(following)
+    tweet_ids = Tweet.objects.using(shard).filter(user=following).values_list("id", flat=True)
+    TimelineEntry.objects.using(shard).bulk_create(
+        [TimelineEntry(owner=follower, tweet_id=pk) for pk in tweet_ids[: settings.TIMELINE_INBOX_SIZE]],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def drop_from_inbox(follower, following):
+    TimelineEntry.objects.using(shard_for_user(following)).filter(owner=follower, tweet__user=following).delete()
+
+
+def _home_sources(user, celebrity_ids):
+    sources = [
+        TimelineSource(
+            TimelineEntry.objects.filter(owner=user, tweet__deleted_at__isnull=True).select_related("tweet__user"),
+            id_field="tweet_id",
+            tweet_field="tweet",
+        )
+    ]
+    if celebrity_ids:
+        sources.append(TimelineSource(Tweet.objects.filter(user_id__in=celebrity_ids).select_related("user")))
+    return sources
+
+
+def _followed_celebrities(user):
+    return Connection.objects.filter(
+        follower=user, following__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list("following_id", flat=True)
+
+
+def home_timeline(user, params):
+    if settings.TWEET_SHARDS:
+        # Scatter over the shards of the user and everyone they follow; inboxes hold
+        # only the tweets of the author's own shard.
+        page = paginate_tweets(home_sources(user), params)
+        page.items = attach_authors(page.items)
+        return page
+    celebrity_ids = list(_followed_celebrities(user))
+    return paginate_tweets(_home_sources(user, celebrity_ids), params)
+
+
+async def ahome_timeline(user, params):
+    if settings.TWEET_SHARDS:
+        page = await apaginate_tweets(await ahome_sources(user), params)
+        page.items = await sync_to_async(attach_authors)(page.items)
+        return page
+    celebrity_ids = [pk async for pk in _followed_celebrities(user)]
+    return await apaginate_tweets(_home_sources(user, celebrity_ids), params)
@@ -0,0 +1,241 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .ids import min_uuid7, uuid7_timestamp_ms
+from .models import TweetHashtag
+from .shards import shard_aliases
+
+logger = logging.getLogger(__name__)
+
+# Window name -> (length, bucket width), in seconds.
+WINDOWS = {
+    "1h": (60 * 60, 5 * 60),
+    "24h": (24 * 60 * 60, 60 * 60),
+}
+
+
+class SpaceSaving:
+    """Bounded-memory heavy hitters (Metwally et al., "Space-Saving").
+
+    Tracks at most ``capacity`` keys. A new key replaces the key with the
+    smallest count and inherits that count as its possible overestimate, so
+    every key with a true count above ``total / capacity`` is kept.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # Min-heap of (count, key); entries go stale when a count grows and
+        # are skipped (and compacted) lazily.
+        self._heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, key, n=1):
+        if key in self.counts:
+            self.counts[key] += n
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = n
+            self.errors[key] = 0
+        else:
+            smallest = self._pop_min()
+            floor = self.counts.pop(smallest)
+            del self.errors[smallest]
+            self.counts[key] = floor + n
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 2 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, key, n=1):
+        """Take back ``n`` counts of ``key``, e.g. for a deleted tweet, if it is tracked."""
+        if key not in self.counts:
+            return
+        self.counts[key] -= n
+        if self.counts[key] > 0:
+            heapq.heappush(self._heap, (self.counts[key], key))
+        else:
+            del self.counts[key]
+            del self.errors[key]
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return key
+
+
+class TrendingEngine:
+    """Top hashtags over sliding windows, fed as tweets are created.
+
+    Each window is a ring of time buckets, each bucket a ``SpaceSaving``
+    sketch, so memory is bounded by buckets x ``capacity`` however many
+    distinct tags appear. A window's ranking merges its live buckets.
+
+    Like ``tweets.live.hub`` the engine lives in the process, so it only
+    sees the tweets created there. ``trending`` therefore rebuilds it from
+    the hashtag index (see ``warm_up``) every ``TRENDING_REBUILD_INTERVAL``
+    seconds, which bounds how long other workers' tweets are missing and
+    tombstoned tweets keep counting.
+    """
+
+    def __init__(self, capacity, windows=WINDOWS):
+        self.capacity = capacity
+        self.windows = windows
+        self._buckets = {name: {} for name in windows}
+        self._lock = threading.Lock()
+        self.built_at = None  # time.monotonic() of the last rebuild
+
+    def record(self, tags, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for name, (length, width) in self.windows.items():
+                buckets = self._buckets[name]
+                index = int(timestamp // width)
+                self._expire(buckets, index, length // width)
+                if index not in buckets:
+                    if buckets and index <= max(buckets) - length // width:
+                        continue  # older than the window
+                    buckets[index] = SpaceSaving(self.capacity)
+                for tag in tags:
+                    buckets[index].add(tag)
+
+    def discard(self, tags, timestamp):
+        """Undo ``record(tags, timestamp)`` as far as the buckets still hold it."""
+        with self._lock:
+            for name, (length, width) in self.windows.items():
+                sketch = self._buckets[name].get(int(timestamp // width))
+                if sketch is not None:
+                    for tag in tags:
+                        sketch.discard(tag)
+
+    def top(self, window, limit, now=None):
+        """Return up to ``limit`` ``(tag, estimated count)``, most used first."""
+        length, width = self.windows[window]
+        now = time.time() if now is None else now
+        totals = Counter()
+        with self._lock:
+            buckets = self._buckets[window]
+            self._expire(buckets, int(now // width), length // width)
+            for sketch in buckets.values():
+                totals.update(sketch.counts)
+        return totals.most_common(limit)
+
+    def size(self):
+        with self._lock:
+            return sum(len(sketch) for buckets in self._buckets.values() for sketch in buckets.values())
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {name: {} for name in self.windows}
+            self.built_at = None
+
+    def replace(self, other):
+        """Take over the buckets of ``other``, built off to the side, in one step."""
+        with self._lock:
+            self._buckets = other._buckets
+            self.built_at = time.monotonic()
+
+    @staticmethod
+    def _expire(buckets, current, count):
+        for index in [index for index in buckets if index <= current - count]:
+            del buckets[index]
+
+
+engine = TrendingEngine(settings.TRENDING_CAPACITY)
+
+
+def _tagged_in(window, alias=None):
+    """Hashtag rows of live tweets created within ``window``, in one shard.
+
+    Tweet ids are time-ordered, so this is a range scan on the tweet index.
+    """
+    start = timezone.now() - timedelta(seconds=WINDOWS[window][0])
+    return TweetHashtag.objects.using(alias).filter(tweet_id__gte=min_uuid7(start), tweet__deleted_at__isnull=True)
+
+
+def warm_up(target=engine):
+    """Rebuild ``target`` from the live tweets of the longest window.
+
+    The new buckets are filled in a separate engine and swapped in at once,
+    so readers never see a half-built ranking. Tags ``target`` recorded
+    meanwhile and that the scan missed are back at the next rebuild.
+    """
+    longest = max(WINDOWS, key=lambda name: WINDOWS[name][0])
+    fresh = TrendingEngine(target.capacity, target.windows)
+    for alias in shard_aliases():
+        rows = _tagged_in(longest, alias).values_list("tweet_id", "hashtag__name").iterator(chunk_size=2000)
+        for tweet_id, tag in rows:
+            fresh.record([tag], uuid7_timestamp_ms(tweet_id) / 1000)
+    target.replace(fresh)
+    return target
+
+
+def exact_top(window, limit):
+    """The real top ``limit`` of ``window`` by a GROUP BY, for verification."""
+    if not settings.TWEET_SHARDS:
+        rows = _tagged_in(window).values("hashtag__name").annotate(n=Count("id")).order_by("-n", "hashtag__name")
+        return [(row["hashtag__name"], row["n"]) for row in rows[:limit]]
+    # A tag's count is spread over the shards, so none of them can cut its list short.
+    counts = Counter()
+    for alias in settings.TWEET_SHARDS:
+        rows = _tagged_in(window, alias).values("hashtag__name").annotate(n=Count("id"))
+        counts.update({row["hashtag__name"]: row["n"] for row in rows})
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def _needs_rebuild():
+    return engine.built_at is None or time.monotonic() - engine.built_at >= settings.TRENDING_REBUILD_INTERVAL
+
+
+# Held for the whole of a rebuild, so there is at most one at a time.
+_rebuild_lock = threading.Lock()
+
+
+def _rebuild():
+    try:
+        warm_up()
+    except Exception:
+        logger.exception("Rebuilding the trending counts failed; serving the old ones.")
+    finally:
+        _rebuild_lock.release()
+
+
+def _rebuild_in_background():
+    try:
+        _rebuild()
+    finally:
+        # The thread's own connections; nothing would close them otherwise.
+        connections.close_all()
+
+
+def trending(window, limit):
+    """Top ``limit`` ``(tag, count)`` of ``window`` from the process's engine.
+
+    The first call builds the engine, any concurrent ones waiting for it.
+    Once its counts are ``TRENDING_REBUILD_INTERVAL`` old, one caller starts
+    a rebuild on a background thread and everyone keeps getting the old
+    counts until it is swapped in.
+    """
+    if engine.built_at is None:
+        with _rebuild_lock:
+            if engine.built_at is None:  # not built by another thread meanwhile
+                warm_up()
+    elif _needs_rebuild() and _rebuild_lock.acquire(blocking=False):
+        if settings.TRENDING_REBUILD_IN_BACKGROUND:
+            threading.Thread(target=_rebuild_in_background, name="trending-rebuild", daemon=True).start()
+        else:
+            _rebuild()
+    return engine.top(window, limit)
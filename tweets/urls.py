@@ -1,14 +1,25 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = "tweets"
 
 urlpatterns = [
-    path("home/", views.home_view, name="home"),
+    path("home/", views.async_home_view if settings.ASYNC_VIEWS else views.home_view, name="home"),
     path("create/", views.TweetCreateView.as_view(), name="create"),
-    path("<str:pk>/", views.tweetdetail_view, name="detail"),
+    path("live/", views.live_view, name="live"),
+    path("search/", views.search_view, name="search"),
+    path("tag/<str:tag>/", views.tag_view, name="tag"),
+    path("mentions/<str:username>/", views.mentions_view, name="mentions"),
+    path("api/home/", api.home_api, name="api_home"),
+    path("api/export/", api.export_api, name="api_export"),
+    path("api/search/", api.search_api, name="api_search"),
+    path("api/trending/", api.trending_api, name="api_trending"),
+    path("api/users/<str:username>/", api.user_tweets_api, name="api_user_tweets"),
+    path("api/tweets/<str:pk>/", api.tweet_api, name="api_detail"),
+    path("<str:pk>/", views.async_tweetdetail_view if settings.ASYNC_VIEWS else views.tweetdetail_view, name="detail"),
     path("<str:pk>/delete/", views.tweetdelete_view, name="delete"),
-    # path('<int:pk>/like/', views.LikeView, name='like'),
-    # path('<int:pk>/unlike/', views.UnlikeView, name='unlike'),
+    path("<str:pk>/like/", views.like_view, name="like"),
+    path("<str:pk>/unlike/", views.unlike_view, name="unlike"),
 ]
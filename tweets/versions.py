@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from mysite.metrics import record_cache
+from mysite.routers import reads_replicas
+
+# Version scopes, each a random token in the cache that changes whenever
+# the pages depending on it change:
+#   inbox:<user id>         home inbox of a user
+#   celebrities             tweets merged into home timelines at read time
+#   profile:<username>      a user's profile page
+#   following:<user id>     who a user follows (follow buttons)
+#   users                   any username (shown on every tweet card)
+#   likes                   like counts (bumped when buffered counts are flushed)
+#   liked:<user id>         which tweets a user has liked
+
+
+def _key(scope):
+    return f"timeline-version:{scope}"
+
+
+def get_versions(scopes):
+    keys = [_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    record_cache("versions", len(keys) - len(missing), len(missing))
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(scopes):
+    cache.set_many({_key(scope): uuid.uuid4().hex for scope in scopes}, None)
+
+
+def make_etag(request, scopes):
+    raw = "|".join([str(request.user.pk), request.get_full_path(), *get_versions(scopes)])
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def home_etag(request):
+    return make_etag(
+        request, [f"inbox:{request.user.pk}", "celebrities", "users", "likes", f"liked:{request.user.pk}"]
+    )
+
+
+def profile_etag(request, username):
+    return make_etag(
+        request, [f"profile:{username}", f"following:{request.user.pk}", "users", "likes", f"liked:{request.user.pk}"]
+    )
+
+
+def _finish(response, etag):
+    if etag is not None and response.status_code == 200 and not response.has_header("ETag"):
+        response.headers["ETag"] = f'"{etag}"'
+    # The pages differ per logged-in user, so shared caches must key on the cookie.
+    patch_vary_headers(response, ("Cookie",))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(etag_func):
+    """Answer ``If-None-Match`` with 304 before the view runs.
+
+    ``etag_func(request, *args, **kwargs)`` must only consult version counters,
+    never the timeline itself. Works for sync and async views.
+
+    Only on with ``SHARED_CACHE``: with a cache per worker process, a
+    worker that missed a bump would keep answering 304 for a stale page.
+    Otherwise pages are sent without an ETag.
+
+    Versions are bumped when the primary is written, so a page that a
+    ``replica_reads`` view read from a lagging replica may predate them: it
+    is sent without an ETag. A matching ``If-None-Match`` is still answered
+    with 304, since that ETag came from a page read from the primary.
+    """
+
+    def decorator(view):
+        on_replica = getattr(view, "replica_reads", False)
+
+        def response_etag(request, etag):
+            return None if on_replica and reads_replicas(request) else etag
+
+        if asyncio.iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not settings.SHARED_CACHE:
+                    return _finish(await view(request, *args, **kwargs), None)
+                etag = etag_func(request, *args, **kwargs)
+                response = get_conditional_response(request, etag=f'"{etag}"')
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, response_etag(request, etag))
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.SHARED_CACHE:
+                return _finish(view(request, *args, **kwargs), None)
+            etag = etag_func(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=f'"{etag}"')
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(response, response_etag(request, etag))
+
+        return wrapper
+
+    return decorator
@@ -1,39 +1,179 @@
+import asyncio
+import json
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseForbidden, HttpResponseNotFound
-from django.shortcuts import redirect, render
+from django.contrib.auth.views import redirect_to_login
+from django.db import IntegrityError, transaction
+from django.http import HttpResponseForbidden, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView
 
+from accounts.decorators import aget_user, async_login_required
+from accounts.models import Connection, User
+from mysite.middleware import cache_gzip
+from mysite.queries import query_budget
+from mysite.routers import replica_reads
+
+from .cards import render_cards
 from .forms import TweetCreationForm
-from .models import Tweet
+from .likes import aattach_likes, attach_likes, counter
+from .live import hub
+from .lookup import aget_tweet, get_tweet, parse_tweet_id
+from .models import Like, Tweet
+from .search import SearchQueryError, search_tweets
+from .shards import on_shard, shard_for_user, tweet_exists
+from .signals import tweet_tombstoned
+from .tags import mention_feed, tag_feed
+from .timeline import ahome_timeline, home_timeline
+from .versions import bump, conditional_page, home_etag
 
 
+@query_budget(6, per_shard=2)
 @login_required
+@cache_gzip
+@conditional_page(home_etag)
+@replica_reads
 def home_view(request):
-    tweets_list = Tweet.objects.select_related("user").all()
-    context = {"tweets_list": tweets_list}
+    page = home_timeline(request.user, request.GET)
+    context = {"tweets_list": page.items, "cards": attach_likes(render_cards(page.items), request.user), "page": page}
+    return render(request, "tweets/home.html", context)
+
+
+@query_budget(6, per_shard=2)
+@async_login_required
+@cache_gzip
+@conditional_page(home_etag)
+@replica_reads
+async def async_home_view(request):
+    page = await ahome_timeline(request.user, request.GET)
+    cards = await aattach_likes(render_cards(page.items), request.user)
+    context = {"tweets_list": page.items, "cards": cards, "page": page}
     return render(request, "tweets/home.html", context)
 
 
+@query_budget(4, per_shard=1)
 @login_required
+@replica_reads
 def tweetdetail_view(request, pk):
-    tweets = Tweet.objects.filter(id=pk)
-    return render(request, "tweets/detail.html", {"tweets": tweets})
+    pk = parse_tweet_id(pk)
+    tweet = get_tweet(pk) if pk else None
+    if tweet is None:
+        return HttpResponseNotFound()
+    cards = attach_likes(render_cards([tweet]), request.user)
+    return render(request, "tweets/detail.html", {"tweets": [tweet], "cards": cards})
+
+
+@query_budget(4, per_shard=1)
+@async_login_required
+@replica_reads
+async def async_tweetdetail_view(request, pk):
+    pk = parse_tweet_id(pk)
+    tweet = await aget_tweet(pk) if pk else None
+    if tweet is None:
+        return HttpResponseNotFound()
+    cards = await aattach_likes(render_cards([tweet]), request.user)
+    return render(request, "tweets/detail.html", {"tweets": [tweet], "cards": cards})
 
 
+@query_budget(7, per_shard=1)
 @login_required
 def tweetdelete_view(request, pk):
-    tweets = Tweet.objects.filter(id=pk)
-    if tweets.count() == 0:
+    pk = parse_tweet_id(pk)
+    if pk is None:
         return HttpResponseNotFound()
-    if request.user != tweets[0].user:
-        return HttpResponseForbidden()
-    tweets.delete()
+    # One conditional UPDATE in the user's own shard both checks ownership and
+    # tombstones the tweet; purge_tweets hard-deletes it later in small batches.
+    shard = shard_for_user(request.user)
+    if not Tweet.objects.using(shard).filter(id=pk, user=request.user).update(deleted_at=timezone.now()):
+        if tweet_exists(pk):
+            return HttpResponseForbidden()
+        return HttpResponseNotFound()
+    with on_shard(shard):
+        tweet_tombstoned.send(sender=Tweet, tweet_id=pk, user=request.user)
     return redirect("tweets:home")
 
 
+@query_budget(5, per_shard=3)
+@login_required
+def search_view(request):
+    query = request.GET.get("q", "").strip()
+    context = {"query": query, "page": None, "cards": [], "error": None}
+    if query:
+        try:
+            context["page"] = search_tweets(query, request.GET)
+        except SearchQueryError as error:
+            context["error"] = str(error)
+        else:
+            context["cards"] = attach_likes(render_cards(context["page"].items), request.user)
+    return render(request, "tweets/search.html", context)
+
+
+def _feed_page(request, heading, page):
+    cards = attach_likes(render_cards(page.items), request.user)
+    context = {"heading": heading, "tweets_list": page.items, "cards": cards, "page": page}
+    return render(request, "tweets/feed.html", context)
+
+
+@query_budget(4, per_shard=2)
+@login_required
+def tag_view(request, tag):
+    return _feed_page(request, f"#{tag}", tag_feed(tag, request.GET))
+
+
+@query_budget(5, per_shard=2)
+@login_required
+def mentions_view(request, username):
+    user = get_object_or_404(User, username=username)
+    return _feed_page(request, f"@{user.username}", mention_feed(user, request.GET))
+
+
+def _like_response(tweet, liked):
+    like_count = tweet.like_count + counter.pending([tweet.pk]).get(tweet.pk, 0)
+    return JsonResponse({"liked": liked, "like_count": like_count})
+
+
+@query_budget(10, per_shard=2)
+@login_required
+@require_POST
+def like_view(request, pk):
+    pk = parse_tweet_id(pk)
+    tweet = get_tweet(pk) if pk else None
+    if tweet is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    # Likes live in the shard of their tweet.
+    shard = tweet._state.db if settings.TWEET_SHARDS else None
+    try:
+        with transaction.atomic(using=shard):
+            Like.objects.using(shard).create(user=request.user, tweet_id=pk)
+    except IntegrityError:
+        return JsonResponse({"detail": "Already liked."}, status=400)
+    counter.add(pk, 1, using=shard)
+    bump([f"liked:{request.user.pk}"])
+    return _like_response(tweet, True)
+
+
+@query_budget(7, per_shard=2)
+@login_required
+@require_POST
+def unlike_view(request, pk):
+    pk = parse_tweet_id(pk)
+    tweet = get_tweet(pk) if pk else None
+    if tweet is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    shard = tweet._state.db if settings.TWEET_SHARDS else None
+    if not Like.objects.using(shard).filter(user=request.user, tweet_id=pk).delete()[0]:
+        return JsonResponse({"detail": "Not liked."}, status=400)
+    counter.add(pk, -1, using=shard)
+    bump([f"liked:{request.user.pk}"])
+    return _like_response(tweet, False)
+
+
+@query_budget(16)
 class TweetCreateView(LoginRequiredMixin, CreateView):
     template_name = "tweets/post.html"
     form_class = TweetCreationForm
@@ -42,4 +182,45 @@ class TweetCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.user = self.request.user
         form.instance.created_at = timezone.now()
-        return super().form_valid(form)
+        # The tweet and the rows its signals write (inbox, tags, search) go to the author's shard.
+        with on_shard(shard_for_user(self.request.user)):
+            return super().form_valid(form)
+
+
+async def _live_events(audience):
+    # Subscribed only once the response is streamed, so a response that is
+    # never iterated (the client left first) leaves no subscription behind.
+    subscription = hub.subscribe(audience, settings.LIVE_QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LIVE_MAX_DURATION
+    try:
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        # Streams end after LIVE_MAX_DURATION and the browser reconnects; this
+        # bounds the lifetime of streams whose client went away unnoticed.
+        while loop.time() < deadline:
+            try:
+                event = await subscription.get(timeout=min(settings.LIVE_HEARTBEAT_INTERVAL, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                break
+            yield f"event: tweet\nid: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def live_view(request):
+    """Server-Sent Events stream of new tweets for the home timeline.
+
+    Must be served through ``mysite.asgi``: connections wait on the event
+    loop, so idle clients hold no thread.
+    """
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    audience = [pk async for pk in Connection.objects.filter(follower=user).values_list("following_id", flat=True)]
+    response = StreamingHttpResponse(_live_events([user.pk, *audience]), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response